@@ -2,10 +2,26 @@ from flask import Flask, app, redirect, url_for, flash
 from flask_login import LoginManager, current_user
 from flask_mail import Mail
 from flask_dance.contrib.google import make_google_blueprint
-from .models import db, User, Chat
+from .models import db, User, Conversation
 from .auth import auth
 from .main import main
 from .api import create_api_blueprint
+from .cli import register_commands
+from .utils.search_utils import (
+    query_embedding_cache,
+    search_result_cache,
+    warm_model,
+    model_metrics,
+    configure_embedding_model,
+    configure_embedding_service,
+)
+from .utils.taste_profile import taste_profile_cache
+from .utils.unread_cache import unread_count_cache
+from .utils.message_broker import (
+    chat_broker,
+    PostgresNotifyBackend,
+    SocketBroadcastBackend,
+)
 import os
 from werkzeug.exceptions import RequestEntityTooLarge
 from flask_migrate import Migrate
@@ -44,6 +60,92 @@ def create_app():
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max uploaded file size
 
+    # Semantic search index is rebuilt from the database once it is this old (seconds)
+    app.config["SEARCH_INDEX_MAX_AGE"] = int(os.getenv("SEARCH_INDEX_MAX_AGE", 300))
+
+    # Approximate search: inverted lists (0 = sqrt of the catalog size), lists
+    # scanned per query, and the catalog size below which search stays exact
+    app.config["SEARCH_ANN_NLIST"] = int(os.getenv("SEARCH_ANN_NLIST", 0))
+    app.config["SEARCH_ANN_NPROBE"] = int(os.getenv("SEARCH_ANN_NPROBE", 8))
+    app.config["SEARCH_ANN_MIN_TRAIN_SIZE"] = int(
+        os.getenv("SEARCH_ANN_MIN_TRAIN_SIZE", 10000)
+    )
+
+    # Store index vectors as float16 or int8 to cut worker memory 2-4x; the top
+    # SEARCH_RERANK_FACTOR x limit candidates are re-scored at full precision
+    quantization = os.getenv("SEARCH_INDEX_QUANTIZATION", "").lower()
+    app.config["SEARCH_INDEX_QUANTIZATION"] = (
+        None if quantization in ("", "none", "float32") else quantization
+    )
+    app.config["SEARCH_RERANK_FACTOR"] = int(os.getenv("SEARCH_RERANK_FACTOR", 4))
+
+    # Index file written by `flask search build-index --watch` (started by
+    # boot.sh when set); while it is fresher than SEARCH_INDEX_MAX_AGE, workers
+    # memory-map it instead of loading every embedding from the database
+    app.config["SEARCH_INDEX_FILE"] = os.getenv("SEARCH_INDEX_FILE")
+
+    # LRU cache of search query embeddings (entries, seconds)
+    app.config["QUERY_EMBEDDING_CACHE_SIZE"] = int(
+        os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 1024)
+    )
+    app.config["QUERY_EMBEDDING_CACHE_TTL"] = int(
+        os.getenv("QUERY_EMBEDDING_CACHE_TTL", 3600)
+    )
+
+    # Cache of search result ids (entries, total ids held, seconds); any item write
+    # invalidates it, in every process with a CHAT_BROADCAST_BACKEND and
+    # otherwise in the writing process, with the TTL bounding the others
+    app.config["SEARCH_RESULT_CACHE_SIZE"] = int(
+        os.getenv("SEARCH_RESULT_CACHE_SIZE", 512)
+    )
+    app.config["SEARCH_RESULT_CACHE_MAX_IDS"] = int(
+        os.getenv("SEARCH_RESULT_CACHE_MAX_IDS", 100_000)
+    )
+    app.config["SEARCH_RESULT_CACHE_TTL"] = int(
+        os.getenv("SEARCH_RESULT_CACHE_TTL", 60)
+    )
+
+    # Cached per-user taste profiles for the "for you" feed (users, days for an
+    # interaction's weight to halve)
+    app.config["TASTE_PROFILE_CACHE_SIZE"] = int(
+        os.getenv("TASTE_PROFILE_CACHE_SIZE", 10_000)
+    )
+    app.config["TASTE_PROFILE_HALF_LIFE_DAYS"] = float(
+        os.getenv("TASTE_PROFILE_HALF_LIFE_DAYS", 14)
+    )
+    # Seconds a cached profile is trusted; bounds how long interactions made in
+    # other workers take to show up without a CHAT_BROADCAST_BACKEND
+    app.config["TASTE_PROFILE_CACHE_TTL"] = int(
+        os.getenv("TASTE_PROFILE_CACHE_TTL", 900)
+    )
+
+    # Chat streams: how new messages (and cache invalidations) reach other
+    # processes ("socket" for processes on one host, "postgres" for
+    # LISTEN/NOTIFY, unset for a single process), keepalive interval and
+    # stream length (seconds)
+    app.config["CHAT_BROADCAST_BACKEND"] = os.getenv("CHAT_BROADCAST_BACKEND", "")
+    app.config["CHAT_BROADCAST_SOCKET_DIR"] = os.getenv(
+        "CHAT_BROADCAST_SOCKET_DIR", os.path.join(app.instance_path, "chat-events")
+    )
+    app.config["CHAT_STREAM_KEEPALIVE"] = float(os.getenv("CHAT_STREAM_KEEPALIVE", 15))
+    app.config["CHAT_STREAM_MAX_SECONDS"] = float(
+        os.getenv("CHAT_STREAM_MAX_SECONDS", 300)
+    )
+    # Streams open at once per worker process; keep it well below the
+    # worker's thread count (GUNICORN_THREADS) so page requests still get
+    # threads. Chat pages beyond it poll for new messages instead
+    app.config["CHAT_STREAM_MAX_PER_WORKER"] = int(
+        os.getenv("CHAT_STREAM_MAX_PER_WORKER", 8)
+    )
+
+    # Cached unread message counts for the navbar badge (users, seconds); with
+    # a CHAT_BROADCAST_BACKEND, invalidations reach every worker, otherwise the
+    # TTL bounds how long another worker's count can lag
+    app.config["UNREAD_COUNT_CACHE_SIZE"] = int(
+        os.getenv("UNREAD_COUNT_CACHE_SIZE", 10_000)
+    )
+    app.config["UNREAD_COUNT_CACHE_TTL"] = int(os.getenv("UNREAD_COUNT_CACHE_TTL", 300))
+
     # Mail configuration
     app.config["MAIL_SERVER"] = "smtp.gmail.com"
     app.config["MAIL_PORT"] = 587
@@ -64,6 +166,74 @@ def create_app():
     app.s3_bucket_id = os.getenv("AWS_S3_BUCKET_ID")
     app.config["CONTACT_EMAIL"] = os.getenv("CONTACT_EMAIL", "")
 
+    # Load and warm the embedding model at boot instead of on the first search.
+    # Under `gunicorn --preload` this runs once in the master and workers share the weights.
+    app.config["PRELOAD_EMBEDDING_MODEL"] = os.getenv(
+        "PRELOAD_EMBEDDING_MODEL", "false"
+    ).lower() in ("1", "true", "yes")
+
+    # Model that encodes new items and queries until a re-embedding switches the
+    # catalog to another one; workers should be restarted with the new name then
+    app.config["EMBEDDING_MODEL"] = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+    # Unix socket of a shared `flask embeddings serve` process; unset to load the model in-process
+    app.config["EMBEDDING_SERVICE_SOCKET"] = os.getenv("EMBEDDING_SERVICE_SOCKET")
+
+    # Bearer token of the internal /api/v1/metrics endpoints; unset disables them
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+
+    configure_embedding_model(app.config["EMBEDDING_MODEL"])
+    configure_embedding_service(app.config["EMBEDDING_SERVICE_SOCKET"])
+    query_embedding_cache.configure(
+        maxsize=app.config["QUERY_EMBEDDING_CACHE_SIZE"],
+        ttl=app.config["QUERY_EMBEDDING_CACHE_TTL"],
+    )
+    search_result_cache.configure(
+        maxsize=app.config["SEARCH_RESULT_CACHE_SIZE"],
+        max_ids=app.config["SEARCH_RESULT_CACHE_MAX_IDS"],
+        ttl=app.config["SEARCH_RESULT_CACHE_TTL"],
+    )
+    taste_profile_cache.configure(
+        maxsize=app.config["TASTE_PROFILE_CACHE_SIZE"],
+        half_life=app.config["TASTE_PROFILE_HALF_LIFE_DAYS"] * 24 * 3600,
+        ttl=app.config["TASTE_PROFILE_CACHE_TTL"],
+    )
+
+    # Chat events and unread count and search result invalidations each get
+    # their own listener
+    backend = app.config["CHAT_BROADCAST_BACKEND"].lower()
+    socket_dir = app.config["CHAT_BROADCAST_SOCKET_DIR"]
+    database_uri = app.config["SQLALCHEMY_DATABASE_URI"]
+
+    def broadcast_backend(name):
+        if backend == "socket":
+            path = socket_dir if name == "chat" else os.path.join(socket_dir, name)
+            return SocketBroadcastBackend(path)
+        if backend == "postgres":
+            return PostgresNotifyBackend(database_uri, f"mulemart_{name}")
+        return None
+
+    chat_broker.configure(broadcast_backend("chat"))
+    unread_count_cache.configure(
+        maxsize=app.config["UNREAD_COUNT_CACHE_SIZE"],
+        ttl=app.config["UNREAD_COUNT_CACHE_TTL"],
+        backend=broadcast_backend("unread"),
+    )
+    search_result_cache.configure(backend=broadcast_backend("search"))
+    taste_profile_cache.configure(backend=broadcast_backend("taste"))
+
+    # With an embedding service the model lives in that process instead
+    if (
+        app.config["PRELOAD_EMBEDDING_MODEL"]
+        and not app.config["EMBEDDING_SERVICE_SOCKET"]
+    ):
+        if warm_model():
+            app.logger.info(
+                f"Embedding model loaded in {model_metrics['load_seconds']:.2f}s"
+            )
+        else:
+            app.logger.warning("Embedding model could not be preloaded")
+
     # Initialize database and mail, migrate
     db.init_app(app)
     mail.init_app(app)
@@ -87,6 +257,9 @@ def create_app():
     api_bp = create_api_blueprint()
     app.register_blueprint(api_bp)
 
+    # Register custom CLI commands (e.g. `flask jobs work`)
+    register_commands(app)
+
     # OAuth setup for Google Login
     google_bp = make_google_blueprint(
         client_id=os.getenv("GOOGLE_CLIENT_ID"),
@@ -112,9 +285,7 @@ def create_app():
     @app.context_processor
     def inject_global_context():
         if current_user.is_authenticated:
-            count = Chat.query.filter_by(
-                receiver_id=current_user.id, is_read=False
-            ).count()
+            count = Conversation.cached_unread_total(current_user.id)
             return dict(unread_count=count, contact_email=app.config["CONTACT_EMAIL"])
         return dict(unread_count=0, contact_email=app.config["CONTACT_EMAIL"])
 
@@ -16,6 +16,7 @@ def create_api_blueprint():
     from . import orders_routes
     from . import users_routes
     from . import chat_routes
+    from . import metrics_routes
 
     # Register route modules (they will use the api blueprint)
     auth_routes.register_routes(api)
@@ -23,5 +24,6 @@ def create_api_blueprint():
     orders_routes.register_routes(api)
     users_routes.register_routes(api)
     chat_routes.register_routes(api)
+    metrics_routes.register_routes(api)
 
     return api
@@ -5,9 +5,9 @@ REST endpoints for messaging between users
 
 from flask import request
 from flask_login import current_user
-from sqlalchemy import or_, func
 
-from app.models import Chat, User, db
+from app.models import Chat, Conversation, User, db
+from app.services import chat_service
 from .responses import (
     success_response,
     error_response,
@@ -26,62 +26,29 @@ def register_routes(api):
     @api.route("/chat/conversations", methods=["GET"])
     @require_api_auth
     def get_conversations():
-        """Get all conversations for the current user."""
+        """
+        Get the current user's conversations, most recent activity first,
+        with each one's last message and unread count.
+        """
         page = max(request.args.get("page", 1, type=int), 1)
         per_page = min(max(request.args.get("per_page", 20, type=int), 1), 100)
 
-        users = (
-            User.query.join(
-                Chat,
-                or_(
-                    Chat.sender_id == User.id,
-                    Chat.receiver_id == User.id,
-                ),
-            )
-            .filter(
-                or_(
-                    Chat.sender_id == current_user.id,
-                    Chat.receiver_id == current_user.id,
-                )
-            )
-            .filter(User.id != current_user.id)
-            .distinct()
-            .order_by(User.id)
+        rows = (
+            Conversation.for_user(current_user.id)
             .offset((page - 1) * per_page)
             .limit(per_page)
             .all()
         )
 
-        conversations = []
-        for user in users:
-            last_message = (
-                Chat.query.filter(
-                    or_(
-                        (Chat.sender_id == current_user.id)
-                        & (Chat.receiver_id == user.id),
-                        (Chat.sender_id == user.id)
-                        & (Chat.receiver_id == current_user.id),
-                    )
-                )
-                .order_by(Chat.timestamp.desc())
-                .first()
-            )
-
-            unread_count = Chat.query.filter_by(
-                sender_id=user.id,
-                receiver_id=current_user.id,
-                is_read=False,
-            ).count()
-
-            conversations.append(
-                {
-                    "user": serialize_user(user),
-                    "last_message": (
-                        serialize_chat_message(last_message) if last_message else None
-                    ),
-                    "unread_count": unread_count,
-                }
-            )
+        conversations = [
+            {
+                "user": serialize_user(user),
+                "last_message": serialize_chat_message(last_message),
+                "unread_count": int(unread_count),
+            }
+            for user, last_message, unread_count, total in rows
+        ]
+        total = rows[0].total if rows else 0
 
         return success_response(
             data={
@@ -89,6 +56,8 @@ def register_routes(api):
                 "pagination": {
                     "page": page,
                     "per_page": per_page,
+                    "total": total,
+                    "pages": (total + per_page - 1) // per_page,
                 },
             },
             message="Conversations retrieved successfully",
@@ -99,48 +68,65 @@ def register_routes(api):
     @api.route("/chat/<int:user_id>/messages", methods=["GET"])
     @require_api_auth
     def get_conversation(user_id):
-        """Get all messages between current user and another user."""
+        """
+        Get messages between current user and another user, oldest first.
+
+        With `since_id` returns the messages after it (polling for new ones);
+        with `before_id` the `per_page` messages before it (scrollback). These
+        keyset cursors cost the same at any depth; `page` offset pagination is
+        kept for older clients.
+        """
         other_user = User.query.get(user_id)
         if not other_user:
             return error_response("User not found", 404)
 
-        page = max(request.args.get("page", 1, type=int), 1)
         per_page = min(max(request.args.get("per_page", 50, type=int), 1), 100)
-
-        query = Chat.query.filter(
-            or_(
-                (Chat.sender_id == current_user.id) & (Chat.receiver_id == user_id),
-                (Chat.sender_id == user_id) & (Chat.receiver_id == current_user.id),
+        since_id = request.args.get("since_id", type=int)
+        before_id = request.args.get("before_id", type=int)
+
+        if since_id is not None or before_id is not None:
+            # One extra row tells whether more lie beyond this page
+            messages = chat_service.page(
+                current_user.id,
+                user_id,
+                since_id=since_id,
+                before_id=before_id,
+                limit=per_page + 1,
             )
-        )
-
-        total = query.count()
-
-        messages = (
-            query.order_by(Chat.timestamp.asc())
-            .offset((page - 1) * per_page)
-            .limit(per_page)
-            .all()
-        )
-
-        Chat.query.filter_by(
-            sender_id=user_id,
-            receiver_id=current_user.id,
-            is_read=False,
-        ).update({"is_read": True})
-
+            has_more = len(messages) > per_page
+            if has_more:
+                messages = messages[:per_page] if since_id is not None else messages[1:]
+            pagination = {
+                "per_page": per_page,
+                "has_more": has_more,
+                "since_id": messages[-1].id if messages else since_id,
+                "before_id": messages[0].id if messages else before_id,
+            }
+        else:
+            page = max(request.args.get("page", 1, type=int), 1)
+            query = chat_service.between(current_user.id, user_id)
+            total = query.count()
+            messages = (
+                query.order_by(Chat.timestamp.asc())
+                .offset((page - 1) * per_page)
+                .limit(per_page)
+                .all()
+            )
+            pagination = {
+                "page": page,
+                "per_page": per_page,
+                "total": total,
+                "pages": (total + per_page - 1) // per_page,
+            }
+
+        chat_service.mark_read(current_user.id, user_id)
         db.session.commit()
 
         return success_response(
             data={
                 "other_user": serialize_user(other_user),
                 "messages": [serialize_chat_message(m) for m in messages],
-                "pagination": {
-                    "page": page,
-                    "per_page": per_page,
-                    "total": total,
-                    "pages": (total + per_page - 1) // per_page,
-                },
+                "pagination": pagination,
             },
             message="Messages retrieved successfully",
         )
@@ -195,23 +181,8 @@ def register_routes(api):
     @require_api_auth
     def get_unread_count():
         """Get unread message count."""
-        total = Chat.query.filter_by(
-            receiver_id=current_user.id,
-            is_read=False,
-        ).count()
-
-        breakdown = (
-            db.session.query(
-                Chat.sender_id,
-                func.count(Chat.id).label("count"),
-            )
-            .filter(
-                Chat.receiver_id == current_user.id,
-                Chat.is_read.is_(False),
-            )
-            .group_by(Chat.sender_id)
-            .all()
-        )
+        total = Conversation.unread_total(current_user.id)
+        breakdown = Conversation.unread_by_partner(current_user.id)
 
         return success_response(
             data={
@@ -231,12 +202,7 @@ def register_routes(api):
         if not User.query.get(user_id):
             return error_response("User not found", 404)
 
-        updated = Chat.query.filter_by(
-            sender_id=user_id,
-            receiver_id=current_user.id,
-            is_read=False,
-        ).update({"is_read": True})
-
+        updated = chat_service.mark_read(current_user.id, user_id)
         db.session.commit()
 
         return success_response(
@@ -12,11 +12,18 @@ from app.services.storage_service import is_mimetype_allowed
 from flask import request, current_app, url_for
 from flask_login import current_user
 from werkzeug.utils import secure_filename
-from datetime import datetime
 import os
-
-from app.models import Item, db, RecentlyViewed
-from app.utils.search_utils import generate_embedding
+import time
+
+from app.models import Item, db
+from app.services.job_service import enqueue_item_embedding
+from app.services.recommendation_service import (
+    for_you_items,
+    record_favorite,
+    record_unfavorite,
+    record_view,
+)
+from app.utils import search_utils
 from .responses import (
     success_response,
     error_response,
@@ -41,7 +48,7 @@ def register_routes(api):
         - category: Filter by category
         - seller_type: Filter by seller type
         - condition: Filter by condition
-        - sort_by: newest, oldest, price_low, price_high (default: newest)
+        - sort_by: newest, oldest, price_low, price_high, relevance (default: newest)
         - page: Page number (default: 1)
         - per_page: Items per page (default: 20)
 
@@ -63,45 +70,38 @@ def register_routes(api):
         if per_page < 1 or per_page > 100:
             per_page = 20
 
-        # Build query
-        query = Item.query.filter_by(is_active=True, is_deleted=False)
-
-        # Apply search filter
-        if search:
-            semantic_results = Item.semantic_search(search, limit=100)
-            if semantic_results:
-                relevant_ids = [item.id for item in semantic_results]
-                query = query.filter(Item.id.in_(relevant_ids))
-            else:
-                query = query.filter(db.false())
-
-        # Apply category filter
-        if category:
-            query = query.filter_by(category=category)
-
-        # Apply seller type filter
-        if seller_type:
-            query = query.filter_by(seller_type=seller_type)
-
-        # Apply condition filter
-        if condition:
-            query = query.filter_by(condition=condition)
-
-        # Apply sorting
-        if sort_by == "oldest":
-            query = query.order_by(Item.created_at.asc())
-        elif sort_by == "price_low":
-            query = query.order_by(Item.price.asc())
-        elif sort_by == "price_high":
-            query = query.order_by(Item.price.desc())
-        else:  # newest (default)
-            query = query.order_by(Item.created_at.desc())
-
-        # Get total count before pagination
-        total = query.count()
-
-        # Apply pagination
-        items = query.offset((page - 1) * per_page).limit(per_page).all()
+        filters = {
+            "category": [category] if category else None,
+            "seller_type": [seller_type] if seller_type else None,
+            "condition": [condition] if condition else None,
+        }
+
+        # Serve the page from the result cache unless an item changed since
+        cache = search_utils.search_result_cache
+        cache_key = cache.make_key(
+            search,
+            view="list_items",
+            sort_by=sort_by,
+            page=page,
+            per_page=per_page,
+            **filters,
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            page_ids, total = cached
+            items = Item.hydrate(page_ids)
+        else:
+            # Build query
+            query = Item.browse_query(search, filters, sort_by, search_limit=100)
+
+            # Get total count before pagination
+            total = query.count()
+
+            # Apply pagination
+            items = query.offset((page - 1) * per_page).limit(per_page).all()
+            search_utils.search_result_cache.put(
+                cache_key, [item.id for item in items], total
+            )
 
         # Serialize items
         items_data = [serialize_item(item) for item in items]
@@ -126,6 +126,63 @@ def register_routes(api):
             message="Items retrieved successfully",
         )
 
+    @api.route("/items/search", methods=["GET"])
+    def search_items():
+        """
+        Semantic search returning each match with its similarity score.
+
+        GET /api/v1/items/search?q=&limit=20&threshold=0.25&category=&seller_type=&condition=&explain=false
+
+        Query parameters:
+        - q: Search text (required)
+        - limit: Max results (default: 20, max: 100)
+        - threshold: Minimum cosine similarity, -1 to 1 (default: 0.25)
+        - category, seller_type, condition: Filters
+        - explain: Include a timing breakdown in milliseconds (default: false)
+
+        Responses:
+        - 200: Matches with scores, most similar first
+        - 400: Missing search text or invalid threshold
+        """
+        term = request.args.get("q", "").strip()
+        if not term:
+            return error_response(message="Search text is required")
+
+        limit = request.args.get("limit", 20, type=int)
+        if limit < 1 or limit > 100:
+            limit = 20
+        threshold = request.args.get("threshold", 0.25, type=float)
+        if not -1 <= threshold <= 1:
+            return error_response(message="Threshold must be between -1 and 1")
+        explain = request.args.get("explain", "").lower() in ("1", "true", "yes")
+
+        filters = {
+            name: [request.args[name].strip()]
+            for name in ("category", "seller_type", "condition")
+            if request.args.get(name, "").strip()
+        }
+
+        timings = {} if explain else None
+        results = Item.semantic_search_scores(
+            term, limit=limit, threshold=threshold, filters=filters, timings=timings
+        )
+
+        started = time.perf_counter()
+        items = {item.id: item for item in Item.hydrate([i for i, _ in results])}
+        data = {
+            "results": [
+                {"score": score, "item": serialize_item(items[item_id])}
+                for item_id, score in results
+                if item_id in items
+            ],
+            "threshold": threshold,
+        }
+        if explain:
+            timings["hydrate"] = (time.perf_counter() - started) * 1000
+            data["timings_ms"] = timings
+
+        return success_response(data=data, message="Search completed successfully")
+
     @api.route("/items/<int:item_id>", methods=["GET"])
     def get_item(item_id):
         """
@@ -144,22 +201,65 @@ def register_routes(api):
 
         # Track recently viewed (if authenticated)
         if current_user.is_authenticated:
-            existing_view = RecentlyViewed.query.filter_by(
-                user_id=current_user.id, item_id=item.id
-            ).first()
-
-            if existing_view:
-                existing_view.viewed_at = datetime.utcnow()
-            else:
-                new_view = RecentlyViewed(user_id=current_user.id, item_id=item.id)
-                db.session.add(new_view)
-
+            record_view(current_user.id, item)
             db.session.commit()
 
         return success_response(
             data=serialize_item(item), message="Item retrieved successfully"
         )
 
+    @api.route("/items/<int:item_id>/similar", methods=["GET"])
+    def similar_items(item_id):
+        """
+        Get the items most similar to a specific item.
+
+        GET /api/v1/items/<item_id>/similar?limit=8
+
+        Query parameters:
+        - limit: Max results (default: 8, max: 20)
+
+        Responses:
+        - 200: List of similar items, most similar first
+        - 404: Item not found
+        """
+        limit = request.args.get("limit", 8, type=int)
+        if limit < 1 or limit > 20:
+            limit = 8
+
+        item = Item.query.get(item_id)
+        if not item or item.is_deleted or not item.is_active:
+            return error_response(message="Item not found", status_code=404)
+
+        items = item.similar_items(limit=limit)
+        return success_response(
+            data=[serialize_item(similar) for similar in items],
+            message="Similar items retrieved successfully",
+        )
+
+    @api.route("/items/for-you", methods=["GET"])
+    @require_api_auth
+    def for_you():
+        """
+        Get items recommended from the user's viewing and favorites history.
+
+        GET /api/v1/items/for-you?limit=12
+
+        Query parameters:
+        - limit: Max results (default: 12, max: 50)
+
+        Responses:
+        - 200: List of recommended items, best match first; empty without history
+        """
+        limit = request.args.get("limit", 12, type=int)
+        if limit < 1 or limit > 50:
+            limit = 12
+
+        items = for_you_items(current_user, limit=limit)
+        return success_response(
+            data=[serialize_item(item) for item in items],
+            message="Recommendations retrieved successfully",
+        )
+
     @api.route("/items", methods=["POST"])
     @require_api_auth
     @validate_json("title", "price")
@@ -253,10 +353,10 @@ def register_routes(api):
             price=price,
             item_image=item_image,
             seller_id=current_user.id,
-            embedding=generate_embedding(f"{title} {description}"),
         )
 
         db.session.add(new_item)
+        enqueue_item_embedding(new_item)
         db.session.commit()
 
         return success_response(
@@ -369,8 +469,8 @@ def register_routes(api):
                     status_code=500,
                 )
 
-        # Update embedding
-        item.embedding = generate_embedding(f"{item.title} {item.description or ''}")
+        # Embedding is regenerated by the background worker
+        enqueue_item_embedding(item)
 
         db.session.commit()
 
@@ -437,6 +537,7 @@ def register_routes(api):
 
         if not current_user.favorites.filter_by(id=item.id).first():
             current_user.favorites.append(item)
+            record_favorite(current_user.id, item)
             db.session.commit()
 
         return success_response(message="Added to favorites")
@@ -460,6 +561,7 @@ def register_routes(api):
 
         if current_user.favorites.filter_by(id=item.id).first():
             current_user.favorites.remove(item)
+            record_unfavorite(current_user.id)
             db.session.commit()
 
         return success_response(message="Removed from favorites")
@@ -487,16 +589,10 @@ def register_routes(api):
         if not query:
             return success_response(data=[], message="No query provided")
 
-        items = (
-            Item.query.filter_by(is_active=True, is_deleted=False)
-            .filter(Item.title.ilike(f"%{query}%"))
-            .order_by(Item.created_at.desc())
-            .limit(limit)
-            .all()
-        )
+        items = Item.suggest(query, limit=limit)
 
         results = [
-            {"id": item.id, "title": item.title, "image": item.image_url}
+            {"id": item.id, "title": item.title, "image": item.item_image_url}
             for item in items
         ]
 
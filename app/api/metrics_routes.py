@@ -0,0 +1,43 @@
+"""
+Metrics API endpoints
+Read-only runtime counters for search performance monitoring, for internal
+monitoring only: requests must carry the METRICS_TOKEN bearer token
+"""
+
+from app.utils import search_utils
+from app.utils.taste_profile import taste_profile_cache
+from app.utils.unread_cache import unread_count_cache
+from .responses import require_metrics_token, success_response
+
+
+def register_routes(api):
+    """Register metrics routes to the API blueprint."""
+
+    @api.route("/metrics/search", methods=["GET"])
+    @require_metrics_token
+    def search_metrics():
+        """
+        Get search runtime metrics for this worker process.
+
+        GET /api/v1/metrics/search
+        Authorization: Bearer <METRICS_TOKEN>
+
+        Responses:
+        - 200: Embedding model and cache metrics
+        - 401: Missing or wrong token
+        - 404: METRICS_TOKEN is not configured
+        """
+        return success_response(
+            data={
+                "embedding_model": {
+                    "name": search_utils.default_model_name(),
+                    "loaded": search_utils._model is not None,
+                    **search_utils.model_metrics,
+                },
+                "query_embedding_cache": search_utils.query_embedding_cache.stats(),
+                "search_result_cache": search_utils.search_result_cache.stats(),
+                "taste_profile_cache": taste_profile_cache.stats(),
+                "unread_count_cache": unread_count_cache.stats(),
+            },
+            message="Search metrics retrieved successfully",
+        )
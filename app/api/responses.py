@@ -3,7 +3,9 @@ REST API Response utilities and decorators
 Standardized response format for all API endpoints
 """
 
-from flask import jsonify, request
+import hmac
+
+from flask import current_app, jsonify, request
 from functools import wraps
 from flask_login import current_user
 from app.services.user_service import get_user_activity_stats
@@ -59,6 +61,28 @@ def require_api_auth(f):
     return decorated_function
 
 
+def require_metrics_token(f):
+    """
+    Restrict an internal endpoint to requests carrying
+    `Authorization: Bearer <METRICS_TOKEN>`.
+    The endpoint does not exist while METRICS_TOKEN is unset.
+    """
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = current_app.config.get("METRICS_TOKEN")
+        if not token:
+            return error_response(message="Not found", status_code=404)
+        scheme, _, supplied = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(
+            supplied.encode(), token.encode()
+        ):
+            return error_response(message="Unauthorized.", status_code=401)
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
 def validate_json(*required_fields):
     """
     Validate that a request contains JSON and required fields.
@@ -142,7 +166,7 @@ def serialize_item(item):
         "seller_type": item.seller_type,
         "condition": item.condition,
         "price": float(item.price),
-        "image_url": item.image_url,
+        "image_url": item.item_image_url,
         "created_at": item.created_at.isoformat() if item.created_at else None,
         "seller_id": item.seller_id,
         "seller": (
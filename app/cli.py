@@ -0,0 +1,187 @@
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+jobs_cli = AppGroup("jobs", help="Background job queue commands.")
+embeddings_cli = AppGroup("embeddings", help="Embedding model commands.")
+search_cli = AppGroup("search", help="Search index commands.")
+chat_cli = AppGroup("chat", help="Chat commands.")
+
+
+@jobs_cli.command("work")
+@click.option("--batch-size", default=64, show_default=True, help="Jobs per batch.")
+@click.option(
+    "--poll-interval",
+    default=2.0,
+    show_default=True,
+    help="Seconds to wait when the queue is empty.",
+)
+@click.option("--once", is_flag=True, help="Exit once the queue is empty.")
+def work_command(batch_size, poll_interval, once):
+    """Run the background job worker."""
+    from app.services.job_service import work
+
+    click.echo("Job worker started.")
+    work(batch_size=batch_size, poll_interval=poll_interval, once=once)
+
+
+@embeddings_cli.command("serve")
+@click.option(
+    "--socket",
+    "socket_path",
+    default=None,
+    help="Unix socket path (default: EMBEDDING_SERVICE_SOCKET).",
+)
+@click.option(
+    "--max-batch", default=64, show_default=True, help="Max texts per model call."
+)
+@click.option(
+    "--max-wait-ms",
+    default=5.0,
+    show_default=True,
+    help="How long a batch waits for more requests.",
+)
+def serve_command(socket_path, max_batch, max_wait_ms):
+    """Run the shared embedding service that owns the model."""
+    from app.utils.embedding_service import EmbeddingServer
+    from app.utils.search_utils import default_model_name, get_model, model_metrics
+
+    socket_path = socket_path or current_app.config["EMBEDDING_SERVICE_SOCKET"]
+    if not socket_path:
+        raise click.UsageError("Pass --socket or set EMBEDDING_SERVICE_SOCKET.")
+
+    model = get_model()
+    click.echo(f"Embedding model loaded in {model_metrics['load_seconds']:.2f}s.")
+
+    def encode(texts):
+        return model.encode(texts, batch_size=max_batch)
+
+    server = EmbeddingServer(
+        socket_path,
+        encode,
+        max_batch=max_batch,
+        max_wait=max_wait_ms / 1000,
+        model_name=default_model_name(),
+    )
+    click.echo(
+        f"Embedding service for {default_model_name()} listening on {socket_path}."
+    )
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+@embeddings_cli.command("embed-stale")
+@click.option(
+    "--chunk-size", default=512, show_default=True, help="Items scanned per chunk."
+)
+@click.option(
+    "--batch-size", default=64, show_default=True, help="Batch size per model call."
+)
+def embed_stale_command(chunk_size, batch_size):
+    """Embed items whose embedding is missing or out of date with their text."""
+    from app.services.job_service import embed_stale_items
+
+    embedded = embed_stale_items(chunk_size=chunk_size, batch_size=batch_size)
+    if embedded is None:
+        raise click.ClickException("Embedding model unavailable.")
+    click.echo(f"Embedded {embedded} stale items.")
+
+
+@embeddings_cli.command("reembed")
+@click.argument("model")
+def reembed_command(model):
+    """Re-encode the catalog with MODEL in the background, then switch to it."""
+    from app.services.job_service import start_reembedding
+
+    try:
+        start_reembedding(model)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"Re-embedding with {model} queued; the job worker switches search over "
+        f"once every item is encoded. Then set EMBEDDING_MODEL={model} and "
+        "restart the app, so workers stop holding both models."
+    )
+
+
+@embeddings_cli.command("status")
+def status_command():
+    """Show registered embedding models and item counts."""
+    from app.services.embedding_model_service import embedding_status
+
+    models = embedding_status()
+    if not models:
+        click.echo("No models registered; items use the configured EMBEDDING_MODEL.")
+    for model in models:
+        click.echo(
+            f"{model['name']}: {model['status']}, dim {model['dim']}, "
+            f"{model['items']} items, {model['staged']} staged"
+        )
+
+
+@search_cli.command("rebuild-neighbors")
+@click.option(
+    "--chunk-size", default=500, show_default=True, help="Items committed per chunk."
+)
+def rebuild_neighbors_command(chunk_size):
+    """Recompute every item's similar-item list from scratch."""
+    from app.services.similarity_service import rebuild_neighbors
+
+    processed = rebuild_neighbors(chunk_size=chunk_size)
+    click.echo(f"Rebuilt neighbours for {processed} items.")
+
+
+@search_cli.command("build-index")
+@click.option(
+    "--path", default=None, help="Index file to write (default: SEARCH_INDEX_FILE)."
+)
+@click.option(
+    "--watch",
+    type=float,
+    default=None,
+    help="Keep running and rebuild every this many seconds.",
+)
+def build_index_command(path, watch):
+    """Write the memory-mapped vector index file that workers open."""
+    from app.models import Item, db
+
+    path = path or current_app.config["SEARCH_INDEX_FILE"]
+    if not path:
+        raise click.UsageError("Pass --path or set SEARCH_INDEX_FILE.")
+
+    while True:
+        started = time.monotonic()
+        header = Item.build_index_file(path)
+        # End the read transaction so the next build sees new writes
+        db.session.remove()
+        click.echo(
+            f"Wrote {header['count']} vectors in {header['nlist'] or 1} lists to "
+            f"{path} in {time.monotonic() - started:.2f}s."
+        )
+        if not watch:
+            return
+        time.sleep(watch)
+
+
+@chat_cli.command("rebuild-conversations")
+def rebuild_conversations_command():
+    """Recompute the conversations table from the chat history."""
+    from app.models import Conversation, db
+
+    # Running workers pick up corrected unread counts as their cached ones
+    # expire (UNREAD_COUNT_CACHE_TTL)
+    Conversation.rebuild()
+    db.session.commit()
+    click.echo(f"Rebuilt {Conversation.query.count()} conversations.")
+
+
+def register_commands(app):
+    """Register custom CLI command groups on the app."""
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(embeddings_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(chat_cli)
@@ -8,16 +8,31 @@ from flask import (
     current_app,
     jsonify,
     abort,
+    Response,
+    stream_with_context,
 )
 
 from flask_login import login_required, current_user
-from .models import Item, db, User, Order, Chat, RecentlyViewed
-from sqlalchemy import or_
-import pytz
-from app.utils.search_utils import generate_embedding
+from .models import Item, db, User, Order, Chat, Conversation, RecentlyViewed
+from sqlalchemy import func
+import json
+import time
+from app.services import chat_service
+from app.services.job_service import enqueue_item_embedding
+from app.services.recommendation_service import (
+    for_you_items,
+    record_favorite,
+    record_unfavorite,
+    record_view,
+)
+from app.utils import search_utils
+from app.utils.message_broker import chat_broker
 from datetime import datetime, timezone
 from flask_mail import Message
 
+# Messages a chat stream reads per query while catching up
+CHAT_STREAM_BATCH = 200
+
 # Create a new blueprint for main pages
 main = Blueprint("main", __name__)
 
@@ -37,17 +52,29 @@ def home():
     Displays the homepage after a successful login or signup.
     Supports searching for items by keyword.
     """
-    # Default homepage
+    # Default homepage: the newest item of each category, in one query
     categories = ["electronics", "clothing", "furniture", "books", "miscellaneous"]
 
-    category_items = [
-        Item.query.filter_by(category=category, is_active=True, is_deleted=False)
-        .order_by(Item.created_at.desc())
-        .first()
-        for category in categories
-    ]
-
-    category_items = [item for item in category_items if item]
+    newest = (
+        db.session.query(
+            Item.id,
+            func.row_number()
+            .over(partition_by=Item.category, order_by=Item.created_at.desc())
+            .label("rank"),
+        )
+        .filter(
+            Item.category.in_(categories),
+            Item.is_active == True,
+            Item.is_deleted == False,
+        )
+        .subquery()
+    )
+    category_items = sorted(
+        Item.query.join(newest, newest.c.id == Item.id)
+        .filter(newest.c.rank == 1)
+        .all(),
+        key=lambda item: categories.index(item.category),
+    )
 
     recent_items = (
         Item.query.filter_by(is_active=True)
@@ -61,6 +88,7 @@ def home():
         user=current_user,
         category_items=category_items,
         recent_items=recent_items,
+        for_you_items=for_you_items(current_user, limit=6),
     )
 
 
@@ -73,35 +101,23 @@ def buy_item():
     search = request.args.get("search", type=str)
     sort_by = request.args.get("sort_by", default="newest", type=str)
 
-    query = Item.query.filter_by(is_active=True, is_deleted=False)
-
-    if search:
-        semantic_results = Item.semantic_search(search, limit=50)
-        if not semantic_results:
-            query = query.filter(db.false())
-        else:
-            relevant_ids = [item.id for item in semantic_results]
-            query = query.filter(Item.id.in_(relevant_ids))
-
-    if categories_selected:
-        query = query.filter(Item.category.in_(categories_selected))
-    if seller_types_selected:
-        query = query.filter(Item.seller_type.in_(seller_types_selected))
-    if conditions_selected:
-        query = query.filter(Item.condition.in_(conditions_selected))
-
-    if sort_by == "newest":
-        query = query.order_by(Item.created_at.desc())
-    elif sort_by == "oldest":
-        query = query.order_by(Item.created_at.asc())
-    elif sort_by == "price_low":
-        query = query.order_by(Item.price.asc())
-    elif sort_by == "price_high":
-        query = query.order_by(Item.price.desc())
+    filters = {
+        "category": categories_selected,
+        "seller_type": seller_types_selected,
+        "condition": conditions_selected,
+    }
+
+    # Only searches are cached: they are the expensive requests and their result
+    # lists are short
+    cache = search_utils.search_result_cache
+    cache_key = cache.make_key(search, view="buy_item", sort_by=sort_by, **filters)
+    cached = cache.get(cache_key) if search else None
+    if cached is not None:
+        items = Item.hydrate(cached[0])
     else:
-        query = query.order_by(Item.created_at.desc())
-
-    items = query.all()
+        items = Item.browse_query(search, filters, sort_by, search_limit=50).all()
+        if search:
+            cache.put(cache_key, [item.id for item in items])
 
     categories = [
         c[0] for c in db.session.query(Item.category).distinct().all() if c[0]
@@ -181,10 +197,10 @@ def post_item():
                 price=price,
                 item_image=uploaded_image_filename,
                 seller_id=current_user.id,
-                embedding=generate_embedding(f"{title} {description}"),
             )
 
             db.session.add(new_item)
+            enqueue_item_embedding(new_item)
             db.session.commit()
 
             flash("Item posted successfully!", "success")
@@ -213,19 +229,12 @@ def item_details(item_id):
 
     # --- Recently Viewed (Upsert Logic) ---
     if current_user.is_authenticated:
-        existing_view = RecentlyViewed.query.filter_by(
-            user_id=current_user.id, item_id=item.id
-        ).first()
-
-        if existing_view:
-            existing_view.viewed_at = datetime.now(tz=timezone.utc)
-        else:
-            new_view = RecentlyViewed(user_id=current_user.id, item_id=item.id)
-            db.session.add(new_view)
-
+        record_view(current_user.id, item)
         db.session.commit()
 
-    return render_template("item_details.html", item=item)
+    return render_template(
+        "item_details.html", item=item, similar_items=item.similar_items(limit=4)
+    )
 
 
 @main.route("/seller/<int:seller_id>")
@@ -413,8 +422,8 @@ def edit_item(item_id):
                 flash("Invalid price. Please enter a valid number.", "danger")
                 return redirect(url_for("main.edit_item", item_id=item.id))
 
-            # Update embedding
-            item.embedding = generate_embedding(f"{item.title} {item.description}")
+            # Embedding is regenerated by the background worker
+            enqueue_item_embedding(item)
 
             uploaded_image_filename = request.form.get("uploaded_image_filename")
 
@@ -595,6 +604,7 @@ def add_favorite(item_id):
 
     if not current_user.favorites.filter_by(id=item.id).first():
         current_user.favorites.append(item)
+        record_favorite(current_user.id, item)
         db.session.commit()
         flash("Added to favorites", "success")
 
@@ -612,6 +622,7 @@ def remove_favorite(item_id):
 
     if current_user.favorites.filter_by(id=item.id).first():
         current_user.favorites.remove(item)
+        record_unfavorite(current_user.id)
         db.session.commit()
         flash("Removed from favorites", "success")
 
@@ -630,13 +641,7 @@ def autocomplete():
         return jsonify([])
 
     # Get up to 8 matching items
-    items = (
-        Item.query.filter_by(is_deleted=False)
-        .filter(Item.title.ilike(f"%{query}%"))
-        .order_by(Item.created_at.desc())
-        .limit(8)
-        .all()
-    )
+    items = Item.suggest(query, limit=8)
 
     results = []
     for item in items:
@@ -696,10 +701,7 @@ You have received a new message from the contact form:
 def chat(receiver_id):
     seller = User.query.get_or_404(receiver_id)
 
-    Chat.query.filter_by(
-        sender_id=receiver_id, receiver_id=current_user.id, is_read=False
-    ).update({"is_read": True})
-
+    chat_service.mark_read(current_user.id, receiver_id)
     db.session.commit()
 
     return render_template("chat.html", receiver_id=receiver_id, receiver=seller)
@@ -735,47 +737,106 @@ def send_message():
 @main.route("/get_messages/<int:user_id>")
 @login_required
 def get_messages(user_id):
-    ny_tz = pytz.timezone("America/New_York")
+    """
+    Messages of the conversation with `user_id`, oldest first: the latest
+    `limit` ones, the ones after `since_id`, or the ones before `before_id`
+    when scrolling back.
+    """
+    limit = min(max(request.args.get("limit", 100, type=int), 1), 200)
+    msgs = chat_service.page(
+        current_user.id,
+        user_id,
+        since_id=request.args.get("since_id", type=int),
+        before_id=request.args.get("before_id", type=int),
+        limit=limit,
+    )
+    return jsonify([chat_service.message_payload(m) for m in msgs])
+
 
-    msgs = (
-        Chat.query.filter(
-            ((Chat.sender_id == current_user.id) & (Chat.receiver_id == user_id))
-            | ((Chat.sender_id == user_id) & (Chat.receiver_id == current_user.id))
+@main.route("/chat/<int:user_id>/stream")
+@login_required
+def stream_messages(user_id):
+    """
+    Server-Sent Events stream of the messages exchanged with `user_id` after
+    the `since_id` query parameter (or the browser's Last-Event-ID on
+    reconnect); without either, only messages sent from now on. The stream is
+    woken by chat events published on commit and ends after
+    CHAT_STREAM_MAX_SECONDS, after which EventSource reconnects on its own.
+    When this worker already holds CHAT_STREAM_MAX_PER_WORKER streams it
+    answers 503, and the page polls `get_messages` instead.
+    """
+    if not chat_service.acquire_stream(
+        current_app.config["CHAT_STREAM_MAX_PER_WORKER"]
+    ):
+        return (
+            jsonify({"error": "Too many open chat streams"}),
+            503,
+            {"Retry-After": "30"},
         )
-        .order_by(Chat.timestamp)
-        .all()
-    )
 
-    return jsonify(
-        [
-            {
-                "sender": m.sender_id,
-                "content": m.content,
-                "time": m.timestamp.replace(tzinfo=pytz.utc)
-                .astimezone(ny_tz)
-                .strftime("%b %d • %I:%M %p"),
-            }
-            for m in msgs
-        ]
+    reader_id = current_user.id
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    if last_id is None:
+        last_id = request.args.get("since_id", type=int)
+    keepalive = current_app.config["CHAT_STREAM_KEEPALIVE"]
+    deadline = time.monotonic() + current_app.config["CHAT_STREAM_MAX_SECONDS"]
+
+    def events(last_id):
+        # Subscribed before the catch-up read so no message falls in between
+        with chat_broker.subscribe(reader_id) as subscription:
+            if last_id is None:
+                last_id = chat_service.last_message_id(reader_id, user_id)
+            yield "retry: 2000\n\n"
+            wake = True
+            while True:
+                # Page through the whole backlog, not just one page per event
+                while wake:
+                    messages = chat_service.messages_after(
+                        reader_id, user_id, last_id, limit=CHAT_STREAM_BATCH
+                    )
+                    for message in messages:
+                        last_id = message.id
+                        payload = json.dumps(chat_service.message_payload(message))
+                        yield f"id: {last_id}\ndata: {payload}\n\n"
+                    wake = len(messages) == CHAT_STREAM_BATCH
+                # Don't hold a connection or snapshot while waiting
+                db.session.rollback()
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                event = subscription.get(timeout=min(keepalive, remaining))
+                if event is None:
+                    wake = False
+                    yield ": keepalive\n\n"
+                    continue
+                # An overflowed queue may have dropped events of this pair
+                wake = subscription.overflowed or user_id in (
+                    event["sender_id"],
+                    event["receiver_id"],
+                )
+                subscription.overflowed = False
+
+    response = Response(
+        stream_with_context(events(last_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+    # Runs when the server closes the response, even if it was never iterated
+    response.call_on_close(chat_service.release_stream)
+    return response
 
 
 @main.route("/inbox")
 @login_required
 def inbox():
-    users = (
-        User.query.join(
-            Chat, or_(Chat.sender_id == User.id, Chat.receiver_id == User.id)
-        )
-        .filter(
-            or_(Chat.sender_id == current_user.id, Chat.receiver_id == current_user.id)
+    conversations = [
+        (user, unread_count)
+        for user, last_message, unread_count, total in Conversation.for_user(
+            current_user.id
         )
-        .filter(User.id != current_user.id)
-        .distinct()
-        .all()
-    )
-
-    return render_template("inbox.html", conversations=users)
+    ]
+    return render_template("inbox.html", conversations=conversations)
 
 
 @main.route("/profile")
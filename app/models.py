@@ -3,11 +3,67 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from flask import current_app
 from datetime import datetime
-from app.utils.search_utils import generate_embedding, cosine_similarity
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.types import TypeDecorator
+import os
+import threading
+import time
+from types import SimpleNamespace
+import numpy as np
+from app.utils.search_utils import (
+    generate_query_embedding,
+    encode_embedding,
+    decode_embedding,
+    embedding_text,
+    embedding_text_hash,
+)
+from app.utils import search_utils
+from app.utils.ann_index import IVFIndex
+from app.utils.index_file import SegmentedIndex, write_index_file
+from app.utils.vector_index import normalize, top_k
+from app.utils.autocomplete_index import AutocompleteIndex
+from app.utils.text_index import BM25Index, reciprocal_rank_fusion
+from app.utils.taste_profile import taste_profile_cache
+from app.utils.message_broker import chat_broker
+from app.utils.unread_cache import unread_count_cache
 from app.services.storage_service import generate_get_url
 
 db = SQLAlchemy()
 
+# Process-level semantic, keyword and autocomplete indexes, built lazily from
+# the items table
+_item_indexes = {"vector": None, "text": None, "autocomplete": None}
+_item_index_lock = threading.Lock()
+# One rebuild of each index at a time. Item writes committed while it runs are
+# recorded here and replayed onto the new index before it is swapped in.
+_index_build_locks = {name: threading.Lock() for name in _item_indexes}
+_index_build_writes = {}
+
+# Item columns stored alongside the vector index so searches can filter on them
+SEARCH_FILTER_ATTRIBUTES = ("category", "condition", "seller_type")
+
+
+class Float32Vector(TypeDecorator):
+    """
+    Stores a vector as fixed-width little-endian float32 bytes.
+    Values are decoded with np.frombuffer, so loaded embeddings are zero-copy, read-only arrays.
+    """
+
+    impl = db.LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return encode_embedding(value)
+
+    def process_result_value(self, value, dialect):
+        return decode_embedding(value)
+
+    def compare_values(self, x, y):
+        return encode_embedding(x) == encode_embedding(y)
+
+
 favorites_table = db.Table(
     "favorites",
     db.Column("user_id", db.Integer, db.ForeignKey("users.id"), primary_key=True),
@@ -100,28 +156,418 @@ class Item(db.Model):
     seller_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
     is_deleted = db.Column(db.Boolean, default=False, nullable=False)
-    embedding = db.Column(
-        db.PickleType, nullable=True
-    )  # Stores numpy array of embedding
+    embedding = db.Column(Float32Vector, nullable=True)
+    embedding_dim = db.Column(db.SmallInteger, nullable=True)
+    # Name of the model that produced `embedding`
+    embedding_model = db.Column(db.String(100), nullable=True)
+    # `embedding_text_hash` of the text `embedding` was generated from
+    embedding_hash = db.Column(db.String(64), nullable=True)
 
     def __repr__(self):
         return f"<Item {self.title} (${self.price})>"
 
+    @property
+    def embedding_text(self):
+        """
+        The text that the item's embedding is generated from.
+        """
+        return embedding_text(self.title, self.description)
+
+    @property
+    def embedding_text_hash(self):
+        """
+        SHA-256 hex digest of `embedding_text`.
+        """
+        return embedding_text_hash(self.embedding_text)
+
+    def embedding_is_stale(self, model=None):
+        """
+        True if the item has no embedding or its embedded text changed since
+        it was generated; with `model`, also if another model generated it.
+        Edits to price, images or status leave the embedding current.
+        """
+        if (
+            self.embedding_dim is None
+            or self.embedding_hash != self.embedding_text_hash
+        ):
+            return True
+        return model is not None and self.embedding_model != model
+
+    @db.validates("embedding")
+    def _track_embedding_dim(self, key, embedding):
+        # Attributed to the default model; callers encoding with another model
+        # set `embedding_model` after the embedding
+        if embedding is None:
+            self.embedding_dim = self.embedding_model = None
+        else:
+            self.embedding_dim = len(embedding)
+            self.embedding_model = search_utils.default_model_name()
+        return embedding
+
     @classmethod
     def search(cls, term):
         """
-        Returns a SQLAlchemy query filtered by a search term (title or description).
+        Returns a SQLAlchemy query of the active items whose title or description
+        contains a word of the search term, looked up in the keyword index.
         If no term is provided, returns the base Item.query.
         """
         if not term:
             return cls.query
-        term = term.strip()
-        return cls.query.filter(
-            cls.title.ilike(f"%{term}%") | cls.description.ilike(f"%{term}%")
+        ids = cls.lexical_search_ids(term, limit=len(cls.text_index()))
+        return cls.query.filter(cls.id.in_(ids))
+
+    @classmethod
+    def vector_index(cls):
+        """
+        Returns the process-level vector index of active item embeddings.
+        Built on first use and rebuilt once older than `SEARCH_INDEX_MAX_AGE` seconds,
+        so writes made by other worker processes are eventually picked up.
+        Writes made in this process are applied incrementally on commit.
+
+        The index only holds embeddings from the active model in the
+        `embedding_models` registry, recorded as its `model_version`. After a
+        re-embedding switches models, each process keeps searching its current
+        index with the old model until the rebuild, then moves to the new one.
+
+        If `SEARCH_INDEX_FILE` points to a file written by `flask search
+        build-index`, it is memory-mapped instead of read from the database and
+        reopened at the same interval once the file has been rebuilt.
+        """
+        max_age = current_app.config.get("SEARCH_INDEX_MAX_AGE", 300)
+
+        def build(previous):
+            index = cls._open_index_file(previous)
+            return cls.build_vector_index() if index is None else index
+
+        def swapped(index, previous):
+            # Results cached against the old index may miss other workers' writes
+            search_utils.search_result_cache.bump_generation()
+            if previous is not None and index.model_version != previous.model_version:
+                # Taste profiles sum embeddings of the old model
+                taste_profile_cache.clear()
+
+        return _current_item_index("vector", build, max_age, swapped)
+
+    @classmethod
+    def build_vector_index(cls):
+        """
+        Builds an IVFIndex of the active item embeddings from the database,
+        keeping only those produced by the active embedding model.
+        """
+        config = current_app.config
+        model = EmbeddingModel.active_name()
+        columns = [getattr(cls, name) for name in SEARCH_FILTER_ATTRIBUTES]
+        rows = (
+            db.session.query(cls.id, cls.embedding, *columns)
+            .filter(
+                cls.is_active == True,
+                cls.is_deleted == False,
+                cls.embedding.isnot(None),
+                cls.embedding_model == model,
+            )
+            .order_by(cls.id)
+            .yield_per(1000)
+        )
+        return IVFIndex.from_rows(
+            rows,
+            nlist=config.get("SEARCH_ANN_NLIST") or None,
+            nprobe=config.get("SEARCH_ANN_NPROBE", 8),
+            min_train_size=config.get("SEARCH_ANN_MIN_TRAIN_SIZE", 10000),
+            attributes=SEARCH_FILTER_ATTRIBUTES,
+            quantization=config.get("SEARCH_INDEX_QUANTIZATION"),
+            model_version=model,
+        )
+
+    @classmethod
+    def build_index_file(cls, path):
+        """
+        Writes the active item embeddings to the index file at `path` for
+        workers to memory-map. Returns the file header.
+        """
+        # Taken before reading, so workers replay any write that races the build
+        built_at = time.time()
+        index = cls.build_vector_index()
+        return write_index_file(path, index, built_at=built_at)
+
+    @classmethod
+    def _open_index_file(cls, previous):
+        """
+        Returns a SegmentedIndex over `SEARCH_INDEX_FILE`, reusing `previous` if
+        it maps the same file, or None if no usable file is configured.
+
+        A file built more than `SEARCH_INDEX_MAX_AGE` seconds ago is not used,
+        so if its builder stops, workers go back to rebuilding from the
+        database instead of serving a frozen catalog.
+        """
+        config = current_app.config
+        path = config.get("SEARCH_INDEX_FILE")
+        if not path or not os.path.exists(path):
+            return None
+        nprobe = config.get("SEARCH_ANN_NPROBE", 8)
+        try:
+            if isinstance(previous, SegmentedIndex) and previous.path == path:
+                index = previous.reopen(nprobe=nprobe)
+            else:
+                index = SegmentedIndex.open(path, nprobe=nprobe)
+        except (OSError, ValueError):
+            current_app.logger.exception("Could not open search index file %s", path)
+            return None
+        age = time.time() - index.base.built_at
+        if age >= config.get("SEARCH_INDEX_MAX_AGE", 300):
+            current_app.logger.warning(
+                "Search index file %s was built %.0fs ago; is `flask search "
+                "build-index --watch` running? Rebuilding from the database",
+                path,
+                age,
+            )
+            return None
+        return index
+
+    @classmethod
+    def text_index(cls):
+        """
+        Returns the process-level BM25Index over active item titles and
+        descriptions. Built and refreshed like `vector_index`.
+        """
+        max_age = current_app.config.get("SEARCH_INDEX_MAX_AGE", 300)
+
+        def build(previous):
+            columns = [getattr(cls, name) for name in SEARCH_FILTER_ATTRIBUTES]
+            rows = (
+                db.session.query(cls.id, cls.title, cls.description, *columns)
+                .filter(cls.is_active == True, cls.is_deleted == False)
+                .order_by(cls.id)
+                .yield_per(1000)
+            )
+            return BM25Index.from_rows(
+                (
+                    row.id,
+                    embedding_text(row.title, row.description),
+                    dict(zip(SEARCH_FILTER_ATTRIBUTES, row[3:])),
+                )
+                for row in rows
+            )
+
+        def swapped(index, previous):
+            search_utils.search_result_cache.bump_generation()
+
+        return _current_item_index("text", build, max_age, swapped)
+
+    @classmethod
+    def autocomplete_index(cls):
+        """
+        Returns the process-level AutocompleteIndex over active item titles,
+        ranked by recency and number of favorites. Built and refreshed like
+        `vector_index`; popularity is picked up on each rebuild.
+        """
+        max_age = current_app.config.get("SEARCH_INDEX_MAX_AGE", 300)
+
+        def build(previous):
+            favorite_counts = (
+                db.session.query(
+                    favorites_table.c.item_id,
+                    db.func.count().label("favorites"),
+                )
+                .group_by(favorites_table.c.item_id)
+                .subquery()
+            )
+            rows = (
+                db.session.query(
+                    cls.id,
+                    cls.title,
+                    cls.created_at,
+                    db.func.coalesce(favorite_counts.c.favorites, 0),
+                )
+                .outerjoin(favorite_counts, favorite_counts.c.item_id == cls.id)
+                .filter(cls.is_active == True, cls.is_deleted == False)
+                .order_by(cls.id)
+                .yield_per(1000)
+            )
+            return AutocompleteIndex.from_rows(rows)
+
+        return _current_item_index("autocomplete", build, max_age)
+
+    @classmethod
+    def reset_search_indexes(cls):
+        """
+        Drops the process-level indexes so the next search rebuilds them.
+        """
+        with _item_index_lock:
+            for name in _item_indexes:
+                _item_indexes[name] = None
+        search_utils.search_result_cache.bump_generation()
+
+    @classmethod
+    def warm_search_indexes(cls):
+        """
+        Builds every process-level search index up front, e.g. at worker boot,
+        so the first searches do not pay for it.
+        """
+        cls.vector_index()
+        cls.text_index()
+        cls.autocomplete_index()
+
+    @classmethod
+    def semantic_search_scores(
+        cls, term, limit=20, threshold=0.25, filters=None, timings=None
+    ):
+        """
+        Returns up to `limit` `(id, score)` pairs for the active items most
+        similar to `term`, ordered by descending cosine similarity, without
+        loading any Item rows. `filters` maps any of SEARCH_FILTER_ATTRIBUTES to a
+        list of allowed values and is applied inside the index, before the top
+        `limit` are chosen.
+
+        The query is encoded with the model of the index being searched.
+
+        With a quantized index, `SEARCH_RERANK_FACTOR` times `limit` candidates
+        are re-scored with the full-precision embeddings stored in the database,
+        so returned scores are exact. Candidates whose stored embedding already
+        comes from a newer model keep their approximate score.
+
+        When `timings` is a dict, it receives the milliseconds spent embedding
+        the query ("embed"), scoring rows ("score"), selecting the top results
+        ("select") and re-ranking them ("rerank").
+        """
+        index = cls.vector_index()
+        started = time.perf_counter()
+        query_emb = generate_query_embedding(term, model=index.model_version)
+        if timings is not None:
+            timings["embed"] = (time.perf_counter() - started) * 1000
+        if query_emb is None:
+            return []
+
+        if index.quantization is None:
+            return index.search(
+                query_emb,
+                k=limit,
+                threshold=threshold,
+                filters=filters,
+                timings=timings,
+            )
+
+        factor = current_app.config.get("SEARCH_RERANK_FACTOR", 4)
+        candidates = index.search(
+            query_emb, k=limit * factor, filters=filters, timings=timings
         )
+        started = time.perf_counter()
+        ids = [item_id for item_id, _ in candidates]
+        exact = cls.rerank(ids, query_emb, len(ids), model=index.model_version)
+        scores = {**dict(candidates), **dict(exact)}
+        results = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+        results = results[:limit]
+        if timings is not None:
+            timings["rerank"] = (time.perf_counter() - started) * 1000
+        if threshold is not None:
+            results = [
+                (item_id, score) for item_id, score in results if score >= threshold
+            ]
+        return results
 
     @classmethod
-    def semantic_search(cls, term, limit=20, threshold=0.25):
+    def rerank(cls, ids, query_emb, limit, model=None):
+        """
+        Scores the items `ids` against `query_emb` using their stored
+        full-precision embeddings, only those from `model` if given.
+        Returns the best `limit` `(id, score)` pairs.
+        """
+        if not ids:
+            return []
+        query = db.session.query(cls.id, cls.embedding).filter(
+            cls.id.in_(ids), cls.embedding.isnot(None)
+        )
+        if model is not None:
+            query = query.filter(cls.embedding_model == model)
+        rows = query.all()
+        q = normalize(query_emb)
+        rows = [(item_id, normalize(embedding)) for item_id, embedding in rows]
+        rows = [(item_id, vec) for item_id, vec in rows if vec is not None]
+        if q is None or not rows:
+            return []
+        matrix = np.stack([vec for _, vec in rows])
+        if matrix.shape[1] != q.shape[0]:
+            return []
+        ids = np.array([item_id for item_id, _ in rows], dtype=np.int64)
+        return top_k(ids, matrix @ q, limit)
+
+    @classmethod
+    def semantic_search_ids(cls, term, limit=20, threshold=0.25, filters=None):
+        """
+        Returns the ids of the `limit` active items most similar to `term`,
+        ordered by descending cosine similarity, without loading any Item rows.
+        """
+        results = cls.semantic_search_scores(
+            term, limit=limit, threshold=threshold, filters=filters
+        )
+        return [item_id for item_id, score in results]
+
+    @classmethod
+    def lexical_search_ids(cls, term, limit=20, filters=None):
+        """
+        Returns the ids of the `limit` active items whose title or description
+        best match the words of `term`, ordered by descending BM25 score.
+        """
+        results = cls.text_index().search(term, k=limit, filters=filters)
+        return [item_id for item_id, score in results]
+
+    @classmethod
+    def hybrid_search_ids(cls, term, limit=20, threshold=0.25, filters=None):
+        """
+        Returns the ids of the `limit` best matches for `term`, fusing the
+        semantic and keyword rankings with reciprocal rank fusion. Keyword hits
+        catch exact model numbers and brand names the embedding model misses;
+        one the semantic search did not find must contain every word of `term`
+        (stopwords aside), so sharing one common word is not enough.
+        """
+        semantic = cls.semantic_search_ids(
+            term, limit=limit, threshold=threshold, filters=filters
+        )
+        found = set(semantic)
+        text_index = cls.text_index()
+        lexical = [
+            item_id
+            for item_id in cls.lexical_search_ids(term, limit=limit, filters=filters)
+            if item_id in found or text_index.matches_all(item_id, term)
+        ]
+        fused = reciprocal_rank_fusion(semantic, lexical)
+        return [item_id for item_id, score in fused[:limit]]
+
+    @classmethod
+    def browse_query(cls, search=None, filters=None, sort_by="newest", search_limit=50):
+        """
+        Returns a query of active items for the browse pages.
+        With a search term, only the `search_limit` best hybrid search matches are
+        kept. `filters` maps any of SEARCH_FILTER_ATTRIBUTES to a list of allowed
+        values. `sort_by` is newest (default), oldest, price_low, price_high or
+        relevance, which keeps the search ranking (newest without a search).
+        """
+        query = cls.query.filter_by(is_active=True, is_deleted=False)
+        filters = {name: values for name, values in (filters or {}).items() if values}
+
+        if search:
+            # Filters are applied inside the indexes so narrow filters still fill
+            # the top results
+            ids = cls.hybrid_search_ids(search, limit=search_limit, filters=filters)
+            if not ids:
+                return query.filter(db.false())
+            query = query.filter(cls.id.in_(ids))
+
+        for name, values in filters.items():
+            query = query.filter(getattr(cls, name).in_(values))
+
+        if search and sort_by == "relevance":
+            rank = {item_id: position for position, item_id in enumerate(ids)}
+            return query.order_by(db.case(rank, value=cls.id))
+
+        order = {
+            "oldest": cls.created_at.asc(),
+            "price_low": cls.price.asc(),
+            "price_high": cls.price.desc(),
+        }.get(sort_by, cls.created_at.desc())
+        return query.order_by(order)
+
+    @classmethod
+    def semantic_search(cls, term, limit=20, threshold=0.25, filters=None):
         """
         Performs a semantic search using cosine similarity on embeddings.
         Fallback to standard search if no term provided.
@@ -135,32 +581,36 @@ class Item(db.Model):
                 .all()
             )
 
-        # 1. Generate query embedding
-        query_emb = generate_embedding(term)
-        if query_emb is None:
+        ids = cls.semantic_search_ids(
+            term, limit=limit, threshold=threshold, filters=filters
+        )
+        if not ids:
             return []
 
-        # 2. Fetch all active items with embeddings
-        # NOTE: This loads all active item embeddings into memory.
-        # OK for <10k items.
-        items = cls.query.filter(cls.is_active == True).all()
-        items = [item for item in items if item.embedding is not None]
+        # Only the top matches are hydrated, then restored to relevance order
+        return cls.hydrate(ids)
 
-        if not items:
+    @classmethod
+    def hydrate(cls, ids):
+        """
+        Loads the active items with the given ids, in the order of `ids`.
+        """
+        if not ids:
             return []
+        items = cls.query.filter(
+            cls.id.in_(ids), cls.is_active == True, cls.is_deleted == False
+        ).all()
+        rank = {item_id: i for i, item_id in enumerate(ids)}
+        return sorted(items, key=lambda item: rank[item.id])
 
-        # 3. Calculate similarities
-        scored_items = []
-        for item in items:
-            score = cosine_similarity(query_emb, item.embedding)
-            if score >= threshold:
-                scored_items.append((score, item))
-
-        # 4. Sort by score (descending)
-        scored_items.sort(key=lambda x: x[0], reverse=True)
-
-        # 5. Return top N items
-        return [item for score, item in scored_items[:limit]]
+    @classmethod
+    def suggest(cls, term, limit=8):
+        """
+        Returns up to `limit` active Items for a partially typed search term,
+        looked up in the autocomplete index. Only the matched rows are loaded.
+        """
+        matches = cls.autocomplete_index().suggest(term, limit)
+        return cls.hydrate([item_id for item_id, title in matches])
 
     @property
     def item_image_url(self):
@@ -173,6 +623,91 @@ class Item(db.Model):
             image_url = generate_get_url(filename=self.item_image)
         return image_url or url_for("static", filename="images/default_item.webp")
 
+    def similar_items(self, limit=8):
+        """
+        Returns up to `limit` active items most similar to this one, read from the
+        precomputed `item_neighbors` table in a single query.
+        """
+        return (
+            Item.query.join(ItemNeighbor, ItemNeighbor.neighbor_id == Item.id)
+            .filter(
+                ItemNeighbor.item_id == self.id,
+                Item.is_active == True,
+                Item.is_deleted == False,
+            )
+            .order_by(ItemNeighbor.score.desc())
+            .limit(limit)
+            .all()
+        )
+
+
+class ItemNeighbor(db.Model):
+    """
+    Precomputed nearest neighbours of an item by embedding similarity.
+    Maintained by the job worker whenever embeddings change.
+    """
+
+    __tablename__ = "item_neighbors"
+    item_id = db.Column(db.Integer, db.ForeignKey("items.id"), primary_key=True)
+    neighbor_id = db.Column(db.Integer, db.ForeignKey("items.id"), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f"<ItemNeighbor {self.item_id} -> {self.neighbor_id} ({self.score:.3f})>"
+
+
+class EmbeddingModel(db.Model):
+    """
+    Registry of the embedding models the catalog has been encoded with.
+
+    Exactly one model is "active": item embeddings in `items` come from it and
+    searches use it. A "pending" model is being re-embedded into
+    `item_embeddings` in the background and becomes active once every item is
+    staged; the model it replaces is then "retired".
+    """
+
+    __tablename__ = "embedding_models"
+    name = db.Column(db.String(100), primary_key=True)
+    dim = db.Column(db.SmallInteger, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    activated_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<EmbeddingModel {self.name} ({self.status})>"
+
+    @classmethod
+    def active_name(cls):
+        """
+        Returns the name of the active model, or the configured default model
+        if the registry is empty.
+        """
+        name = db.session.query(cls.name).filter_by(status="active").limit(1).scalar()
+        return name or search_utils.default_model_name()
+
+    @classmethod
+    def pending_name(cls):
+        """
+        Returns the name of the model being re-embedded, or None.
+        """
+        return db.session.query(cls.name).filter_by(status="pending").limit(1).scalar()
+
+
+class ItemEmbedding(db.Model):
+    """
+    Embedding of an item under a pending model, staged until the switch.
+    """
+
+    __tablename__ = "item_embeddings"
+    item_id = db.Column(db.Integer, db.ForeignKey("items.id"), primary_key=True)
+    model = db.Column(
+        db.String(100), db.ForeignKey("embedding_models.name"), primary_key=True
+    )
+    embedding = db.Column(Float32Vector, nullable=False)
+
+    def __repr__(self):
+        return f"<ItemEmbedding {self.item_id} ({self.model})>"
+
 
 class Order(db.Model):
     __tablename__ = "orders"
@@ -203,3 +738,501 @@ class Chat(db.Model):
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)
+
+    # Serves keyset reads of one direction of a conversation (chat_service.page)
+    __table_args__ = (
+        db.Index("ix_chat_sender_receiver_id", "sender_id", "receiver_id", "id"),
+    )
+
+
+class Conversation(db.Model):
+    """
+    One row per pair of users who exchanged messages, keyed by the ordered
+    pair (`user_low_id` < `user_high_id`), so inbox and unread-count reads do
+    not scan the chat history.
+
+    Holds the latest message and, for each side, how many messages it has
+    received but not read. Kept current in the same transaction as every
+    chat write by the session hooks at the end of this module, except
+    bulk read-marking, which goes through `chat_service.mark_read`.
+    `flask chat rebuild-conversations` recomputes the table from `chat`.
+    """
+
+    __tablename__ = "conversations"
+    user_low_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    user_high_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    # Nulled when that message is deleted; the flush hook then repoints it
+    last_message_id = db.Column(
+        db.Integer, db.ForeignKey("chat.id", ondelete="SET NULL"), nullable=True
+    )
+    last_activity_at = db.Column(db.DateTime, nullable=True)
+    low_unread_count = db.Column(db.Integer, nullable=False, default=0)
+    high_unread_count = db.Column(db.Integer, nullable=False, default=0)
+
+    last_message = db.relationship("Chat")
+
+    __table_args__ = (
+        db.Index("ix_conversations_low_activity", "user_low_id", "last_activity_at"),
+        db.Index("ix_conversations_high_activity", "user_high_id", "last_activity_at"),
+    )
+
+    def __repr__(self):
+        return f"<Conversation {self.user_low_id} <-> {self.user_high_id}>"
+
+    @staticmethod
+    def pair(user_id, other_id):
+        return min(user_id, other_id), max(user_id, other_id)
+
+    @classmethod
+    def involving(cls, user_id):
+        """
+        Filter for the conversations of `user_id`, leaving out messages to self.
+        """
+        return db.and_(
+            db.or_(cls.user_low_id == user_id, cls.user_high_id == user_id),
+            cls.user_low_id != cls.user_high_id,
+        )
+
+    @classmethod
+    def unread_column(cls, user_id):
+        """
+        Expression for the number of unread messages `user_id` has received.
+        """
+        return db.case(
+            (cls.user_low_id == user_id, cls.low_unread_count),
+            else_=cls.high_unread_count,
+        )
+
+    @classmethod
+    def for_user(cls, user_id):
+        """
+        Returns a query of `(partner, last_message, unread_count, total)` rows,
+        one per user that `user_id` has exchanged messages with, most recent
+        activity first. `total` is the number of conversations, so a page of
+        the query carries the count with it.
+        """
+        partner_id = db.case(
+            (cls.user_low_id == user_id, cls.user_high_id), else_=cls.user_low_id
+        )
+        return (
+            db.session.query(
+                User,
+                Chat,
+                cls.unread_column(user_id),
+                db.func.count().over().label("total"),
+            )
+            .select_from(cls)
+            .join(User, User.id == partner_id)
+            .join(Chat, Chat.id == cls.last_message_id)
+            .filter(cls.involving(user_id))
+            .order_by(cls.last_activity_at.desc(), cls.last_message_id.desc())
+        )
+
+    @classmethod
+    def unread_total(cls, user_id):
+        """
+        Returns the number of unread messages `user_id` has received.
+        """
+        total = (
+            db.session.query(db.func.sum(cls.unread_column(user_id)))
+            .filter(cls.involving(user_id))
+            .scalar()
+        )
+        return int(total or 0)
+
+    @classmethod
+    def cached_unread_total(cls, user_id):
+        """
+        `unread_total` served from the process-level unread count cache,
+        which is invalidated when a transaction changing the count commits.
+        """
+        return unread_count_cache.get(user_id, lambda: cls.unread_total(user_id))
+
+    @classmethod
+    def unread_by_partner(cls, user_id):
+        """
+        Returns `(partner_id, unread_count)` pairs for the conversations of
+        `user_id` that have unread messages.
+        """
+        partner_id = db.case(
+            (cls.user_low_id == user_id, cls.user_high_id), else_=cls.user_low_id
+        )
+        unread = cls.unread_column(user_id)
+        return (
+            db.session.query(partner_id, unread)
+            .filter(cls.involving(user_id), unread > 0)
+            .all()
+        )
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recomputes every conversation from the `chat` table with one
+        set-based INSERT ... SELECT. Does not commit.
+        """
+        low = db.case(
+            (Chat.sender_id < Chat.receiver_id, Chat.sender_id), else_=Chat.receiver_id
+        )
+        high = db.case(
+            (Chat.sender_id < Chat.receiver_id, Chat.receiver_id), else_=Chat.sender_id
+        )
+
+        def unread_for(side):
+            return db.func.sum(
+                db.case(
+                    (
+                        db.and_(
+                            Chat.receiver_id == side,
+                            Chat.sender_id != Chat.receiver_id,
+                            Chat.is_read == False,
+                        ),
+                        1,
+                    ),
+                    else_=0,
+                )
+            )
+
+        pairs = (
+            db.select(
+                low.label("user_low_id"),
+                high.label("user_high_id"),
+                db.func.max(Chat.id).label("last_message_id"),
+                unread_for(low).label("low_unread_count"),
+                unread_for(high).label("high_unread_count"),
+            )
+            .group_by(low, high)
+            .subquery()
+        )
+        latest = db.aliased(Chat)
+        rows = db.select(
+            pairs.c.user_low_id,
+            pairs.c.user_high_id,
+            pairs.c.last_message_id,
+            latest.timestamp,
+            pairs.c.low_unread_count,
+            pairs.c.high_unread_count,
+        ).join(latest, latest.id == pairs.c.last_message_id)
+
+        db.session.execute(db.delete(cls))
+        db.session.execute(
+            db.insert(cls).from_select(
+                [
+                    "user_low_id",
+                    "user_high_id",
+                    "last_message_id",
+                    "last_activity_at",
+                    "low_unread_count",
+                    "high_unread_count",
+                ],
+                rows,
+            )
+        )
+
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    # Failed jobs are not retried before this time
+    run_after = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index("ix_jobs_kind_status_id", "kind", "status", "id"),)
+
+    def __repr__(self):
+        return f"<Job #{self.id} {self.kind} ({self.status})>"
+
+
+# Keep the process-level index in sync with item writes made in this process
+
+
+def _index_snapshot(item):
+    """
+    Captures the fields the search indexes store for `item`,
+    or None if it should not be searchable.
+    """
+    if not item.is_active or item.is_deleted:
+        return None
+    return {
+        "embedding": item.embedding,
+        "embedding_model": item.embedding_model,
+        "text": item.embedding_text,
+        "title": item.title,
+        "created_at": item.created_at,
+        "attributes": {name: getattr(item, name) for name in SEARCH_FILTER_ATTRIBUTES},
+    }
+
+
+def _current_item_index(name, build, max_age, swapped=None):
+    """
+    Returns the process-level index `name`, replacing it with `build(previous)`
+    once it is missing or older than `max_age` seconds, then calling
+    `swapped(index, previous)`.
+
+    The build runs outside `_item_index_lock`, in one thread at a time: others
+    keep searching the stale index meanwhile and only wait if there is none.
+    """
+    index = _item_indexes[name]
+    if index is not None and time.monotonic() - index.built_at < max_age:
+        return index
+    build_lock = _index_build_locks[name]
+    if not build_lock.acquire(blocking=index is None):
+        return index
+    try:
+        previous = _item_indexes[name]
+        if previous is not None and time.monotonic() - previous.built_at < max_age:
+            return previous
+        with _item_index_lock:
+            writes = _index_build_writes[name] = {}
+        try:
+            index = build(previous)
+        finally:
+            with _item_index_lock:
+                del _index_build_writes[name]
+        with _item_index_lock:
+            for item_id, snapshot in writes.items():
+                _apply_index_change(name, index, item_id, snapshot)
+            _item_indexes[name] = index
+        if index is not previous and swapped is not None:
+            swapped(index, previous)
+        return index
+    finally:
+        build_lock.release()
+
+
+def _apply_index_change(name, index, item_id, snapshot):
+    """
+    Applies the committed state of one item (None once unsearchable) to `index`.
+    """
+    if snapshot is None:
+        index.remove(item_id)
+    elif name == "vector":
+        if snapshot["embedding_model"] == index.model_version:
+            index.add(item_id, snapshot["embedding"], snapshot["attributes"])
+        else:
+            # Vectors of another model are not comparable with the index's
+            index.remove(item_id)
+    elif name == "text":
+        index.add(item_id, snapshot["text"], snapshot["attributes"])
+    else:
+        index.add(item_id, snapshot["title"], snapshot["created_at"])
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_item_changes(session, flush_context):
+    pending = session.info.setdefault("item_index_changes", {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Item):
+            pending[obj.id] = _index_snapshot(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Item):
+            pending[obj.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_item_changes(session):
+    pending = session.info.pop("item_index_changes", None)
+    if not pending:
+        return
+    # Any committed item write invalidates cached search results
+    search_utils.search_result_cache.bump_generation()
+    with _item_index_lock:
+        for name, index in _item_indexes.items():
+            writes = _index_build_writes.get(name)
+            if writes is not None:
+                writes.update(pending)
+            if index is not None:
+                for item_id, snapshot in pending.items():
+                    _apply_index_change(name, index, item_id, snapshot)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_item_changes(session):
+    session.info.pop("item_index_changes", None)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_taste_profile_updates(session):
+    updates = session.info.pop("taste_profile_updates", None)
+    if updates:
+        taste_profile_cache.apply(updates)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_taste_profile_updates(session):
+    session.info.pop("taste_profile_updates", None)
+
+
+# Keep the conversations table in sync with chat writes, in the same transaction
+
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+_SUMMARY_COLUMNS = (
+    "last_message_id",
+    "last_activity_at",
+    "low_unread_count",
+    "high_unread_count",
+)
+
+
+def _upsert_conversation(connection, values, on_conflict):
+    """
+    Inserts the conversation row `values`, or applies `on_conflict(excluded)`
+    (column -> expression) to the existing row, atomically where the dialect
+    supports it.
+    """
+    table = Conversation.__table__
+    dialect_insert = _UPSERT_INSERTS.get(connection.dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(table).values(**values)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.user_low_id, table.c.user_high_id],
+                set_=on_conflict(statement.excluded),
+            )
+        )
+        return
+    excluded = SimpleNamespace(**{name: db.literal(v) for name, v in values.items()})
+    updated = connection.execute(
+        db.update(table)
+        .where(
+            table.c.user_low_id == values["user_low_id"],
+            table.c.user_high_id == values["user_high_id"],
+        )
+        .values(**on_conflict(excluded))
+    )
+    if not updated.rowcount:
+        connection.execute(db.insert(table).values(**values))
+
+
+def _record_message(connection, message):
+    """
+    Moves the conversation of a new message forward and counts it as unread
+    for its receiver.
+    """
+    table = Conversation.__table__
+    low, high = Conversation.pair(message.sender_id, message.receiver_id)
+    unread = int(message.sender_id != message.receiver_id and not message.is_read)
+    values = {
+        "user_low_id": low,
+        "user_high_id": high,
+        "last_message_id": message.id,
+        "last_activity_at": message.timestamp,
+        "low_unread_count": unread if message.receiver_id == low else 0,
+        "high_unread_count": unread if message.receiver_id == high else 0,
+    }
+
+    def on_conflict(excluded):
+        # Concurrent sends may commit out of order; the highest id stays last
+        newer = db.or_(
+            table.c.last_message_id.is_(None),
+            excluded.last_message_id > table.c.last_message_id,
+        )
+        return {
+            "last_message_id": db.case(
+                (newer, excluded.last_message_id), else_=table.c.last_message_id
+            ),
+            "last_activity_at": db.case(
+                (newer, excluded.last_activity_at), else_=table.c.last_activity_at
+            ),
+            "low_unread_count": table.c.low_unread_count + excluded.low_unread_count,
+            "high_unread_count": table.c.high_unread_count + excluded.high_unread_count,
+        }
+
+    _upsert_conversation(connection, values, on_conflict)
+
+
+def _refresh_conversation(connection, low, high):
+    """
+    Recomputes one conversation from its messages, e.g. after a message was
+    deleted or edited, and drops it once no messages are left.
+    """
+    table = Conversation.__table__
+    in_pair = db.or_(
+        db.and_(Chat.sender_id == low, Chat.receiver_id == high),
+        db.and_(Chat.sender_id == high, Chat.receiver_id == low),
+    )
+    latest = connection.execute(
+        db.select(Chat.id, Chat.timestamp)
+        .where(in_pair)
+        .order_by(Chat.id.desc())
+        .limit(1)
+    ).first()
+    if latest is None:
+        connection.execute(
+            db.delete(table).where(
+                table.c.user_low_id == low, table.c.user_high_id == high
+            )
+        )
+        return
+
+    unread = dict(
+        connection.execute(
+            db.select(Chat.receiver_id, db.func.count())
+            .where(in_pair, Chat.is_read == False, Chat.sender_id != Chat.receiver_id)
+            .group_by(Chat.receiver_id)
+        ).all()
+    )
+    values = {
+        "user_low_id": low,
+        "user_high_id": high,
+        "last_message_id": latest.id,
+        "last_activity_at": latest.timestamp,
+        "low_unread_count": unread.get(low, 0),
+        "high_unread_count": unread.get(high, 0),
+    }
+    _upsert_conversation(
+        connection,
+        values,
+        lambda excluded: {name: getattr(excluded, name) for name in _SUMMARY_COLUMNS},
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _update_conversations(session, flush_context):
+    refresh = set()
+    for obj in session.new:
+        if isinstance(obj, Chat):
+            _record_message(session.connection(), obj)
+            session.info.setdefault("chat_events", []).append(
+                {
+                    "message_id": obj.id,
+                    "sender_id": obj.sender_id,
+                    "receiver_id": obj.receiver_id,
+                }
+            )
+            session.info.setdefault("unread_changes", set()).add(obj.receiver_id)
+    for obj in session.dirty | session.deleted:
+        if isinstance(obj, Chat):
+            refresh.add(Conversation.pair(obj.sender_id, obj.receiver_id))
+    for low, high in refresh:
+        _refresh_conversation(session.connection(), low, high)
+        session.info.setdefault("unread_changes", set()).update((low, high))
+
+
+# Tell open chat streams of both users about messages once they are committed
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_chat_events(session):
+    for message in session.info.pop("chat_events", ()):
+        for user_id in {message["sender_id"], message["receiver_id"]}:
+            chat_broker.publish(user_id, message)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_unread_counts(session):
+    # Users whose unread count changed: receivers of new messages, both sides
+    # of edited or deleted ones, and readers in chat_service.mark_read
+    unread_count_cache.invalidate(session.info.pop("unread_changes", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_chat_events(session):
+    session.info.pop("chat_events", None)
+    session.info.pop("unread_changes", None)
@@ -0,0 +1,128 @@
+import threading
+
+import pytz
+
+from app.models import Chat, Conversation, db
+
+NY_TZ = pytz.timezone("America/New_York")
+
+# Chat streams open in this process (see `acquire_stream`)
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+
+def acquire_stream(limit):
+    """
+    Reserves one of `limit` chat stream slots of this process. Each open
+    stream holds a worker thread, so the cap keeps threads free for page
+    requests. Returns False when all slots are taken.
+    """
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def release_stream():
+    global _open_streams
+    with _streams_lock:
+        _open_streams = max(_open_streams - 1, 0)
+
+
+def message_payload(message):
+    """
+    Returns the JSON shape of a chat message served to the chat page.
+    """
+    return {
+        "id": message.id,
+        "sender": message.sender_id,
+        "content": message.content,
+        "time": message.timestamp.replace(tzinfo=pytz.utc)
+        .astimezone(NY_TZ)
+        .strftime("%b %d • %I:%M %p"),
+    }
+
+
+def between(user_id, partner_id):
+    """
+    Returns a query of the messages exchanged by two users.
+    """
+    return Chat.query.filter(
+        ((Chat.sender_id == user_id) & (Chat.receiver_id == partner_id))
+        | ((Chat.sender_id == partner_id) & (Chat.receiver_id == user_id))
+    )
+
+
+def page(user_id, partner_id, since_id=None, before_id=None, limit=50):
+    """
+    Returns up to `limit` messages of the conversation, oldest first: the
+    first ones after `since_id` if given, else the last ones before
+    `before_id` (or the latest ones without either cursor).
+
+    Each direction of the conversation is read separately as a range of
+    ix_chat_sender_receiver_id, so the cost depends on `limit` rather than on
+    how far back the cursor is.
+    """
+    newest_first = since_id is None
+
+    def direction(sender_id, receiver_id):
+        query = db.select(Chat.id).where(
+            Chat.sender_id == sender_id, Chat.receiver_id == receiver_id
+        )
+        if since_id is not None:
+            query = query.where(Chat.id > since_id)
+        if before_id is not None:
+            query = query.where(Chat.id < before_id)
+        order = Chat.id.desc() if newest_first else Chat.id.asc()
+        return db.select(query.order_by(order).limit(limit).subquery().c.id)
+
+    ids = db.union_all(direction(user_id, partner_id), direction(partner_id, user_id))
+    order = Chat.id.desc() if newest_first else Chat.id.asc()
+    messages = Chat.query.filter(Chat.id.in_(ids)).order_by(order).limit(limit).all()
+    return messages[::-1] if newest_first else messages
+
+
+def messages_after(user_id, partner_id, after_id, limit=200):
+    """
+    Returns up to `limit` messages of the conversation with an id above
+    `after_id`, oldest first.
+    """
+    return page(user_id, partner_id, since_id=after_id, limit=limit)
+
+
+def last_message_id(user_id, partner_id):
+    """
+    Returns the id of the newest message of the conversation, or 0.
+    """
+    latest = page(user_id, partner_id, limit=1)
+    return latest[0].id if latest else 0
+
+
+def mark_read(reader_id, partner_id):
+    """
+    Marks every message `partner_id` sent to `reader_id` as read and takes
+    them off the reader's unread counter on their conversation. Does not
+    commit; the reader's cached unread count is dropped once the caller
+    commits. Returns the number of messages marked.
+    """
+    updated = Chat.query.filter_by(
+        sender_id=partner_id, receiver_id=reader_id, is_read=False
+    ).update({"is_read": True}, synchronize_session=False)
+
+    if updated:
+        low, high = Conversation.pair(reader_id, partner_id)
+        counter = (
+            Conversation.low_unread_count
+            if reader_id == low
+            else Conversation.high_unread_count
+        )
+        # Decremented rather than zeroed: a message committed after the UPDATE
+        # above is still unread and must stay counted
+        Conversation.query.filter_by(user_low_id=low, user_high_id=high).update(
+            {counter: db.case((counter > updated, counter - updated), else_=0)},
+            synchronize_session=False,
+        )
+        db.session.info.setdefault("unread_changes", set()).add(reader_id)
+    return updated
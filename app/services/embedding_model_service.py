@@ -0,0 +1,112 @@
+from datetime import datetime
+
+from sqlalchemy import delete, select
+
+from app.models import EmbeddingModel, Item, ItemEmbedding, db
+
+
+def register_pending_model(name):
+    """
+    Registers `name` as the model to re-embed the catalog with, recording the
+    current active model in the registry if it is not there yet. Does not
+    commit. Raises ValueError if `name` is already active or another model is
+    being re-embedded.
+    """
+    active = EmbeddingModel.active_name()
+    if name == active:
+        raise ValueError(f"{name} is already the active embedding model")
+    pending = EmbeddingModel.pending_name()
+    if pending is not None and pending != name:
+        raise ValueError(f"{pending} is already being re-embedded")
+
+    if db.session.get(EmbeddingModel, active) is None:
+        db.session.add(
+            EmbeddingModel(name=active, status="active", activated_at=datetime.utcnow())
+        )
+    model = db.session.get(EmbeddingModel, name)
+    if model is None:
+        model = EmbeddingModel(name=name)
+        db.session.add(model)
+    model.status = "pending"
+    return model
+
+
+def stage_embeddings(name, items, vectors):
+    """
+    Stores `vectors` as the embeddings of `items` under pending model `name`,
+    replacing earlier staged ones. Does not commit.
+    """
+    model = db.session.get(EmbeddingModel, name)
+    if model.dim is None and len(vectors):
+        model.dim = len(vectors[0])
+    for item, vector in zip(items, vectors):
+        db.session.merge(ItemEmbedding(item_id=item.id, model=name, embedding=vector))
+
+
+def switch_model(name):
+    """
+    Makes pending model `name` active: copies every staged embedding into
+    `items`, retires the previous model and drops the staging rows, all in
+    the caller's transaction. Returns the ids of items that still carry an
+    embedding from another model (written while the switch was racing) so
+    they can be queued for re-embedding. Does not commit.
+    """
+    model = db.session.get(EmbeddingModel, name)
+    staged = select(ItemEmbedding.item_id).where(ItemEmbedding.model == name)
+    embedding = (
+        select(ItemEmbedding.embedding)
+        .where(ItemEmbedding.item_id == Item.id, ItemEmbedding.model == name)
+        .scalar_subquery()
+    )
+    db.session.query(Item).filter(Item.id.in_(staged)).update(
+        {
+            Item.embedding: embedding,
+            Item.embedding_dim: model.dim,
+            Item.embedding_model: name,
+        },
+        synchronize_session=False,
+    )
+
+    now = datetime.utcnow()
+    for previous in EmbeddingModel.query.filter_by(status="active"):
+        previous.status = "retired"
+    model.status = "active"
+    model.activated_at = now
+    db.session.execute(delete(ItemEmbedding).where(ItemEmbedding.model == name))
+
+    return [
+        item_id
+        for (item_id,) in db.session.query(Item.id).filter(
+            Item.is_deleted == False,
+            Item.embedding.isnot(None),
+            Item.embedding_model != name,
+        )
+    ]
+
+
+def embedding_status():
+    """
+    Returns the registry entries and, per model, how many items carry an
+    embedding from it and how many are staged for it.
+    """
+    in_items = dict(
+        db.session.query(Item.embedding_model, db.func.count())
+        .filter(Item.is_deleted == False, Item.embedding.isnot(None))
+        .group_by(Item.embedding_model)
+    )
+    staged = dict(
+        db.session.query(ItemEmbedding.model, db.func.count()).group_by(
+            ItemEmbedding.model
+        )
+    )
+    return [
+        {
+            "name": model.name,
+            "status": model.status,
+            "dim": model.dim,
+            "items": in_items.get(model.name, 0),
+            "staged": staged.get(model.name, 0),
+            "activated_at": model.activated_at,
+        }
+        for model in EmbeddingModel.query.order_by(EmbeddingModel.created_at)
+    ]
@@ -0,0 +1,314 @@
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, and_
+
+from app.models import EmbeddingModel, Item, Job, db
+from app.services.embedding_model_service import (
+    register_pending_model,
+    stage_embeddings,
+    switch_model,
+)
+from app.services.similarity_service import rebuild_neighbors, refresh_item_neighbors
+from app.utils.search_utils import generate_embeddings
+
+EMBED_ITEM = "embed_item"
+REFRESH_NEIGHBORS = "refresh_neighbors"
+REEMBED_ITEMS = "reembed_items"
+
+MAX_ATTEMPTS = 3
+
+# Jobs left "running" longer than this are assumed to belong to a dead worker
+STALE_LOCK_TIMEOUT = timedelta(minutes=10)
+
+# A failed job waits RETRY_BACKOFF, then twice as long after each further
+# failure, up to MAX_RETRY_BACKOFF, so an outage is not retried in a hot loop
+RETRY_BACKOFF = timedelta(seconds=30)
+MAX_RETRY_BACKOFF = timedelta(minutes=30)
+
+
+def enqueue_job(kind, **payload):
+    """
+    Adds a pending job to the current session.
+    The job is committed together with the caller's own changes.
+    """
+    job = Job(kind=kind, payload=payload, status="pending")
+    db.session.add(job)
+    return job
+
+
+def enqueue_item_embedding(item):
+    """
+    Queues (re)generation of an item's embedding by the background worker if
+    its embedded text changed. Flushes first so newly created items have an
+    id. Returns the job, or None if the embedding is current.
+    """
+    if not item.embedding_is_stale():
+        return None
+    if item.id is None:
+        db.session.flush()
+    return enqueue_job(EMBED_ITEM, item_id=item.id)
+
+
+def claim_jobs(kind, limit):
+    """
+    Marks up to `limit` pending jobs of `kind` as running and returns them,
+    skipping jobs whose retry backoff has not elapsed.
+    Uses SELECT ... FOR UPDATE SKIP LOCKED where supported, so several workers can
+    drain the queue concurrently without claiming the same job twice.
+    """
+    now = datetime.utcnow()
+    stale_before = now - STALE_LOCK_TIMEOUT
+    jobs = (
+        Job.query.filter(
+            Job.kind == kind,
+            or_(
+                and_(
+                    Job.status == "pending",
+                    or_(Job.run_after.is_(None), Job.run_after <= now),
+                ),
+                and_(Job.status == "running", Job.locked_at < stale_before),
+            ),
+        )
+        .order_by(Job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    for job in jobs:
+        job.status = "running"
+        job.locked_at = now
+        job.attempts += 1
+    db.session.commit()
+    return jobs
+
+
+def fail_jobs(jobs, error):
+    """
+    Returns jobs to the queue for another attempt after an exponential
+    backoff, or marks them failed once they have used up MAX_ATTEMPTS.
+    """
+    now = datetime.utcnow()
+    for job in jobs:
+        job.status = "failed" if job.attempts >= MAX_ATTEMPTS else "pending"
+        job.locked_at = None
+        job.last_error = error
+        backoff = RETRY_BACKOFF * 2 ** max(job.attempts - 1, 0)
+        job.run_after = now + min(backoff, MAX_RETRY_BACKOFF)
+    db.session.commit()
+
+
+def start_reembedding(model):
+    """
+    Starts re-encoding the catalog with `model` in the background and commits.
+    Items are encoded in id-ordered chunks, one job each, into the staging
+    table; search keeps using the active model until the last chunk switches
+    every item over at once. Raises ValueError like `register_pending_model`.
+    """
+    register_pending_model(model)
+    job = enqueue_job(REEMBED_ITEMS, model=model, after_id=0)
+    db.session.commit()
+    return job
+
+
+def embed_items(items, model, batch_size=64):
+    """
+    Encodes `items` with `model` in one batched call and stores the results
+    with the hash of the text they came from, queueing a neighbour refresh for
+    each. While another model is being re-embedded, the items are also encoded
+    with it and staged, so the switch does not lose the edit. Does not commit.
+    Returns False, changing nothing, if a model is unavailable.
+    """
+    texts = [item.embedding_text for item in items]
+    vectors = generate_embeddings(texts, batch_size=batch_size, model=model)
+    pending = EmbeddingModel.pending_name()
+    staged = None
+    if pending is not None:
+        staged = generate_embeddings(texts, batch_size=batch_size, model=pending)
+    if vectors is None or (pending is not None and staged is None):
+        return False
+
+    for item, vector in zip(items, vectors):
+        item.embedding = vector
+        item.embedding_model = model
+        item.embedding_hash = item.embedding_text_hash
+        # Neighbours are recomputed once the new embedding is committed
+        enqueue_job(REFRESH_NEIGHBORS, item_id=item.id)
+    if staged is not None:
+        stage_embeddings(pending, items, staged)
+    return True
+
+
+def run_embed_item_jobs(batch_size=64):
+    """
+    Generates embeddings for a batch of queued items with one batched model call
+    and writes them back. Items whose embedding is already current are skipped.
+    Returns the number of jobs processed.
+    """
+    jobs = claim_jobs(EMBED_ITEM, batch_size)
+    if not jobs:
+        return 0
+
+    item_ids = {job.payload.get("item_id") for job in jobs}
+    items = Item.query.filter(Item.id.in_(item_ids), Item.is_deleted == False).all()
+    # Duplicate jobs and edits reverted before the worker ran need no encoding
+    model = EmbeddingModel.active_name()
+    items = [item for item in items if item.embedding_is_stale(model)]
+
+    if items and not embed_items(items, model, batch_size=batch_size):
+        fail_jobs(jobs, "Embedding model unavailable")
+        return 0
+
+    # Finished jobs are removed so the queue table only holds outstanding work
+    for job in jobs:
+        db.session.delete(job)
+    db.session.commit()
+    return len(jobs)
+
+
+def embed_stale_items(chunk_size=512, batch_size=64):
+    """
+    Re-embeds, with the active model, every item whose embedding is missing,
+    was generated from text that has since changed, or came from another
+    model. Items are scanned in id-ordered chunks without loading embeddings,
+    encoded in one batched call per chunk and committed per chunk.
+    Returns the number of items embedded, or None if the model is unavailable.
+    """
+    model = EmbeddingModel.active_name()
+    last_id = 0
+    embedded = 0
+    while True:
+        chunk = (
+            Item.query.options(db.defer(Item.embedding))
+            .filter(Item.id > last_id, Item.is_deleted == False)
+            .order_by(Item.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return embedded
+        last_id = chunk[-1].id
+
+        stale = [item.id for item in chunk if item.embedding_is_stale(model)]
+        items = []
+        if stale:
+            # Reloaded with their embeddings, which are about to be replaced
+            items = (
+                Item.query.options(db.undefer(Item.embedding))
+                .populate_existing()
+                .filter(Item.id.in_(stale))
+                .order_by(Item.id)
+                .all()
+            )
+        if items and not embed_items(items, model, batch_size=batch_size):
+            db.session.rollback()
+            return None
+        # Also ends the read transaction between chunks
+        db.session.commit()
+        embedded += len(items)
+
+
+def run_refresh_neighbors_jobs(batch_size=64):
+    """
+    Updates the precomputed similar-item lists for a batch of items whose
+    embeddings changed. Returns the number of jobs processed.
+    """
+    jobs = claim_jobs(REFRESH_NEIGHBORS, batch_size)
+    if not jobs:
+        return 0
+
+    refresh_item_neighbors({job.payload.get("item_id") for job in jobs})
+    for job in jobs:
+        db.session.delete(job)
+    db.session.commit()
+    return len(jobs)
+
+
+def run_reembed_jobs(batch_size=64):
+    """
+    Re-encodes the next chunk of `batch_size` items with the pending model and
+    queues the following chunk. Once no items are left, switches the catalog
+    to the new model, queues items written during the switch for embedding and
+    rebuilds this process's indexes and the neighbour table.
+    Returns the number of jobs processed.
+    """
+    jobs = claim_jobs(REEMBED_ITEMS, 1)
+    if not jobs:
+        return 0
+
+    job = jobs[0]
+    model, after_id = job.payload.get("model"), job.payload.get("after_id", 0)
+    switched = False
+    if model == EmbeddingModel.pending_name():
+        items = (
+            Item.query.filter(Item.id > after_id, Item.is_deleted == False)
+            .order_by(Item.id)
+            .limit(batch_size)
+            .all()
+        )
+        if items:
+            vectors = generate_embeddings(
+                [item.embedding_text for item in items],
+                batch_size=batch_size,
+                model=model,
+            )
+            if vectors is None:
+                fail_jobs(jobs, f"Embedding model {model} unavailable")
+                return 0
+            stage_embeddings(model, items, vectors)
+            enqueue_job(REEMBED_ITEMS, model=model, after_id=items[-1].id)
+        else:
+            for item_id in switch_model(model):
+                enqueue_job(EMBED_ITEM, item_id=item_id)
+            switched = True
+
+    db.session.delete(job)
+    db.session.commit()
+
+    if switched:
+        # Web workers load the new model next to their configured one
+        current_app.logger.warning(
+            f"Switched item embeddings to {model}; set EMBEDDING_MODEL={model} "
+            "and restart the app"
+        )
+        Item.reset_search_indexes()
+        rebuild_neighbors()
+    return len(jobs)
+
+
+JOB_HANDLERS = {
+    EMBED_ITEM: run_embed_item_jobs,
+    REFRESH_NEIGHBORS: run_refresh_neighbors_jobs,
+    REEMBED_ITEMS: run_reembed_jobs,
+}
+
+
+def run_pending_jobs(batch_size=64):
+    """
+    Runs one batch of every job kind. Returns the total number of jobs processed.
+    """
+    processed = 0
+    for kind, handler in JOB_HANDLERS.items():
+        try:
+            processed += handler(batch_size=batch_size)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception(f"Error running {kind} jobs")
+    return processed
+
+
+def work(batch_size=64, poll_interval=2.0, once=False):
+    """
+    Drains the job queue in batches, sleeping for `poll_interval` seconds
+    whenever it is empty. With `once`, exits as soon as the queue is empty.
+    """
+    while True:
+        processed = run_pending_jobs(batch_size=batch_size)
+        if processed:
+            continue
+        if once:
+            return
+        db.session.remove()
+        time.sleep(poll_interval)
@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta, timezone
+
+from app.models import Item, RecentlyViewed, db, favorites_table
+from app.utils.taste_profile import taste_profile_cache
+
+# Relative pull of one favorite versus one view on the taste vector
+VIEW_WEIGHT = 1.0
+FAVORITE_WEIGHT = 3.0
+
+# Views older than this many half-lives contribute under 0.5% and are not read
+VIEW_HISTORY_HALF_LIVES = 8
+
+
+def _timestamp(value):
+    """
+    Seconds since the epoch for a stored datetime; naive values are UTC.
+    """
+    if value is None:
+        return datetime.now(tz=timezone.utc).timestamp()
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def build_taste_profile(user_id):
+    """
+    Builds a user's taste profile from the embeddings of their recently viewed
+    and favorited items.
+    """
+    profile = taste_profile_cache.new_profile()
+    since = datetime.utcnow() - timedelta(
+        seconds=taste_profile_cache.half_life * VIEW_HISTORY_HALF_LIVES
+    )
+
+    views = (
+        db.session.query(Item.embedding, RecentlyViewed.viewed_at)
+        .join(RecentlyViewed, RecentlyViewed.item_id == Item.id)
+        .filter(
+            RecentlyViewed.user_id == user_id,
+            RecentlyViewed.viewed_at >= since,
+            Item.embedding.isnot(None),
+        )
+    )
+    for embedding, viewed_at in views:
+        profile.add(embedding, VIEW_WEIGHT, _timestamp(viewed_at))
+
+    favorites = (
+        db.session.query(Item.embedding, favorites_table.c.created_at)
+        .join(favorites_table, favorites_table.c.item_id == Item.id)
+        .filter(favorites_table.c.user_id == user_id, Item.embedding.isnot(None))
+    )
+    for embedding, created_at in favorites:
+        profile.add(embedding, FAVORITE_WEIGHT, _timestamp(created_at))
+
+    return profile
+
+
+def taste_vector(user_id):
+    """
+    Returns the user's unit-norm taste vector, or None without usable history.
+    The profile is cached and built from the database only on a miss.
+    """
+    profile = taste_profile_cache.get(user_id)
+    if profile is None:
+        generation = taste_profile_cache.generation
+        profile = build_taste_profile(user_id)
+        taste_profile_cache.put(user_id, profile, generation=generation)
+    return profile.vector()
+
+
+def _queue_profile_update(user_id, embedding=None, weight=None, at=None):
+    # Applied to the cache by a session hook once the transaction commits, so
+    # a rolled-back interaction never reaches a profile
+    db.session.info.setdefault("taste_profile_updates", []).append(
+        (user_id, embedding, weight, at)
+    )
+
+
+def record_view(user_id, item):
+    """
+    Upserts the RecentlyViewed row for `user_id` and `item` and moves the
+    item's contribution in the cached taste profile to now once the caller
+    commits. Does not commit.
+    """
+    now = datetime.now(tz=timezone.utc)
+    view = RecentlyViewed.query.filter_by(user_id=user_id, item_id=item.id).first()
+
+    if view:
+        _queue_profile_update(
+            user_id, item.embedding, -VIEW_WEIGHT, _timestamp(view.viewed_at)
+        )
+        view.viewed_at = now
+    else:
+        db.session.add(RecentlyViewed(user_id=user_id, item_id=item.id))
+
+    _queue_profile_update(user_id, item.embedding, VIEW_WEIGHT, now.timestamp())
+
+
+def record_favorite(user_id, item):
+    """
+    Adds a newly favorited item to the cached taste profile of `user_id` once
+    the caller commits.
+    """
+    _queue_profile_update(
+        user_id,
+        item.embedding,
+        FAVORITE_WEIGHT,
+        datetime.now(tz=timezone.utc).timestamp(),
+    )
+
+
+def record_unfavorite(user_id):
+    """
+    Drops the cached taste profile of `user_id` once the caller commits the
+    removal of a favorite; the next feed request rebuilds it without that item.
+    """
+    _queue_profile_update(user_id)
+
+
+def for_you_items(user, limit=6):
+    """
+    Returns up to `limit` active Items closest to the user's taste vector,
+    leaving out their own listings and items they already viewed or favorited.
+    Returns an empty list for users without history.
+    """
+    vector = taste_vector(user.id)
+    if vector is None or limit <= 0:
+        return []
+
+    seen = {
+        item_id
+        for (item_id,) in db.session.query(RecentlyViewed.item_id).filter_by(
+            user_id=user.id
+        )
+    }
+    seen.update(
+        item_id
+        for (item_id,) in db.session.query(favorites_table.c.item_id).filter(
+            favorites_table.c.user_id == user.id
+        )
+    )
+
+    results = Item.vector_index().search(vector, k=limit * 3 + len(seen))
+    candidates = [item_id for item_id, _ in results if item_id not in seen]
+    items = [item for item in Item.hydrate(candidates) if item.seller_id != user.id]
+    return items[:limit]
@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import delete, insert, tuple_
+
+from app.models import Item, ItemNeighbor, db
+from app.utils.vector_index import normalize
+
+# Neighbours stored per item; pages show fewer, so deactivated ones can be skipped
+NEIGHBOR_COUNT = 20
+
+
+def nearest_neighbors(index, item_id, embedding, count=NEIGHBOR_COUNT):
+    """
+    Returns the `count` `(id, score)` pairs closest to `embedding` in `index`,
+    excluding `item_id` itself.
+    """
+    results = index.search(embedding, k=count + 1)
+    return [(other, score) for other, score in results if other != item_id][:count]
+
+
+def _searchable_embeddings(query, index):
+    # Embeddings of another model than the index's cannot be compared with it
+    return query.filter(
+        Item.is_active == True,
+        Item.is_deleted == False,
+        Item.embedding.isnot(None),
+        Item.embedding_model == index.model_version,
+    )
+
+
+def refresh_item_neighbors(item_ids, count=NEIGHBOR_COUNT):
+    """
+    Recomputes the stored neighbours of `item_ids` after their embeddings
+    changed. Entries of other lists that point at these items are rescored
+    and kept while still among the owner's `count` most similar; each item is
+    also offered to the lists of its new neighbours. Other lists thus stay
+    current without being recomputed. Does not commit.
+    """
+    item_ids = list(item_ids)
+    if not item_ids:
+        return
+
+    # Owners of other lists that hold these items, read before the old scores go
+    holders = defaultdict(list)
+    for owner_id, neighbor_id in db.session.query(
+        ItemNeighbor.item_id, ItemNeighbor.neighbor_id
+    ).filter(
+        ItemNeighbor.neighbor_id.in_(item_ids), ItemNeighbor.item_id.notin_(item_ids)
+    ):
+        holders[owner_id].append(neighbor_id)
+
+    # Old scores for these items are stale, in their own lists and in others'
+    db.session.execute(
+        delete(ItemNeighbor).where(
+            ItemNeighbor.item_id.in_(item_ids) | ItemNeighbor.neighbor_id.in_(item_ids)
+        )
+    )
+
+    index = Item.vector_index()
+    rows = _searchable_embeddings(
+        db.session.query(Item.id, Item.embedding).filter(Item.id.in_(item_ids)), index
+    ).all()
+
+    new_rows = []
+    offers = defaultdict(dict)
+    for item_id, embedding in rows:
+        for neighbor_id, score in nearest_neighbors(index, item_id, embedding, count):
+            new_rows.append(
+                {"item_id": item_id, "neighbor_id": neighbor_id, "score": score}
+            )
+            offers[neighbor_id][item_id] = score
+
+    # Lists that held a changed item get it back with its new score; items no
+    # longer searchable have no vector and stay out
+    changed = {item_id: normalize(embedding) for item_id, embedding in rows}
+    if holders:
+        owners = _searchable_embeddings(
+            db.session.query(Item.id, Item.embedding).filter(
+                Item.id.in_(list(holders))
+            ),
+            index,
+        )
+        for owner_id, embedding in owners:
+            owner_vector = normalize(embedding)
+            for item_id in holders[owner_id]:
+                vector = changed.get(item_id)
+                if owner_vector is not None and vector is not None:
+                    score = float(np.dot(owner_vector, vector))
+                    offers[owner_id].setdefault(item_id, score)
+
+    # Lists being recomputed above already include these pairs
+    for item_id in item_ids:
+        offers.pop(item_id, None)
+
+    current = defaultdict(dict)
+    if offers:
+        for row in ItemNeighbor.query.filter(ItemNeighbor.item_id.in_(list(offers))):
+            current[row.item_id][row.neighbor_id] = row.score
+
+    dropped = []
+    for neighbor_id, candidates in offers.items():
+        existing = current[neighbor_id]
+        merged = {**existing, **candidates}
+        keep = set(sorted(merged, key=merged.get, reverse=True)[:count])
+        for other in candidates:
+            if other in keep and other not in existing:
+                new_rows.append(
+                    {
+                        "item_id": neighbor_id,
+                        "neighbor_id": other,
+                        "score": candidates[other],
+                    }
+                )
+        dropped.extend((neighbor_id, other) for other in existing if other not in keep)
+
+    if dropped:
+        db.session.execute(
+            delete(ItemNeighbor).where(
+                tuple_(ItemNeighbor.item_id, ItemNeighbor.neighbor_id).in_(dropped)
+            )
+        )
+    if new_rows:
+        db.session.execute(insert(ItemNeighbor), new_rows)
+
+
+def rebuild_neighbors(count=NEIGHBOR_COUNT, chunk_size=500):
+    """
+    Recomputes the whole neighbour table from the vector index, committing in
+    id-ordered chunks. Returns the number of items processed.
+    """
+    db.session.execute(delete(ItemNeighbor))
+    db.session.commit()
+
+    index = Item.vector_index()
+    last_id = 0
+    processed = 0
+    while True:
+        rows = (
+            _searchable_embeddings(
+                db.session.query(Item.id, Item.embedding).filter(Item.id > last_id),
+                index,
+            )
+            .order_by(Item.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not rows:
+            return processed
+
+        new_rows = [
+            {"item_id": item_id, "neighbor_id": neighbor_id, "score": score}
+            for item_id, embedding in rows
+            for neighbor_id, score in nearest_neighbors(
+                index, item_id, embedding, count
+            )
+        ]
+        if new_rows:
+            db.session.execute(insert(ItemNeighbor), new_rows)
+        db.session.commit()
+
+        last_id = rows[-1].id
+        processed += len(rows)
@@ -1,41 +1,111 @@
 // static/chat.js
 const messagesDiv = document.getElementById("messages");
 
-let totalMessagesShown = 0;
+// Ids of the oldest and newest messages shown; scrollback continues before
+// the first and the stream resumes after the last
+let firstMessageId = null;
+let lastMessageId = 0;
+let loadingOlder = false;
+let olderExhausted = false;
+let stream = null;
+let pollTimer = null;
 
+function appendMessages(messages, forceScroll) {
+  const fresh = messages.filter(msg => msg.id > lastMessageId);
+  if (fresh.length === 0) return;
+
+  // Check if user is near the bottom (delta < 50px)
+  const isAtBottom = forceScroll || (messagesDiv.scrollHeight - messagesDiv.scrollTop <= messagesDiv.clientHeight + 50);
+
+  fresh.forEach(msg => {
+    messagesDiv.appendChild(messageElement(msg));
+    lastMessageId = msg.id;
+  });
+
+  // Auto-scroll only if user was already at bottom or first load
+  if (isAtBottom) {
+    messagesDiv.scrollTop = messagesDiv.scrollHeight;
+  }
+}
+
+function messageElement(msg) {
+  const div = document.createElement("div");
+  div.className = "message " + (msg.sender === CURRENT_USER_ID ? "sent" : "received");
+
+  div.innerHTML = `
+    ${msg.content}
+    <small>${msg.time}</small>
+  `;
+  return div;
+}
+
+// The first load fetches the latest page; later ones only what is newer
 function loadMessages() {
-  fetch(`/get_messages/${receiver_id}`)
+  const firstLoad = lastMessageId === 0;
+  const query = firstLoad ? "" : `?since_id=${lastMessageId}`;
+  return fetch(`/get_messages/${receiver_id}${query}`)
     .then(res => res.json())
     .then(data => {
-      // If no new messages, do nothing
-      if (data.length <= totalMessagesShown) return;
-
-      // Check if user is near the bottom (delta < 50px)
-      // Or if this is the first load
-      const isAtBottom = (messagesDiv.scrollHeight - messagesDiv.scrollTop <= messagesDiv.clientHeight + 50) || (totalMessagesShown === 0);
+      if (firstMessageId === null && data.length) firstMessageId = data[0].id;
+      appendMessages(data, firstLoad);
+    });
+}
 
-      // Append only new messages
-      const newMessages = data.slice(totalMessagesShown);
-      newMessages.forEach(msg => {
-        const div = document.createElement("div");
-        div.className = "message " + (msg.sender === CURRENT_USER_ID ? "sent" : "received");
+// Scrollback: prepend the page before the oldest message shown
+function loadOlderMessages() {
+  if (loadingOlder || olderExhausted || firstMessageId === null) return;
+  loadingOlder = true;
+  fetch(`/get_messages/${receiver_id}?before_id=${firstMessageId}`)
+    .then(res => res.json())
+    .then(data => {
+      if (data.length === 0) {
+        olderExhausted = true;
+        return;
+      }
+      const previousHeight = messagesDiv.scrollHeight;
+      messagesDiv.prepend(...data.map(messageElement));
+      firstMessageId = data[0].id;
+      // Keep the message the user was reading in place
+      messagesDiv.scrollTop += messagesDiv.scrollHeight - previousHeight;
+    })
+    .finally(() => { loadingOlder = false; });
+}
 
-        div.innerHTML = `
-          ${msg.content}
-          <small>${msg.time}</small>
-        `;
+messagesDiv.addEventListener("scroll", () => {
+  if (messagesDiv.scrollTop < 50) loadOlderMessages();
+});
 
-        messagesDiv.appendChild(div);
-      });
+// Without EventSource support, or while the server has no stream slot free,
+// poll for new messages instead
+function startPolling() {
+  if (pollTimer === null) {
+    pollTimer = setInterval(loadMessages, 2000);
+  }
+}
 
-      // Update count
-      totalMessagesShown = data.length;
+function stopPolling() {
+  clearInterval(pollTimer);
+  pollTimer = null;
+}
 
-      // Auto-scroll only if user was already at bottom or first load
-      if (isAtBottom) {
-        messagesDiv.scrollTop = messagesDiv.scrollHeight;
-      }
-    });
+function startStream() {
+  if (!window.EventSource) {
+    startPolling();
+    return;
+  }
+  // Reconnects after errors resend the last event id, so nothing is missed
+  stream = new EventSource(`/chat/${receiver_id}/stream?since_id=${lastMessageId}`);
+  stream.onopen = stopPolling;
+  stream.onmessage = event => appendMessages([JSON.parse(event.data)], false);
+  stream.onerror = () => {
+    // Refused (e.g. 503 when the worker's streams are full): the browser
+    // gives up, so poll and try streaming again later
+    if (stream.readyState === EventSource.CLOSED) {
+      stream = null;
+      startPolling();
+      setTimeout(startStream, 30000);
+    }
+  };
 }
 
 function send() {
@@ -47,9 +117,9 @@ function send() {
     body: JSON.stringify({ receiver_id, content })
   }).then(() => {
     document.getElementById("input").value = "";
-    loadMessages();
+    // The stream delivers the sent message as well
+    if (stream === null) loadMessages();
   });
 }
 
-setInterval(loadMessages, 2000);
-loadMessages();
+loadMessages().then(startStream, startPolling);
@@ -0,0 +1,499 @@
+import threading
+import time
+
+import numpy as np
+
+from app.utils.vector_index import normalize, top_k
+
+# Rows scored per matrix product when assigning vectors to centroids
+ASSIGN_CHUNK_SIZE = 8192
+
+
+def assign_nearest(vectors, centroids):
+    """
+    Returns the index of the most similar centroid for every row of `vectors`.
+    Works in chunks so the score matrix stays small for large inputs.
+    """
+    assign = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], ASSIGN_CHUNK_SIZE):
+        chunk = vectors[start : start + ASSIGN_CHUNK_SIZE]
+        assign[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assign
+
+
+def kmeans(vectors, nlist, iterations=10, rng=None):
+    """
+    Spherical k-means over unit-norm `vectors`.
+    Returns an `(nlist, dim)` float32 matrix of unit-norm centroids.
+    """
+    rng = rng or np.random.default_rng()
+    seeds = rng.choice(vectors.shape[0], nlist, replace=False)
+    centroids = vectors[seeds].copy()
+
+    for _ in range(iterations):
+        assign = assign_nearest(vectors, centroids)
+        counts = np.bincount(assign, minlength=nlist)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        order = np.argsort(assign, kind="stable")
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+
+        # Empty clusters keep their previous centroid
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        centroids[filled] = sums / norms
+
+    return centroids
+
+
+# Storage formats for the vectors of an IVFIndex: None keeps float32
+QUANTIZATIONS = (None, "float16", "int8")
+
+
+def quantize(vectors, quantization):
+    """
+    Encodes rows of unit-norm float32 `vectors` for compact storage.
+    Returns `(data, scales)`: int8 rows come with a float32 scale per row
+    (max |value| / 127), other formats with None.
+    """
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        data = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return data, scales.astype(np.float32)
+    if quantization == "float16":
+        return vectors.astype(np.float16), None
+    return vectors, None
+
+
+class _InvertedList:
+    """
+    Growable packed block of the vectors assigned to one centroid, with a
+    parallel matrix of integer attribute codes used for filtering.
+    Vectors are stored as float32, float16 or int8 with a per-row scale.
+    Removed rows are only marked dead and are reclaimed by `compact`.
+    """
+
+    def __init__(self, dim, num_attributes=0, capacity=16, quantization=None):
+        self.quantization = quantization
+        dtype = {"float16": np.float16, "int8": np.int8}.get(quantization, np.float32)
+        self.matrix = np.zeros((capacity, dim), dtype=dtype)
+        self.scales = (
+            np.ones(capacity, dtype=np.float32) if quantization == "int8" else None
+        )
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.codes = np.zeros((capacity, num_attributes), dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self.dead = 0
+
+    @classmethod
+    def from_arrays(cls, ids, matrix, codes, quantization=None):
+        inverted = cls(
+            matrix.shape[1],
+            codes.shape[1],
+            capacity=max(len(ids), 16),
+            quantization=quantization,
+        )
+        data, scales = quantize(matrix, quantization)
+        inverted.matrix[: len(ids)] = data
+        if scales is not None:
+            inverted.scales[: len(ids)] = scales
+        inverted.ids[: len(ids)] = ids
+        inverted.codes[: len(ids)] = codes
+        inverted.alive[: len(ids)] = True
+        inverted.size = len(ids)
+        return inverted
+
+    @property
+    def nbytes(self):
+        arrays = (self.matrix, self.scales, self.ids, self.codes, self.alive)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def vectors(self):
+        """
+        Returns the stored rows decoded to float32.
+        """
+        matrix = self.matrix[: self.size].astype(np.float32)
+        if self.scales is not None:
+            matrix *= self.scales[: self.size, None]
+        return matrix
+
+    def set(self, pos, vec, codes):
+        data, scales = quantize(vec[None, :], self.quantization)
+        self.matrix[pos] = data[0]
+        if scales is not None:
+            self.scales[pos] = scales[0]
+        self.codes[pos] = codes
+
+    def append(self, item_id, vec, codes):
+        if self.size == len(self.ids):
+            capacity = len(self.ids) * 2
+            self.matrix = np.resize(self.matrix, (capacity, self.matrix.shape[1]))
+            if self.scales is not None:
+                self.scales = np.resize(self.scales, capacity)
+            self.ids = np.resize(self.ids, capacity)
+            self.codes = np.resize(self.codes, (capacity, self.codes.shape[1]))
+            self.alive = np.resize(self.alive, capacity)
+            self.alive[self.size :] = False
+        pos = self.size
+        self.set(pos, vec, codes)
+        self.ids[pos] = item_id
+        self.alive[pos] = True
+        self.size += 1
+        return pos
+
+    def kill(self, pos):
+        self.alive[pos] = False
+        self.dead += 1
+
+    def compact(self):
+        """
+        Drops dead rows and returns the ids of the remaining rows in their new
+        positions.
+        """
+        keep = np.flatnonzero(self.alive[: self.size])
+        count = keep.size
+        self.matrix[:count] = self.matrix[keep]
+        if self.scales is not None:
+            self.scales[:count] = self.scales[keep]
+        self.ids[:count] = self.ids[keep]
+        self.codes[:count] = self.codes[keep]
+        self.alive[:count] = True
+        self.alive[count : self.size] = False
+        self.size = count
+        self.dead = 0
+        return self.ids[:count]
+
+    def _dot(self, rows, q):
+        if self.quantization is None:
+            return self.matrix[rows] @ q
+        scores = self.matrix[rows].astype(np.float32) @ q
+        if self.scales is not None:
+            scores *= self.scales[rows]
+        return scores
+
+    def scores(self, q, conditions=()):
+        """
+        Returns `(ids, scores)` arrays for the live rows of this list whose
+        attribute codes satisfy every `(column, allowed_codes)` condition.
+        Rows are filtered before scoring, so narrow filters also save work.
+        """
+        if not conditions:
+            scores = self._dot(slice(0, self.size), q)
+            ids = self.ids[: self.size]
+            if self.dead:
+                alive = self.alive[: self.size]
+                return ids[alive], scores[alive]
+            return ids, scores
+
+        mask = self.alive[: self.size].copy()
+        for column, allowed in conditions:
+            mask &= np.isin(self.codes[: self.size, column], allowed)
+        rows = np.flatnonzero(mask)
+        return self.ids[rows], self._dot(rows, q)
+
+
+class IVFIndex:
+    """
+    Approximate nearest-neighbour index of L2-normalized embeddings.
+
+    Vectors are partitioned into `nlist` inverted lists around k-means centroids.
+    A query scores the centroids, then only the vectors in the `nprobe` closest
+    lists, so the work per query is roughly `nprobe / nlist` of a full scan.
+    Raising `nprobe` trades latency for recall.
+
+    Until `train` runs (automatically in `from_rows` once there are at least
+    `min_train_size` vectors) everything lives in a single list and searches are
+    exact. New vectors are appended to their nearest list; removed ones are
+    tombstoned and a list is compacted once a quarter of its rows are dead.
+
+    Each vector can carry values for the named `attributes` (e.g. category).
+    Values are stored as integer codes next to the vectors so searches can be
+    restricted to matching rows before the top-k selection.
+
+    With `quantization` set to "float16" or "int8", vectors are stored in 2 or
+    4 times less memory and scores carry a small rounding error; callers that
+    need exact scores re-rank the top candidates from full-precision vectors.
+
+    `model_version` names the embedding model the vectors came from; queries
+    must be encoded with the same model.
+    """
+
+    def __init__(
+        self,
+        dim=None,
+        nlist=None,
+        nprobe=8,
+        min_train_size=10000,
+        seed=0,
+        attributes=(),
+        quantization=None,
+        model_version=None,
+    ):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization!r}")
+        self.dim = dim
+        self.attributes = tuple(attributes)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.seed = seed
+        self.quantization = quantization
+        self.model_version = model_version
+        self.centroids = None
+        self.built_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._lists = []
+        self._positions = {}
+        # Per attribute: value -> integer code stored in the lists
+        self._vocab = [{} for _ in self.attributes]
+
+    @classmethod
+    def from_rows(cls, rows, **kwargs):
+        """
+        Builds an index from an iterable of `(id, embedding, *attribute_values)`
+        rows and trains it if it holds at least `min_train_size` vectors.
+        Rows with a missing embedding or a dimension that differs from the first
+        valid row are skipped.
+        """
+        index = cls(**kwargs)
+        for item_id, embedding, *values in rows:
+            index.add(item_id, embedding, dict(zip(index.attributes, values)))
+        if len(index) >= index.min_train_size:
+            index.train()
+        return index
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, item_id):
+        return item_id in self._positions
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the stored vectors, ids, attribute codes and centroids.
+        """
+        with self._lock:
+            total = sum(inverted.nbytes for inverted in self._lists)
+            if self.centroids is not None:
+                total += self.centroids.nbytes
+            return total
+
+    def _encode(self, attributes):
+        attributes = attributes or {}
+        codes = []
+        for name, vocab in zip(self.attributes, self._vocab):
+            value = attributes.get(name)
+            codes.append(vocab.setdefault(value, len(vocab)))
+        return codes
+
+    def add(self, item_id, embedding, attributes=None):
+        """
+        Inserts or replaces the vector stored for `item_id` in its nearest list,
+        along with its `attributes` (a dict of attribute name to value).
+        A missing embedding removes the id instead. Returns True if stored.
+        """
+        vec = normalize(embedding)
+        if vec is None:
+            self.remove(item_id)
+            return False
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vec.shape[0]
+            if vec.shape[0] != self.dim:
+                self.remove(item_id)
+                return False
+            if not self._lists:
+                self._lists.append(
+                    _InvertedList(
+                        self.dim, len(self.attributes), quantization=self.quantization
+                    )
+                )
+            codes = self._encode(attributes)
+
+            list_no = (
+                0 if self.centroids is None else int(np.argmax(self.centroids @ vec))
+            )
+            location = self._positions.get(item_id)
+            if location is not None and location[0] == list_no:
+                self._lists[list_no].set(location[1], vec, codes)
+                return True
+            if location is not None:
+                self.remove(item_id)
+
+            pos = self._lists[list_no].append(item_id, vec, codes)
+            self._positions[item_id] = (list_no, pos)
+            return True
+
+    def remove(self, item_id):
+        """
+        Tombstones `item_id`. Returns True if it was present.
+        """
+        with self._lock:
+            location = self._positions.pop(item_id, None)
+            if location is None:
+                return False
+            list_no, pos = location
+            inverted = self._lists[list_no]
+            inverted.kill(pos)
+            if inverted.dead * 4 >= inverted.size:
+                self._compact(list_no)
+            return True
+
+    def _compact(self, list_no):
+        for pos, item_id in enumerate(self._lists[list_no].compact().tolist()):
+            self._positions[item_id] = (list_no, pos)
+
+    def train(self, nlist=None, sample_size=None, iterations=10):
+        """
+        Clusters the stored vectors into `nlist` lists (default: the configured
+        value, else the square root of the index size) and redistributes them.
+        Centroids are fitted on a random sample of `sample_size` vectors
+        (default: 32 per list).
+        """
+        with self._lock:
+            for list_no in range(len(self._lists)):
+                self._compact(list_no)
+            if not self._positions:
+                return
+
+            lists = [inverted for inverted in self._lists if inverted.size]
+            ids = np.concatenate([inverted.ids[: inverted.size] for inverted in lists])
+            matrix = np.concatenate([inverted.vectors() for inverted in lists])
+            codes = np.concatenate(
+                [inverted.codes[: inverted.size] for inverted in lists]
+            )
+            count = ids.shape[0]
+
+            nlist = max(1, min(nlist or self.nlist or int(np.sqrt(count)), count))
+            sample_size = sample_size or nlist * 32
+            rng = np.random.default_rng(self.seed)
+            sample = (
+                matrix[rng.choice(count, sample_size, replace=False)]
+                if count > sample_size
+                else matrix
+            )
+            centroids = kmeans(sample, nlist, iterations=iterations, rng=rng)
+
+            assign = assign_nearest(matrix, centroids)
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+
+            self._lists = []
+            self._positions = {}
+            for list_no in range(nlist):
+                rows = order[bounds[list_no] : bounds[list_no + 1]]
+                self._lists.append(
+                    _InvertedList.from_arrays(
+                        ids[rows], matrix[rows], codes[rows], self.quantization
+                    )
+                )
+                for pos, item_id in enumerate(ids[rows].tolist()):
+                    self._positions[item_id] = (list_no, pos)
+            self.centroids = centroids
+            self.nlist = nlist
+
+    def export(self):
+        """
+        Returns `(centroids, lists, vocab)` describing the live contents:
+        `lists` holds one `(ids, vectors, codes)` tuple per inverted list with
+        vectors decoded to float32, and `vocab` one list of values per
+        attribute, indexed by code. `centroids` is None until trained.
+        """
+        with self._lock:
+            for list_no in range(len(self._lists)):
+                self._compact(list_no)
+            lists = [
+                (
+                    inverted.ids[: inverted.size].copy(),
+                    inverted.vectors(),
+                    inverted.codes[: inverted.size].copy(),
+                )
+                for inverted in self._lists
+            ]
+            vocab = [sorted(values, key=values.get) for values in self._vocab]
+            centroids = None if self.centroids is None else self.centroids.copy()
+            return centroids, lists, vocab
+
+    def _conditions(self, filters):
+        """
+        Translates `{attribute: allowed values}` into `(column, codes)` pairs.
+        Returns None if some attribute has no indexed value in its allowed set.
+        """
+        conditions = []
+        for name, values in (filters or {}).items():
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            vocab = self._vocab[self.attributes.index(name)]
+            allowed = [vocab[value] for value in values if value in vocab]
+            if not allowed:
+                return None
+            conditions.append((self.attributes.index(name), np.array(allowed)))
+        return conditions
+
+    def search(
+        self, query, k=20, threshold=None, nprobe=None, filters=None, timings=None
+    ):
+        """
+        Returns up to `k` `(id, score)` pairs ordered by descending cosine
+        similarity to `query`, keeping only scores >= `threshold` when given.
+
+        `filters` maps attribute names to a value or list of allowed values; rows
+        that do not match are excluded before scoring. The `nprobe` lists closest
+        to the query are scanned, plus further lists in order of closeness while
+        fewer than `k` filtered matches have been found.
+
+        When `timings` is a dict, the milliseconds spent scoring rows and
+        selecting the top `k` are stored under "score" and "select", along with
+        the number of rows "scanned".
+        """
+        started = time.perf_counter()
+        q = normalize(query)
+        if q is None or k <= 0:
+            return []
+
+        with self._lock:
+            if not self._positions or q.shape[0] != self.dim:
+                return []
+            conditions = self._conditions(filters)
+            if conditions is None:
+                return []
+
+            if self.centroids is None:
+                probes, nprobe = range(len(self._lists)), len(self._lists)
+            else:
+                probes = np.argsort(-(self.centroids @ q))
+                nprobe = min(nprobe or self.nprobe, self.nlist)
+
+            parts = []
+            found = 0
+            for probed, list_no in enumerate(probes):
+                if probed >= nprobe and (not conditions or found >= k):
+                    break
+                ids, scores = self._lists[list_no].scores(q, conditions)
+                parts.append((ids, scores))
+                found += (
+                    ids.shape[0]
+                    if threshold is None
+                    else int(np.count_nonzero(scores >= threshold))
+                )
+
+            ids = np.concatenate([part[0] for part in parts])
+            scores = np.concatenate([part[1] for part in parts])
+
+        scored = time.perf_counter()
+        results = top_k(ids, scores, k, threshold)
+        if timings is not None:
+            timings["score"] = (scored - started) * 1000
+            timings["select"] = (time.perf_counter() - scored) * 1000
+            timings["scanned"] = int(ids.shape[0])
+        return results
@@ -0,0 +1,237 @@
+import bisect
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+
+from app.utils.text_index import tokenize
+
+# Listing age (seconds) worth the same as an e-fold increase in favorites
+RECENCY_SCALE = 7 * 24 * 3600
+
+
+def rank_score(created_at, popularity=0):
+    """
+    Static ranking score for a suggestion: newer and more favorited items first.
+    The recency term grows linearly with creation time, so relative order does
+    not change as items age.
+    """
+    timestamp = created_at.timestamp() if created_at else 0.0
+    return timestamp / RECENCY_SCALE + math.log1p(popularity or 0)
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class _TrieNode:
+    __slots__ = ("children", "ids", "top", "truncated", "stale")
+
+    def __init__(self):
+        self.children = {}
+        # Items with a title word ending at this node
+        self.ids = set()
+        # Best `(-score, id)` pairs among all items below this node, ascending
+        self.top = []
+        # Whether items below this node were left out of `top`
+        self.truncated = False
+        # Whether removals left `top` too short to answer lookups
+        self.stale = False
+
+
+class AutocompleteIndex:
+    """
+    In-memory suggestion index over item titles.
+
+    A trie over title words answers prefix queries; every node caches the
+    `top_size` best-ranked items below it, so a lookup costs the length of the
+    typed word rather than the size of the catalog. Nodes keep `slack` extra
+    entries so removals rarely empty a list below `top_size`; when one does,
+    the list is rebuilt from the children's lists rather than the subtree.
+    A trigram map answers infix queries ("acket" -> "Jacket") by intersecting
+    the posting sets of the query's trigrams. Items are ranked by `rank_score`
+    (recency and favorites).
+    """
+
+    def __init__(self, top_size=64, slack=None):
+        self.top_size = top_size
+        self.capacity = top_size + (top_size if slack is None else slack)
+        self.built_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._root = _TrieNode()
+        self._trigrams = defaultdict(set)
+        # id -> (title, lowercase title, words, score, popularity)
+        self._entries = {}
+
+    @classmethod
+    def from_rows(cls, rows, **kwargs):
+        """
+        Builds an index from an iterable of `(id, title, created_at, popularity)`
+        rows.
+        """
+        index = cls(**kwargs)
+        for item_id, title, created_at, popularity in rows:
+            index.add(item_id, title, created_at, popularity)
+        return index
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, item_id):
+        return item_id in self._entries
+
+    def add(self, item_id, title, created_at=None, popularity=None):
+        """
+        Inserts or replaces the suggestion for `item_id`. A `popularity` of None
+        keeps the item's previous popularity. Returns True if stored.
+        """
+        with self._lock:
+            previous = self._entries.get(item_id)
+            if popularity is None:
+                popularity = previous[4] if previous else 0
+            score = rank_score(created_at, popularity)
+            if previous and previous[0] == title and previous[3] == score:
+                # Unchanged (e.g. a price edit): leave the top lists alone
+                return True
+            self.remove(item_id)
+
+            words = set(tokenize(title))
+            if not words:
+                return False
+            lowered = title.lower()
+            self._entries[item_id] = (title, lowered, words, score, popularity)
+
+            entry = (-score, item_id)
+            for word in words:
+                node = self._root
+                for char in word:
+                    node = node.children.setdefault(char, _TrieNode())
+                    if entry not in node.top:
+                        self._insert_top(node, entry)
+                node.ids.add(item_id)
+            for trigram in trigrams(lowered):
+                self._trigrams[trigram].add(item_id)
+            return True
+
+    def _insert_top(self, node, entry):
+        top = node.top
+        if len(top) >= self.capacity and entry > top[-1]:
+            node.truncated = True
+            return
+        bisect.insort(top, entry)
+        if len(top) > self.capacity:
+            top.pop()
+            node.truncated = True
+
+    def remove(self, item_id):
+        """
+        Removes the suggestion for `item_id`. Returns True if it was present.
+        """
+        with self._lock:
+            previous = self._entries.pop(item_id, None)
+            if previous is None:
+                return False
+            _, lowered, words, score, _ = previous
+
+            entry = (-score, item_id)
+            for word in words:
+                node = self._root
+                for char in word:
+                    node = node.children[char]
+                    if entry in node.top:
+                        node.top.remove(entry)
+                        # Left-out items may now belong in the list; rebuild lazily
+                        if node.truncated and len(node.top) < self.top_size:
+                            node.stale = True
+                node.ids.discard(item_id)
+            for trigram in trigrams(lowered):
+                ids = self._trigrams.get(trigram)
+                if ids is not None:
+                    ids.discard(item_id)
+                    if not ids:
+                        del self._trigrams[trigram]
+            return True
+
+    def _refill(self, node):
+        """
+        Rebuilds the top list of `node` from its own items and its children's
+        lists, refilling stale children first. Each child list holds the best
+        items of its subtree, so their union holds the best items of this one;
+        the cost is bounded by the fan-out times `capacity`, not the subtree.
+        """
+        children = list(node.children.values())
+        for child in children:
+            if child.stale:
+                self._refill(child)
+        candidates = {(-self._entries[i][3], i) for i in node.ids}
+        for child in children:
+            candidates.update(child.top)
+        top = heapq.nsmallest(self.capacity, candidates)
+
+        # A truncated child only vouches for entries up to its worst stored one
+        cutoffs = [child.top[-1] for child in children if child.truncated]
+        if cutoffs:
+            cutoff = min(cutoffs)
+            top = [entry for entry in top if entry <= cutoff]
+        node.top = top
+        node.truncated = bool(cutoffs) or len(candidates) > len(top)
+        node.stale = False
+
+    def _prefix_matches(self, tokens):
+        node = self._root
+        for char in tokens[-1]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        if node.stale:
+            self._refill(node)
+
+        # Earlier words only need to prefix some word of the title
+        earlier = tokens[:-1]
+        return [
+            item_id
+            for _, item_id in node.top[: self.top_size]
+            if all(
+                any(word.startswith(token) for word in self._entries[item_id][2])
+                for token in earlier
+            )
+        ]
+
+    def _infix_matches(self, lowered):
+        postings = []
+        for trigram in trigrams(lowered):
+            ids = self._trigrams.get(trigram)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        matches = [
+            (-self._entries[i][3], i)
+            for i in candidates
+            if lowered in self._entries[i][1]
+        ]
+        return [item_id for _, item_id in sorted(matches)]
+
+    def suggest(self, query, limit=8):
+        """
+        Returns up to `limit` `(id, title)` pairs for a partially typed query:
+        items with title words starting with the typed words first, then items
+        whose title contains the query anywhere.
+        """
+        lowered = (query or "").strip().lower()
+        tokens = tokenize(lowered)
+        if not tokens or limit <= 0:
+            return []
+
+        with self._lock:
+            ids = self._prefix_matches(tokens)[:limit]
+            if len(ids) < limit and len(lowered) >= 3:
+                seen = set(ids)
+                for item_id in self._infix_matches(lowered):
+                    if item_id not in seen:
+                        ids.append(item_id)
+                        if len(ids) == limit:
+                            break
+            return [(item_id, self._entries[item_id][0]) for item_id in ids]
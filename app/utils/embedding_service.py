@@ -0,0 +1,209 @@
+"""
+Local embedding service.
+
+A single process owns the SentenceTransformer model and answers encode requests
+from every gunicorn worker over a Unix socket. Concurrent requests are merged
+into one model call (micro-batching) within a short wait window.
+
+Wire format: each message is a 4-byte big-endian length followed by the payload.
+Requests are JSON `{"texts": [...], "model": name}`; responses are two big-endian uint32s
+(row count, dimension) followed by the float32 matrix. A row count of 0 signals
+an error, including a request for a model other than the one the service
+loaded.
+"""
+
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct("!I")
+_HEADER = struct.Struct("!II")
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock, payload):
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def recv_message(sock):
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return _recv_exact(sock, size)
+
+
+class _Pending:
+    def __init__(self, texts):
+        self.texts = texts
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Collects encode requests from many threads and runs them as one batch.
+    A batch is dispatched once it holds `max_batch` texts or `max_wait` seconds
+    have passed since its first request arrived.
+    """
+
+    def __init__(self, encode, max_batch=64, max_wait=0.005):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """
+        Encodes `texts` as part of the next batch and blocks until done.
+        """
+        pending = _Pending(list(texts))
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            size += len(pending.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for pending in batch for text in pending.texts]
+            try:
+                vectors = np.asarray(self.encode(texts), dtype=np.float32)
+                offset = 0
+                for pending in batch:
+                    pending.result = vectors[offset : offset + len(pending.texts)]
+                    offset += len(pending.texts)
+                self.batches += 1
+                self.texts += len(texts)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            for pending in batch:
+                pending.done.set()
+
+
+class _EncodeHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = json.loads(recv_message(self.request))
+            except (ConnectionError, OSError):
+                return
+            except ValueError:
+                send_message(self.request, _HEADER.pack(0, 0))
+                continue
+
+            model = request.get("model")
+            if model and self.server.model_name and model != self.server.model_name:
+                logger.warning(
+                    f"Rejected request for model {model}; serving "
+                    f"{self.server.model_name}"
+                )
+                send_message(self.request, _HEADER.pack(0, 0))
+                continue
+
+            try:
+                vectors = self.server.batcher.submit(request.get("texts") or [])
+                vectors = np.ascontiguousarray(vectors, dtype="<f4")
+                count, dim = vectors.shape
+                payload = _HEADER.pack(count, dim) + vectors.tobytes()
+            except Exception:
+                logger.exception("Error encoding texts")
+                payload = _HEADER.pack(0, 0)
+            send_message(self.request, payload)
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server that answers encode requests through a MicroBatcher.
+    With `model_name` set, requests naming a different model are refused, so
+    workers never mix vectors from two models.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, socket_path, encode, max_batch=64, max_wait=0.005, model_name=None
+    ):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.model_name = model_name
+        self.batcher = MicroBatcher(encode, max_batch=max_batch, max_wait=max_wait)
+        super().__init__(socket_path, _EncodeHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class EmbeddingClient:
+    """
+    Thin client for EmbeddingServer. Opens one short-lived connection per call.
+    """
+
+    def __init__(self, socket_path, timeout=10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def encode(self, texts, model=None):
+        """
+        Returns a float32 matrix with one row per text, or None if the service
+        is unreachable, failed or serves a model other than `model`.
+        """
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.socket_path)
+                request = {"texts": list(texts), "model": model}
+                send_message(sock, json.dumps(request).encode())
+                response = recv_message(sock)
+        except OSError:
+            logger.warning(f"Embedding service unavailable at {self.socket_path}")
+            return None
+
+        count, dim = _HEADER.unpack_from(response)
+        if count == 0:
+            return None
+        return np.frombuffer(response, dtype="<f4", offset=_HEADER.size).reshape(
+            count, dim
+        )
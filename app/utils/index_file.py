@@ -0,0 +1,375 @@
+import json
+import os
+import struct
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from app.utils.ann_index import IVFIndex
+from app.utils.vector_index import normalize, top_k
+
+MAGIC = b"MULEIVF1"
+VERSION = 1
+
+# Every array section starts on a multiple of this many bytes
+ALIGNMENT = 64
+
+# Journal entries this much older than a new file's build time are dropped on
+# reopen; the margin covers commits racing the builder's read (seconds)
+JOURNAL_SLACK = 60
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _sections(header):
+    """
+    Returns `(name, dtype, shape)` for each array section of an index file, in
+    file order.
+    """
+    count, dim = header["count"], header["dim"]
+    nlist = max(header["nlist"], 1)
+    return [
+        ("centroids", np.float32, (header["nlist"], dim)),
+        ("offsets", np.int64, (nlist + 1,)),
+        ("matrix", np.float32, (count, dim)),
+        ("ids", np.int64, (count,)),
+        ("codes", np.int32, (count, len(header["attributes"]))),
+        ("sorted_ids", np.int64, (count,)),
+        ("sorted_rows", np.int64, (count,)),
+        ("tombstones", np.uint8, ((count + 7) // 8,)),
+    ]
+
+
+def write_index_file(path, index, built_at=None):
+    """
+    Writes the live contents of IVFIndex `index` to `path`.
+
+    Layout: magic, a length-prefixed JSON header, then 64-byte aligned
+    sections: centroids, list offsets, the float32 matrix ordered by list, the
+    id array, attribute codes, ids sorted for lookup with their rows, and a
+    tombstone bitmap. The header records the embedding model of the vectors.
+    The file is written next to `path` and renamed into
+    place, so readers never see a partial file. `built_at` (epoch seconds)
+    should be taken before the rows were read. Returns the header.
+    """
+    centroids, lists, vocab = index.export()
+    ids = (
+        np.concatenate([part[0] for part in lists])
+        if lists
+        else np.zeros(0, dtype=np.int64)
+    )
+    sizes = [len(part[0]) for part in lists] or [0]
+    header = {
+        "version": VERSION,
+        "build_id": uuid.uuid4().hex,
+        "built_at": time.time() if built_at is None else built_at,
+        "count": int(ids.shape[0]),
+        "dim": int(index.dim or 0),
+        "nlist": 0 if centroids is None else int(centroids.shape[0]),
+        "nprobe": index.nprobe,
+        "model": index.model_version,
+        "attributes": list(index.attributes),
+        "vocab": vocab,
+    }
+    order = np.argsort(ids, kind="stable")
+    arrays = {
+        "centroids": centroids,
+        "offsets": np.concatenate(([0], np.cumsum(sizes))).astype(np.int64),
+        "ids": ids,
+        "sorted_ids": ids[order],
+        "sorted_rows": order.astype(np.int64),
+        "tombstones": np.zeros((len(ids) + 7) // 8, dtype=np.uint8),
+    }
+
+    header_bytes = json.dumps(header).encode()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, dtype, shape in _sections(header):
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            if name in ("matrix", "codes"):
+                # Written list by list to avoid concatenating the whole matrix
+                column = 1 if name == "matrix" else 2
+                for part in lists:
+                    f.write(np.ascontiguousarray(part[column], dtype=dtype).tobytes())
+            elif arrays[name] is not None:
+                f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_header(path):
+    """
+    Returns `(header, data_offset)` for the index file at `path`.
+    Raises ValueError if it is not an index file of a supported version.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a search index file")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length))
+        if header.get("version") != VERSION:
+            raise ValueError(f"Unsupported index file version {header.get('version')}")
+        return header, f.tell()
+
+
+class IndexFile:
+    """
+    Read-only view of an index file. Array sections are `np.memmap`s, so every
+    process that opens the same file shares its page-cache pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header, offset = read_header(path)
+        self.build_id = self.header["build_id"]
+        self.built_at = self.header["built_at"]
+        self.dim = self.header["dim"]
+        self.count = self.header["count"]
+        self.nlist = self.header["nlist"]
+        self.model_version = self.header.get("model")
+        self.attributes = tuple(self.header["attributes"])
+        # Per attribute: value -> code
+        self.vocab = [
+            {value: code for code, value in enumerate(values)}
+            for values in self.header["vocab"]
+        ]
+
+        for name, dtype, shape in _sections(self.header):
+            offset = _align(offset)
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            if size:
+                array = np.memmap(
+                    path, dtype=dtype, mode="r", offset=offset, shape=shape
+                )
+            else:
+                array = np.zeros(shape, dtype=dtype)
+            setattr(self, name, array)
+            offset += size
+
+        # Small and read on every query, so kept in process memory
+        self.centroids = np.array(self.centroids)
+        self.offsets = np.array(self.offsets)
+
+    def row_of(self, item_id):
+        """
+        Returns the row holding `item_id`, or None.
+        """
+        pos = int(np.searchsorted(self.sorted_ids, item_id))
+        if pos < self.count and self.sorted_ids[pos] == item_id:
+            return int(self.sorted_rows[pos])
+        return None
+
+
+class SegmentedIndex:
+    """
+    Vector index made of a memory-mapped base segment and an in-memory delta.
+
+    The base segment is an index file written by `flask search build-index`;
+    its vectors are shared by every worker through the page cache, so opening
+    it neither copies the catalog nor queries the database. Writes made in this
+    process go to a small exact `IVFIndex` delta and mask the base row they
+    replace. Each change is journaled, so `reopen` can move onto a newer file
+    and replay only the changes the builder may not have seen; that is where
+    the delta is merged away.
+
+    Supports the same `add`, `remove` and `search` calls as `IVFIndex`.
+    """
+
+    quantization = None
+
+    def __init__(self, base, nprobe=None):
+        self.base = base
+        self.path = base.path
+        self.dim = base.dim or None
+        self.attributes = base.attributes
+        self.nlist = base.nlist
+        self.model_version = base.model_version
+        self.nprobe = nprobe or base.header.get("nprobe") or 8
+        self.centroids = base.centroids if base.nlist else None
+        self.built_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._dead = np.unpackbits(base.tombstones, count=base.count).astype(bool)
+        self._dead_count = int(self._dead.sum())
+        self._delta = IVFIndex(
+            dim=self.dim,
+            attributes=self.attributes,
+            min_train_size=float("inf"),
+        )
+        # id -> (epoch seconds, embedding or None, attributes)
+        self._journal = {}
+
+    @classmethod
+    def open(cls, path, nprobe=None):
+        return cls(IndexFile(path), nprobe=nprobe)
+
+    def reopen(self, nprobe=None):
+        """
+        Returns an index over the file now at `path`, carrying over journaled
+        changes newer than its build. Returns self, refreshed, if the file has
+        not been rebuilt. Changes are not carried over to a file built from
+        another embedding model, whose vectors they cannot be mixed with.
+        """
+        header, _ = read_header(self.path)
+        if header["build_id"] == self.base.build_id:
+            self.built_at = time.monotonic()
+            return self
+
+        index = type(self).open(self.path, nprobe=nprobe or self.nprobe)
+        if index.model_version != self.model_version:
+            return index
+        with self._lock:
+            journal = list(self._journal.items())
+        for item_id, (at, embedding, attributes) in journal:
+            if at < index.base.built_at - JOURNAL_SLACK:
+                continue
+            if embedding is None:
+                index.remove(item_id, at=at)
+            else:
+                index.add(item_id, embedding, attributes, at=at)
+        return index
+
+    def __len__(self):
+        return self.base.count - self._dead_count + len(self._delta)
+
+    def __contains__(self, item_id):
+        if item_id in self._delta:
+            return True
+        row = self.base.row_of(item_id)
+        return row is not None and not self._dead[row]
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    @property
+    def nbytes(self):
+        """
+        Process-private bytes: the delta, masks and centroids. The mapped base
+        segment is shared and not counted.
+        """
+        return (
+            self._delta.nbytes
+            + self._dead.nbytes
+            + self.base.centroids.nbytes
+            + self.base.offsets.nbytes
+        )
+
+    def _kill_base(self, item_id):
+        row = self.base.row_of(item_id)
+        if row is not None and not self._dead[row]:
+            self._dead[row] = True
+            self._dead_count += 1
+
+    def add(self, item_id, embedding, attributes=None, at=None):
+        """
+        Stores the vector for `item_id` in the delta, masking any base row.
+        A missing embedding removes the id instead. Returns True if stored.
+        """
+        with self._lock:
+            stored = self._delta.add(item_id, embedding, attributes)
+            if self.dim is None:
+                self.dim = self._delta.dim
+            self._kill_base(item_id)
+            self._journal[item_id] = (
+                time.time() if at is None else at,
+                embedding if stored else None,
+                attributes,
+            )
+            return stored
+
+    def remove(self, item_id, at=None):
+        """
+        Removes `item_id` from both segments. Returns True if it was present.
+        """
+        with self._lock:
+            present = item_id in self
+            self._delta.remove(item_id)
+            self._kill_base(item_id)
+            self._journal[item_id] = (time.time() if at is None else at, None, None)
+            return present
+
+    def _conditions(self, filters):
+        conditions = []
+        for name, values in (filters or {}).items():
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            vocab = self.base.vocab[self.attributes.index(name)]
+            allowed = [vocab[value] for value in values if value in vocab]
+            if not allowed:
+                return None
+            conditions.append((self.attributes.index(name), np.array(allowed)))
+        return conditions
+
+    def _scan(self, start, stop, q, conditions):
+        mask = ~self._dead[start:stop]
+        for column, allowed in conditions:
+            mask &= np.isin(self.base.codes[start:stop, column], allowed)
+        rows = np.flatnonzero(mask)
+        if rows.shape[0] == stop - start:
+            return self.base.ids[start:stop], self.base.matrix[start:stop] @ q
+        rows += start
+        return self.base.ids[rows], self.base.matrix[rows] @ q
+
+    def search(
+        self, query, k=20, threshold=None, nprobe=None, filters=None, timings=None
+    ):
+        """
+        Returns up to `k` `(id, score)` pairs ordered by descending cosine
+        similarity, merging the probed base lists with the delta. Arguments
+        are those of `IVFIndex.search`.
+        """
+        started = time.perf_counter()
+        q = normalize(query)
+        if q is None or k <= 0 or q.shape[0] != self.dim:
+            return []
+
+        with self._lock:
+            delta = self._delta.search(q, k=k, threshold=threshold, filters=filters)
+            parts = [
+                (
+                    np.array([item_id for item_id, _ in delta], dtype=np.int64),
+                    np.array([score for _, score in delta], dtype=np.float32),
+                )
+            ]
+            conditions = self._conditions(filters)
+            if conditions is not None and self.base.count:
+                if self.centroids is None:
+                    probes, nprobe = [0], 1
+                else:
+                    probes = np.argsort(-(self.centroids @ q))
+                    nprobe = min(nprobe or self.nprobe, self.nlist)
+
+                found = 0
+                for probed, list_no in enumerate(probes):
+                    if probed >= nprobe and (not conditions or found >= k):
+                        break
+                    start, stop = self.base.offsets[list_no : list_no + 2]
+                    ids, scores = self._scan(int(start), int(stop), q, conditions)
+                    parts.append((ids, scores))
+                    found += (
+                        ids.shape[0]
+                        if threshold is None
+                        else int(np.count_nonzero(scores >= threshold))
+                    )
+
+            ids = np.concatenate([part[0] for part in parts])
+            scores = np.concatenate([part[1] for part in parts])
+
+        scored = time.perf_counter()
+        results = top_k(ids, scores, k, threshold)
+        if timings is not None:
+            timings["score"] = (scored - started) * 1000
+            timings["select"] = (time.perf_counter() - scored) * 1000
+            timings["scanned"] = int(ids.shape[0])
+        return results
@@ -0,0 +1,302 @@
+"""
+Publish/subscribe of chat events to the open streams of each user.
+
+`MessageBroker` delivers events to subscribers in this process. Every gunicorn
+worker has its own broker, so a message sent through one worker reaches
+streams held by another only through a broadcast backend:
+
+- `SocketBroadcastBackend`: every process binds a Unix datagram socket in a
+  shared directory and publishing sends the event to each of them. Enough for
+  all workers on one host.
+- `PostgresNotifyBackend`: events travel over Postgres NOTIFY on a channel
+  every process LISTENs on, so workers on several hosts share them.
+
+With a backend, events reach local subscribers through it as well, so each
+event is delivered exactly once per process. Events are small JSON objects;
+they tell a stream that something happened, and the stream reads the data it
+serves from the database.
+"""
+
+import json
+import logging
+import os
+import queue
+import select
+import socket
+import threading
+import uuid
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Bounded queue of the events published to one channel.
+    If the subscriber falls `maxsize` events behind, further events are
+    dropped and `overflowed` is set; it should reload its state and resubscribe.
+    """
+
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """
+        Returns the next event, or None if none arrived within `timeout` seconds.
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MessageBroker:
+    """
+    Thread-safe in-process pub/sub keyed by channel (e.g. a user id), with an
+    optional broadcast backend shared with other processes.
+    """
+
+    def __init__(self, backend=None, max_pending=100):
+        self.max_pending = max_pending
+        self.published = 0
+        self.delivered = 0
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+        self._backend = None
+        self._started = False
+        self.configure(backend=backend)
+
+    def configure(self, backend=None, max_pending=None):
+        """
+        Replaces the broadcast backend (None for in-process delivery only).
+        """
+        with self._lock:
+            if self._backend is not None and self._started:
+                self._backend.stop()
+            self._backend = backend
+            self._started = False
+            if max_pending is not None:
+                self.max_pending = max_pending
+
+    def _ensure_started(self):
+        # Started lazily so listener threads and sockets belong to the process
+        # that uses them, not to a pre-fork master
+        with self._lock:
+            backend = self._backend
+            if backend is not None and not self._started:
+                backend.start(self.deliver)
+                self._started = True
+        return backend
+
+    def subscribe(self, channel):
+        self._ensure_started()
+        subscription = Subscription(self, str(channel), self.max_pending)
+        with self._lock:
+            self._subscriptions[subscription.channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, event):
+        """
+        Sends `event` (a JSON-serializable dict) to every subscriber of
+        `channel`, in this process and, through the backend, in others.
+        """
+        self.published += 1
+        backend = self._ensure_started()
+        if backend is None:
+            self.deliver(str(channel), event)
+            return
+        try:
+            backend.publish(str(channel), event)
+        except Exception:
+            # Streams elsewhere catch up on their next event or reconnect
+            logger.exception("Could not broadcast chat event")
+            self.deliver(str(channel), event)
+
+    def deliver(self, channel, event):
+        """
+        Hands `event` to the subscribers of `channel` in this process.
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+        self.delivered += len(subscriptions)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": type(self._backend).__name__ if self._backend else None,
+                "channels": len(self._subscriptions),
+                "subscribers": sum(len(s) for s in self._subscriptions.values()),
+                "published": self.published,
+                "delivered": self.delivered,
+            }
+
+
+def _encode(channel, event):
+    return json.dumps({"channel": channel, "event": event}).encode()
+
+
+def _decode(payload):
+    message = json.loads(payload)
+    return message["channel"], message["event"]
+
+
+class SocketBroadcastBackend:
+    """
+    Broadcasts events to every process with a socket in `directory`.
+    Sockets of processes that exited are removed when a send to them fails.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = None
+        self._sock = None
+        self._thread = None
+
+    def start(self, deliver):
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"{uuid.uuid4().hex}.sock")
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+
+        def listen(sock):
+            while True:
+                try:
+                    payload = sock.recv(65536)
+                except OSError:
+                    return
+                try:
+                    deliver(*_decode(payload))
+                except (ValueError, KeyError):
+                    logger.warning("Ignored malformed chat event")
+
+        self._thread = threading.Thread(target=listen, args=(self._sock,), daemon=True)
+        self._thread.start()
+
+    def publish(self, channel, event):
+        payload = _encode(channel, event)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            # Called from commit hooks in request threads: a listener that
+            # stopped reading drops events instead of stalling the sender
+            sock.setblocking(False)
+            for name in os.listdir(self.directory):
+                if not name.endswith(".sock"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    sock.sendto(payload, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                except BlockingIOError:
+                    logger.warning(f"Chat event dropped for busy listener {path}")
+
+    def stop(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class PostgresNotifyBackend:
+    """
+    Broadcasts events with Postgres NOTIFY on `channel`; a listener thread in
+    each process LISTENs on its own connection. Payloads must stay under
+    Postgres' 8000 byte limit, which the small chat events do.
+    """
+
+    def __init__(self, dsn, channel="mulemart_chat"):
+        self.dsn = dsn
+        self.channel = channel
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _connect(self):
+        import psycopg2
+
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def start(self, deliver):
+        self._stopped.clear()
+
+        def listen():
+            while not self._stopped.is_set():
+                try:
+                    conn = self._connect()
+                    with conn.cursor() as cursor:
+                        cursor.execute(f'LISTEN "{self.channel}"')
+                    while not self._stopped.is_set():
+                        if select.select([conn], [], [], 5)[0]:
+                            conn.poll()
+                            while conn.notifies:
+                                deliver(*_decode(conn.notifies.pop(0).payload))
+                    conn.close()
+                except Exception:
+                    logger.exception("Chat event listener failed; reconnecting")
+                    self._stopped.wait(1)
+
+        self._thread = threading.Thread(target=listen, daemon=True)
+        self._thread.start()
+
+    def publish(self, channel, event):
+        payload = _encode(channel, event).decode()
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None or self._publish_conn.closed:
+                        self._publish_conn = self._connect()
+                    with self._publish_conn.cursor() as cursor:
+                        cursor.execute(
+                            "SELECT pg_notify(%s, %s)", (self.channel, payload)
+                        )
+                    return
+                except Exception:
+                    # A dropped connection is reopened once
+                    self._publish_conn = None
+                    if attempt:
+                        raise
+
+    def stop(self):
+        self._stopped.set()
+        with self._publish_lock:
+            if self._publish_conn is not None:
+                self._publish_conn.close()
+                self._publish_conn = None
+
+
+# Process-level broker for chat streams
+chat_broker = MessageBroker()
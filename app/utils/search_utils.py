@@ -1,36 +1,343 @@
 import numpy as np
 
+import hashlib
+import logging
 import pickle
+import threading
+import time
 
-# Singleton model instance
+from app.utils.embedding_service import EmbeddingClient
+from app.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Embeddings are stored as fixed-width little-endian float32 bytes
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+# Model used when callers do not name one; set from the EMBEDDING_MODEL config
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+_model_name = DEFAULT_MODEL
+
+# Singleton instance of the default model
 _model = None
 
+# Other models loaded in this process, e.g. while re-embedding, by name
+_other_models = {}
+
+# Held while a model loads, so concurrent first requests load it only once
+_model_lock = threading.Lock()
+
+# Start-up timings of the model in this process (seconds)
+model_metrics = {"load_seconds": None, "warmup_seconds": None}
+
+# Client for a shared embedding service process, if one is configured
+_embedding_client = None
+
+
+def configure_embedding_service(socket_path):
+    """
+    Routes all encoding through the embedding service listening on `socket_path`
+    instead of a model loaded in this process. Pass None to use a local model.
+    """
+    global _embedding_client
+    _embedding_client = EmbeddingClient(socket_path) if socket_path else None
+
+
+def configure_embedding_model(name):
+    """
+    Sets the model that `get_model` loads and that encoding uses by default.
+    """
+    global _model_name, _model
+    name = name or DEFAULT_MODEL
+    if name != _model_name:
+        _model_name = name
+        _model = None
+
+
+def default_model_name():
+    return _model_name
+
 
 def get_model():
     """
     Returns the singleton instance of the SentenceTransformer model.
     """
     global _model
-    if _model is None:
-        # Lazy import to avoid high memory usage on startup and allow running without the package installed
-        from sentence_transformers import SentenceTransformer
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is None:
+            start = time.perf_counter()
+            # Lazy import to avoid high memory usage on startup and allow running without the package installed
+            from sentence_transformers import SentenceTransformer
 
-        # 'all-MiniLM-L6-v2' is a good balance of speed and quality
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
+            # 'all-MiniLM-L6-v2' is a good balance of speed and quality
+            _model = SentenceTransformer(_model_name)
+            model_metrics["load_seconds"] = time.perf_counter() - start
     return _model
 
 
-def generate_embedding(text):
+def _get_model(name=None):
+    """
+    Returns the default model, or the model called `name`, loading it on first
+    use. Only the default model is served by the embedding service.
+
+    After `flask embeddings reembed` switches models, web workers load the new
+    one here next to the default until restarted with EMBEDDING_MODEL set to it.
+    """
+    if name is None or name == _model_name:
+        return get_model()
+    model = _other_models.get(name)
+    if model is not None:
+        return model
+    with _model_lock:
+        if name not in _other_models:
+            from sentence_transformers import SentenceTransformer
+
+            logger.warning(
+                f"Loading embedding model {name} alongside {_model_name}; "
+                f"restart with EMBEDDING_MODEL={name} to load only one"
+            )
+            _other_models[name] = SentenceTransformer(name)
+    return _other_models[name]
+
+
+def _use_service(model):
+    return _embedding_client is not None and model in (None, _model_name)
+
+
+def warm_model(text="warm up"):
+    """
+    Loads the model and runs one encode so the first real search does not pay
+    for loading weights or initializing the inference runtime.
+    Returns True on success, False if embeddings are unavailable.
+    """
+    if _embedding_client is not None:
+        return _embedding_client.encode([text]) is not None
+    try:
+        model = get_model()
+        start = time.perf_counter()
+        model.encode(text)
+        model_metrics["warmup_seconds"] = time.perf_counter() - start
+        return True
+    except Exception:
+        return False
+
+
+def generate_embedding(text, model=None):
+    """
+    Encodes `text` with the default model, or the model called `model`.
+    """
     if not text:
         return None
+    if _use_service(model):
+        vectors = _embedding_client.encode([text], model=_model_name)
+        return None if vectors is None else vectors[0]
     try:
-        model = get_model()
-        return model.encode(text)
+        return _get_model(model).encode(text)
+    except Exception:
+        # Embeddings disabled if dependency missing
+        return None
+
+
+class EmbeddingCache(TTLCache):
+    """
+    Bounded, thread-safe LRU cache of query embeddings.
+    Keys are normalized query text and the model name; values are read-only float32 arrays that expire
+    after `ttl` seconds. Keeps hit, miss and eviction counters.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600):
+        super().__init__(maxsize, ttl)
+
+    @staticmethod
+    def normalize_key(text):
+        return " ".join(text.lower().split())
+
+    def get(self, text, model=None):
+        return self._get((self.normalize_key(text), model))
+
+    def put(self, text, vector, model=None):
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        self._put((self.normalize_key(text), model), vector)
+        return vector
+
+
+# Process-level cache for search query embeddings
+query_embedding_cache = EmbeddingCache()
+
+
+class SearchResultCache(TTLCache):
+    """
+    Bounded, thread-safe LRU cache of search result ids.
+
+    Keys are built from normalized request parameters. Each entry records the
+    catalog generation it was computed at; `bump_generation` is called on every
+    item write, so entries from before the write are treated as misses. Memory is
+    bounded by both the number of entries and the total number of cached ids.
+
+    With a broadcast backend from `message_broker`, a bump in any process (web
+    worker or job worker) also bumps every other process's generation, so no
+    worker serves results from before a committed write. Without one, writes
+    in other processes show up once entries expire after `ttl` seconds.
+    """
+
+    channel = "search"
+
+    def __init__(self, maxsize=512, max_ids=100_000, ttl=60, backend=None):
+        self.max_ids = max_ids
+        self._ids = 0
+        super().__init__(maxsize, ttl, backend=backend)
+
+    @staticmethod
+    def make_key(search=None, **params):
+        """
+        Builds a cache key from request parameters. The search text is compared
+        case-insensitively, like query embeddings; for the other parameters only
+        surrounding whitespace and the order or duplication of multi-valued
+        filters are ignored.
+        """
+
+        def normalize(value):
+            if isinstance(value, str):
+                return value.strip() or None
+            if isinstance(value, (list, tuple, set)):
+                return tuple(sorted({normalize(v) for v in value} - {None})) or None
+            return value
+
+        search = EmbeddingCache.normalize_key(search) if search else None
+        params = sorted((name, normalize(value)) for name, value in params.items())
+        return (search, *params)
+
+    def _is_current(self, value):
+        return value[2] == self.generation
+
+    def _over_capacity(self):
+        return super()._over_capacity() or self._ids > self.max_ids
+
+    def _stored(self, value):
+        self._ids += len(value[0])
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._ids -= len(entry[0][0])
+
+    def on_broadcast(self, event):
+        self._drop(())
+
+    def bump_generation(self):
+        self._drop(())
+        self.broadcast({})
+
+    def get(self, key):
+        """
+        Returns the `(ids, total)` stored for `key`, or None on a miss.
+        """
+        value = self._get(key)
+        return None if value is None else value[:2]
+
+    def put(self, key, ids, total=None):
+        """
+        Stores result `ids` (and an optional total count) under `key`.
+        Results larger than `max_ids` are not cached.
+        """
+        ids = tuple(ids)
+        if len(ids) <= self.max_ids:
+            self._put(key, (ids, total, self.generation))
+
+    def configure(self, maxsize=None, max_ids=None, ttl=None, backend=None):
+        """
+        Sets the limits and replaces the broadcast backend (None to keep
+        invalidations in this process).
+        """
+        if max_ids is not None:
+            self.max_ids = max_ids
+        super().configure(maxsize=maxsize, ttl=ttl, backend=backend)
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(
+                cached_ids=self._ids, max_ids=self.max_ids, generation=self.generation
+            )
+        return stats
+
+
+# Process-level cache of search result ids for list_items and buy_item
+search_result_cache = SearchResultCache()
+
+
+def generate_query_embedding(text, model=None):
+    """
+    Returns the embedding for a search query, served from `query_embedding_cache`
+    when the same normalized query was encoded recently. `model` names the
+    model of the index being searched (default model if None).
+    Returns a read-only float32 array, or None if embeddings are unavailable.
+    """
+    if not text or not text.strip():
+        return None
+    vector = query_embedding_cache.get(text, model)
+    if vector is not None:
+        return vector
+    vector = generate_embedding(EmbeddingCache.normalize_key(text), model=model)
+    if vector is None:
+        return None
+    return query_embedding_cache.put(text, vector, model)
+
+
+def embedding_text(title, description):
+    """
+    The text an item's embedding is generated from.
+    """
+    return f"{title} {description or ''}"
+
+
+def embedding_text_hash(text):
+    """
+    SHA-256 hex digest of an `embedding_text`, stored with the embedding so
+    edits that keep the text do not re-encode it.
+    """
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def generate_embeddings(texts, batch_size=32, model=None):
+    """
+    Encodes many texts with a single batched call to the default model, or
+    the model called `model`.
+    Returns a float32 matrix with one row per text, or None if embeddings are unavailable.
+    """
+    if not texts:
+        return None
+    if _use_service(model):
+        return _embedding_client.encode(texts, model=_model_name)
+    try:
+        vectors = _get_model(model).encode(list(texts), batch_size=batch_size)
+        return np.asarray(vectors, dtype=np.float32)
     except Exception:
         # Embeddings disabled if dependency missing
         return None
 
 
+def encode_embedding(vec):
+    """
+    Serializes a vector to raw little-endian float32 bytes for storage.
+    """
+    if vec is None:
+        return None
+    return np.asarray(vec, dtype=EMBEDDING_DTYPE).ravel().tobytes()
+
+
+def decode_embedding(data):
+    """
+    Decodes raw float32 bytes into a read-only numpy array without copying.
+    """
+    if data is None:
+        return None
+    return np.frombuffer(data, dtype=EMBEDDING_DTYPE)
+
+
 def cosine_similarity(vec_a, vec_b):
     """
     Computes cosine similarity between two vectors.
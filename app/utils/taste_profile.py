@@ -0,0 +1,140 @@
+import math
+
+import numpy as np
+
+from app.utils.ttl_cache import TTLCache
+from app.utils.vector_index import normalize
+
+# Default time for an interaction's weight to halve (seconds)
+DEFAULT_HALF_LIFE = 14 * 24 * 3600
+
+
+class TasteProfile:
+    """
+    Time-decayed weighted sum of the embeddings a user interacted with.
+
+    Each interaction contributes `weight * exp(-rate * age)` times its unit
+    embedding. The sum is stored as of `updated_at` and decayed forward as new
+    interactions arrive, so adding one costs a single vector update.
+    Only the direction of the sum is used for ranking.
+    """
+
+    def __init__(self, half_life=DEFAULT_HALF_LIFE):
+        self.rate = math.log(2) / half_life
+        self.total = None
+        self.updated_at = None
+
+    def add(self, embedding, weight, at):
+        """
+        Folds an interaction with `embedding` at timestamp `at` (seconds) into
+        the profile. A negative weight takes back an earlier interaction.
+        Returns True if the embedding was usable.
+        """
+        vec = normalize(embedding)
+        if vec is None:
+            return False
+        if self.total is None:
+            self.total = np.zeros_like(vec)
+            self.updated_at = at
+        if vec.shape != self.total.shape:
+            return False
+
+        if at > self.updated_at:
+            self.total *= math.exp(-self.rate * (at - self.updated_at))
+            self.updated_at = at
+        self.total += vec * (weight * math.exp(-self.rate * (self.updated_at - at)))
+        return True
+
+    def vector(self):
+        """
+        Returns the unit-norm taste vector, or None if the profile is empty.
+        """
+        return normalize(self.total)
+
+
+class TasteProfileCache(TTLCache):
+    """
+    Bounded, thread-safe LRU cache of per-user `TasteProfile`s.
+
+    Profiles are built from the database on a miss and then kept current with
+    `apply`, which the session hooks call with a transaction's interactions
+    once it commits, so page loads do not re-read a user's history. With a
+    broadcast backend from `message_broker`, other processes drop their copy
+    of those users' profiles and rebuild it on their next request; without
+    one, profiles expire after `ttl` seconds so other workers' interactions
+    show up eventually.
+    """
+
+    channel = "taste"
+
+    def __init__(self, maxsize=10_000, half_life=DEFAULT_HALF_LIFE, ttl=900):
+        self.half_life = half_life
+        super().__init__(maxsize, ttl)
+
+    def new_profile(self):
+        return TasteProfile(self.half_life)
+
+    def get(self, user_id):
+        """
+        Returns the cached profile for `user_id`, or None on a miss.
+        """
+        return self._get(user_id)
+
+    def put(self, user_id, profile, generation=None):
+        """
+        Stores `profile`, unless `generation` (read before building it) shows
+        that a change happened in the meantime.
+        """
+        self._put(user_id, profile, generation)
+
+    def record(self, user_id, embedding, weight, at):
+        """
+        Applies an interaction to the cached profile of `user_id`. Users without
+        a cached profile are skipped; their next build reads the interaction
+        from the database.
+        """
+        with self._lock:
+            self.generation += 1
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[0].add(embedding, weight, at)
+
+    def invalidate(self, user_id):
+        self._drop([user_id])
+
+    def apply(self, updates):
+        """
+        Applies committed `updates`: `(user_id, embedding, weight, at)` tuples
+        to fold in, or `(user_id, None, None, None)` to drop the profile. Other
+        processes are told to drop the profiles of these users.
+        """
+        user_ids = set()
+        for user_id, embedding, weight, at in updates:
+            if weight is None:
+                self.invalidate(user_id)
+            else:
+                self.record(user_id, embedding, weight, at)
+            user_ids.add(user_id)
+        if user_ids:
+            self.broadcast({"user_ids": sorted(user_ids)})
+
+    def on_broadcast(self, event):
+        self._drop(event["user_ids"])
+
+    def configure(self, maxsize=None, half_life=None, ttl=None, backend=None):
+        """
+        Sets the limits and replaces the broadcast backend (None to keep
+        invalidations in this process). Changing `half_life` drops every
+        profile.
+        """
+        if half_life is not None and half_life != self.half_life:
+            self.half_life = half_life
+            self.clear()
+        super().configure(maxsize=maxsize, ttl=ttl, backend=backend)
+
+    def stats(self):
+        return {**super().stats(), "half_life": self.half_life}
+
+
+# Process-level cache of taste profiles for the "for you" feed
+taste_profile_cache = TasteProfileCache()
@@ -0,0 +1,176 @@
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words too common in listings and queries to say anything about a match
+STOPWORDS = frozenset(
+    """
+    a an and are as at be but by for from has have in is it its of on or so
+    that the this to was were will with new used good great condition like
+    """.split()
+)
+
+
+def tokenize(text):
+    """
+    Lowercases `text` and splits it into alphanumeric tokens, so model numbers
+    such as "RTX-3080" become ["rtx", "3080"].
+    """
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def query_tokens(query):
+    """
+    Distinct tokens of a search query without stopwords, unless the query has
+    nothing else.
+    """
+    tokens = set(tokenize(query))
+    return tokens - STOPWORDS or tokens
+
+
+def reciprocal_rank_fusion(*rankings, k=60):
+    """
+    Merges ranked id lists into one ranking using reciprocal rank fusion:
+    each id scores sum(1 / (k + rank)) over the lists it appears in.
+    Returns `(id, score)` pairs ordered by descending fused score.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring.
+
+    Postings map each token to `{doc_id: term frequency}`, so a query only
+    touches the documents that contain at least one of its tokens.
+    Documents can carry attribute values that searches may filter on.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.built_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._postings = defaultdict(dict)
+        self._lengths = {}
+        self._terms = {}
+        self._attributes = {}
+        self._total_length = 0
+
+    @classmethod
+    def from_rows(cls, rows, **kwargs):
+        """
+        Builds an index from an iterable of `(id, text, attributes)` rows.
+        """
+        index = cls(**kwargs)
+        for doc_id, text, attributes in rows:
+            index.add(doc_id, text, attributes)
+        return index
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._lengths
+
+    def add(self, doc_id, text, attributes=None):
+        """
+        Inserts or replaces the document stored for `doc_id`.
+        Empty text removes the document instead. Returns True if stored.
+        """
+        tokens = tokenize(text)
+        with self._lock:
+            self.remove(doc_id)
+            if not tokens:
+                return False
+            counts = Counter(tokens)
+            for token, count in counts.items():
+                self._postings[token][doc_id] = count
+            self._terms[doc_id] = tuple(counts)
+            self._lengths[doc_id] = len(tokens)
+            self._attributes[doc_id] = attributes or {}
+            self._total_length += len(tokens)
+            return True
+
+    def remove(self, doc_id):
+        """
+        Removes `doc_id` from the index. Returns True if it was present.
+        """
+        with self._lock:
+            length = self._lengths.pop(doc_id, None)
+            if length is None:
+                return False
+            self._attributes.pop(doc_id, None)
+            self._total_length -= length
+            for token in self._terms.pop(doc_id):
+                docs = self._postings[token]
+                del docs[doc_id]
+                if not docs:
+                    del self._postings[token]
+            return True
+
+    def matches_all(self, doc_id, query):
+        """
+        Returns True if `doc_id` contains every (non-stopword) token of `query`.
+        """
+        with self._lock:
+            terms = self._terms.get(doc_id)
+            return terms is not None and query_tokens(query) <= set(terms)
+
+    def _matches(self, doc_id, filters):
+        attributes = self._attributes.get(doc_id, {})
+        for name, values in filters.items():
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            if attributes.get(name) not in values:
+                return False
+        return True
+
+    def search(self, query, k=20, filters=None):
+        """
+        Returns up to `k` `(id, score)` pairs ordered by descending BM25 score.
+        `filters` maps attribute names to a value or list of allowed values.
+        """
+        tokens = query_tokens(query)
+        if not tokens or k <= 0:
+            return []
+
+        with self._lock:
+            count = len(self._lengths)
+            if count == 0:
+                return []
+            avg_length = self._total_length / count
+
+            scores = defaultdict(float)
+            for token in tokens:
+                docs = self._postings.get(token)
+                if not docs:
+                    continue
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    norm = self.k1 * (
+                        1 - self.b + self.b * self._lengths[doc_id] / avg_length
+                    )
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if filters:
+                scores = {
+                    doc_id: score
+                    for doc_id, score in scores.items()
+                    if self._matches(doc_id, filters)
+                }
+
+        return heapq.nsmallest(k, scores.items(), key=lambda pair: (-pair[1], pair[0]))
@@ -0,0 +1,175 @@
+"""
+Base class of the process-level caches (query embeddings, search results,
+taste profiles, unread counts).
+
+`TTLCache` is a bounded, thread-safe LRU map whose entries expire after `ttl`
+seconds. Caches of data other processes can change take a broadcast backend
+from `message_broker`: `broadcast` sends an invalidation to every other
+process, and each receives it in `on_broadcast`.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Bounded, thread-safe LRU cache with per-entry expiry, hit/miss/eviction
+    counters and optional cross-process invalidation on `channel`.
+
+    `generation` is bumped whenever entries are dropped for being out of date;
+    a value loaded after reading it is only stored if it has not moved, so a
+    load racing a write cannot cache the older value. Subclasses build their
+    API on `_get`, `_put` and `_drop`.
+    """
+
+    # Broadcast channel of this cache's invalidations
+    channel = None
+
+    def __init__(self, maxsize, ttl, backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._backend = backend
+        self._started = False
+        # Tags this process's broadcasts so it skips its own
+        self._origin = uuid.uuid4().hex
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _ensure_started(self):
+        # Started lazily so the listener belongs to the worker, not a pre-fork master
+        with self._lock:
+            backend = self._backend
+            if backend is not None and not self._started:
+                backend.start(self._receive)
+                self._started = True
+        return backend
+
+    def _is_current(self, value):
+        """
+        Returns False for an unexpired value that must not be served anymore.
+        """
+        return True
+
+    def _over_capacity(self):
+        return len(self._entries) > self.maxsize
+
+    def _stored(self, value):
+        """
+        Called with `_lock` held after `value` is added, e.g. to account its size.
+        """
+
+    def _discard(self, key):
+        self._entries.pop(key, None)
+
+    def _evict(self):
+        while self._entries and self._over_capacity():
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _get(self, key):
+        """
+        Returns the value stored for `key`, or None on a miss.
+        """
+        self._ensure_started()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if time.monotonic() < expires_at and self._is_current(value):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._discard(key)
+            self.misses += 1
+            return None
+
+    def _put(self, key, value, generation=None):
+        """
+        Stores `value` under `key`, unless `generation` (read before loading
+        it) shows that entries were dropped in the meantime.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._stored(value)
+            self._evict()
+
+    def _drop(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._discard(key)
+
+    def broadcast(self, event):
+        """
+        Sends `event` (a JSON-serializable dict) to the other processes'
+        `on_broadcast`, if a backend is configured.
+        """
+        backend = self._ensure_started()
+        if backend is None:
+            return
+        try:
+            backend.publish(self.channel, {"origin": self._origin, **event})
+        except Exception:
+            logger.exception(f"Could not broadcast {self.channel} cache invalidation")
+
+    def _receive(self, channel, event):
+        if channel == self.channel and event.get("origin") != self._origin:
+            self.on_broadcast(event)
+
+    def on_broadcast(self, event):
+        """
+        Applies an invalidation broadcast by another process.
+        """
+
+    def configure(self, maxsize=None, ttl=None, backend=None):
+        """
+        Sets the limits and replaces the broadcast backend (None to keep
+        invalidations in this process).
+        """
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            if self._backend is not None and self._started:
+                self._backend.stop()
+            self._backend = backend
+            self._started = False
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._discard(key)
+            self.generation += 1
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "backend": type(self._backend).__name__ if self._backend else None,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,60 @@
+from app.utils.ttl_cache import TTLCache
+
+
+class UnreadCountCache(TTLCache):
+    """
+    Bounded, thread-safe LRU cache of each user's unread message count, read
+    by the navbar badge on every rendered page.
+
+    Entries are dropped by `invalidate` once a transaction that changes a
+    user's count commits. With a broadcast backend from `message_broker`,
+    invalidations are also sent to the other processes, which drop their
+    copies; without one, other workers serve their entry until `ttl` expires.
+    A count loaded while an invalidation was in flight is not stored, so a
+    read racing a write cannot cache the older value.
+    """
+
+    channel = "unread"
+
+    def __init__(self, maxsize=10_000, ttl=300, backend=None):
+        super().__init__(maxsize, ttl, backend=backend)
+        self.invalidations = 0
+
+    def get(self, user_id, load):
+        """
+        Returns the unread count of `user_id`, calling `load()` on a miss.
+        """
+        generation = self.generation
+        count = self._get(user_id)
+        if count is None:
+            count = load()
+            self._put(user_id, count, generation)
+        return count
+
+    def _drop(self, keys):
+        super()._drop(keys)
+        self.invalidations += 1
+
+    def on_broadcast(self, event):
+        self._drop(event["user_ids"])
+
+    def invalidate(self, user_ids):
+        """
+        Drops the counts of `user_ids` here and, through the backend, in
+        every other process.
+        """
+        user_ids = sorted(set(user_ids))
+        if user_ids:
+            self._drop(user_ids)
+            self.broadcast({"user_ids": user_ids})
+
+    def clear(self):
+        super().clear()
+        self.invalidations = 0
+
+    def stats(self):
+        return {**super().stats(), "invalidations": self.invalidations}
+
+
+# Process-level cache of unread message counts
+unread_count_cache = UnreadCountCache()
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import numpy as np
+
+
+def normalize(vec):
+    """
+    Converts a vector to a contiguous float32 numpy array with unit L2 norm.
+    Returns None for missing or zero vectors.
+    """
+    if vec is None:
+        return None
+    arr = np.asarray(vec, dtype=np.float32).ravel()
+    norm = np.linalg.norm(arr)
+    if arr.size == 0 or norm == 0:
+        return None
+    return arr / norm
+
+
+def top_k(ids, scores, k, threshold=None):
+    """
+    Returns up to `k` `(id, score)` pairs from the parallel `ids` and `scores`
+    arrays, ordered by descending score and keeping only scores >= `threshold`.
+    """
+    candidates = (
+        np.flatnonzero(scores >= threshold)
+        if threshold is not None
+        else np.arange(scores.shape[0])
+    )
+    if candidates.size > k:
+        top = np.argpartition(-scores[candidates], k - 1)[:k]
+        candidates = candidates[top]
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+class VectorIndex:
+    """
+    In-memory index of L2-normalized embeddings.
+
+    Vectors live in one contiguous float32 matrix with a parallel id array, so a
+    query is a single matrix-vector product followed by a partial top-k selection.
+    Rows are kept packed: removing an id moves the last row into its slot.
+    """
+
+    def __init__(self, dim=None, capacity=1024):
+        self.dim = dim
+        self.built_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._capacity = capacity
+        self._matrix = np.zeros((capacity, dim or 0), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds an index from an iterable of `(id, embedding)` pairs.
+        Rows with a missing embedding or a dimension that differs from the first
+        valid row are skipped.
+        """
+        index = cls()
+        for item_id, embedding in rows:
+            index.add(item_id, embedding)
+        return index
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, item_id):
+        return item_id in self._positions
+
+    @property
+    def ids(self):
+        return self._ids[: self._size]
+
+    @property
+    def matrix(self):
+        return self._matrix[: self._size]
+
+    def _grow(self, min_capacity):
+        capacity = max(min_capacity, self._capacity * 2, 1)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[: self._size] = self._matrix[: self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        self._matrix, self._ids, self._capacity = matrix, ids, capacity
+
+    def add(self, item_id, embedding):
+        """
+        Inserts or replaces the vector stored for `item_id`.
+        A missing embedding removes the id instead. Returns True if stored.
+        """
+        vec = normalize(embedding)
+        if vec is None:
+            self.remove(item_id)
+            return False
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vec.shape[0]
+                self._matrix = np.zeros((self._capacity, self.dim), dtype=np.float32)
+            if vec.shape[0] != self.dim:
+                self.remove(item_id)
+                return False
+
+            pos = self._positions.get(item_id)
+            if pos is None:
+                if self._size == self._capacity:
+                    self._grow(self._size + 1)
+                pos = self._size
+                self._size += 1
+                self._ids[pos] = item_id
+                self._positions[item_id] = pos
+            self._matrix[pos] = vec
+            return True
+
+    def remove(self, item_id):
+        """
+        Removes `item_id` from the index. Returns True if it was present.
+        """
+        with self._lock:
+            pos = self._positions.pop(item_id, None)
+            if pos is None:
+                return False
+            last = self._size - 1
+            if pos != last:
+                moved_id = int(self._ids[last])
+                self._matrix[pos] = self._matrix[last]
+                self._ids[pos] = moved_id
+                self._positions[moved_id] = pos
+            self._size = last
+            return True
+
+    def search(self, query, k=20, threshold=None):
+        """
+        Returns up to `k` `(id, score)` pairs ordered by descending cosine
+        similarity to `query`, keeping only scores >= `threshold` when given.
+        """
+        q = normalize(query)
+        if q is None or k <= 0:
+            return []
+
+        with self._lock:
+            if self._size == 0 or q.shape[0] != self.dim:
+                return []
+            scores = self._matrix[: self._size] @ q
+            ids = self._ids[: self._size].copy()
+
+        return top_k(ids, scores, k, threshold)
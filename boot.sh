@@ -1,3 +1,22 @@
 #!/bin/sh
+# Usage: boot.sh [web|worker]
+# The job worker (e.g. item embeddings) runs as its own container, started
+# with `boot.sh worker`, like the Procfile `worker:` process, so it is
+# supervised and scaled separately from the web process.
+if [ "$1" = "worker" ]; then
+    # The embedding service socket lives in the web container; the worker
+    # loads the model itself
+    unset EMBEDDING_SERVICE_SOCKET
+    exec flask jobs work
+fi
 flask db upgrade
-exec gunicorn --bind "0.0.0.0:8000" run:app
\ No newline at end of file
+# Optional shared embedding service, so gunicorn workers don't each load the model
+if [ -n "$EMBEDDING_SERVICE_SOCKET" ]; then
+    flask embeddings serve &
+fi
+# Optional memory-mapped vector index shared by the workers. Rebuilt well within
+# SEARCH_INDEX_MAX_AGE; if the builder dies, workers fall back to the database
+if [ -n "$SEARCH_INDEX_FILE" ]; then
+    flask search build-index --watch "${SEARCH_INDEX_BUILD_INTERVAL:-60}" &
+fi
+exec gunicorn --bind "0.0.0.0:8000" run:app
@@ -0,0 +1,64 @@
+"""
+Gunicorn settings, loaded automatically when gunicorn starts from the project root.
+
+With PRELOAD_EMBEDDING_MODEL=1 the app is imported in the master process before
+workers are forked, so create_app() loads and warms the SentenceTransformer once
+and every worker shares the weights copy-on-write. Each worker then gets an equal
+share of the CPU cores for torch's encode threads (TORCH_NUM_THREADS overrides).
+
+Each worker builds its in-memory search indexes once it has loaded the app.
+
+An open chat stream (/chat/<id>/stream) occupies a worker thread for up to
+CHAT_STREAM_MAX_SECONDS, so workers run GUNICORN_THREADS threads each. A worker
+accepts at most CHAT_STREAM_MAX_PER_WORKER (default 8) streams and chat pages
+beyond that poll, so the remaining threads always serve page requests. Raise
+GUNICORN_WORKERS for more streams and page throughput together.
+"""
+
+import os
+
+preload_app = os.getenv("PRELOAD_EMBEDDING_MODEL", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+workers = int(os.getenv("GUNICORN_WORKERS", 1))
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from app.utils.search_utils import model_metrics
+
+    # create_app() loaded and warmed the model while the master imported the app
+    if model_metrics["load_seconds"] is not None:
+        server.log.info(
+            f"Embedding model ready (load {model_metrics['load_seconds']:.2f}s)"
+        )
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    # Each forked worker would otherwise start an intra-op pool of one thread
+    # per core, so GUNICORN_WORKERS workers encoding at once oversubscribe the
+    # CPU; split the cores between them instead (TORCH_NUM_THREADS overrides)
+    try:
+        import torch
+    except ImportError:
+        return
+    per_worker = max(1, (os.cpu_count() or 1) // workers)
+    torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS", per_worker)))
+
+
+def post_worker_init(worker):
+    # Build the in-memory search and autocomplete indexes before serving traffic
+    from app.models import Item
+
+    try:
+        with worker.wsgi.app_context():
+            Item.warm_search_indexes()
+    except Exception:
+        worker.log.exception("Could not build search indexes at boot")
@@ -0,0 +1,87 @@
+"""add conversations table summarizing chat per user pair
+
+Revision ID: 0a7d3e5f91c2
+Revises: f4b2c8d95e17
+Create Date: 2026-10-18 16:31:05.604217
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0a7d3e5f91c2"
+down_revision = "f4b2c8d95e17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "conversations",
+        sa.Column("user_low_id", sa.Integer(), nullable=False),
+        sa.Column("user_high_id", sa.Integer(), nullable=False),
+        sa.Column("last_message_id", sa.Integer(), nullable=True),
+        sa.Column("last_activity_at", sa.DateTime(), nullable=True),
+        sa.Column("low_unread_count", sa.Integer(), nullable=False),
+        sa.Column("high_unread_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["last_message_id"],
+            ["chat.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_high_id"],
+            ["users.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_low_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("user_low_id", "user_high_id"),
+    )
+    with op.batch_alter_table("conversations", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_conversations_high_activity",
+            ["user_high_id", "last_activity_at"],
+            unique=False,
+        )
+        batch_op.create_index(
+            "ix_conversations_low_activity",
+            ["user_low_id", "last_activity_at"],
+            unique=False,
+        )
+
+    # Backfill from the existing history; `flask chat rebuild-conversations`
+    # runs the same computation
+    op.execute(
+        """
+        INSERT INTO conversations (user_low_id, user_high_id, last_message_id,
+            last_activity_at, low_unread_count, high_unread_count)
+        SELECT pairs.user_low_id, pairs.user_high_id, pairs.last_message_id,
+            chat.timestamp, pairs.low_unread_count, pairs.high_unread_count
+        FROM (
+            SELECT
+                CASE WHEN sender_id < receiver_id THEN sender_id ELSE receiver_id END
+                    AS user_low_id,
+                CASE WHEN sender_id < receiver_id THEN receiver_id ELSE sender_id END
+                    AS user_high_id,
+                MAX(id) AS last_message_id,
+                SUM(CASE WHEN receiver_id < sender_id AND NOT is_read
+                    THEN 1 ELSE 0 END) AS low_unread_count,
+                SUM(CASE WHEN receiver_id > sender_id AND NOT is_read
+                    THEN 1 ELSE 0 END) AS high_unread_count
+            FROM chat
+            GROUP BY 1, 2
+        ) AS pairs
+        JOIN chat ON chat.id = pairs.last_message_id
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("conversations", schema=None) as batch_op:
+        batch_op.drop_index("ix_conversations_low_activity")
+        batch_op.drop_index("ix_conversations_high_activity")
+
+    op.drop_table("conversations")
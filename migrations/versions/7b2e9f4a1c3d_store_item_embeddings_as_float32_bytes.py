@@ -0,0 +1,102 @@
+"""store item embeddings as raw float32 bytes instead of pickles
+
+Revision ID: 7b2e9f4a1c3d
+Revises: 3248b12265fe
+Create Date: 2026-10-18 10:12:41.203517
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+import numpy as np
+import pickle
+
+
+# revision identifiers, used by Alembic.
+revision = "7b2e9f4a1c3d"
+down_revision = "3248b12265fe"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+items = sa.table(
+    "items",
+    sa.column("id", sa.Integer),
+    sa.column("embedding", sa.LargeBinary),
+    sa.column("embedding_vec", sa.LargeBinary),
+    sa.column("embedding_dim", sa.SmallInteger),
+)
+
+
+def _convert(source, target, transform):
+    """
+    Copies `source` into `target` for every item, `BATCH_SIZE` rows at a time,
+    walking the primary key so each batch is a cheap index range scan.
+    """
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(items.c.id, items.c[source])
+            .where(items.c.id > last_id, items.c[source].isnot(None))
+            .order_by(items.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for item_id, value in rows:
+            conn.execute(
+                items.update()
+                .where(items.c.id == item_id)
+                .values(**transform(bytes(value), target))
+            )
+        last_id = rows[-1][0]
+
+
+def _pickle_to_float32(value, target):
+    vec = np.asarray(pickle.loads(value), dtype=EMBEDDING_DTYPE).ravel()
+    return {target: vec.tobytes(), "embedding_dim": vec.shape[0]}
+
+
+def _float32_to_pickle(value, target):
+    return {target: pickle.dumps(np.frombuffer(value, dtype=EMBEDDING_DTYPE).copy())}
+
+
+def upgrade():
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("embedding_vec", sa.LargeBinary(), nullable=True))
+        batch_op.add_column(
+            sa.Column("embedding_dim", sa.SmallInteger(), nullable=True)
+        )
+
+    _convert("embedding", "embedding_vec", _pickle_to_float32)
+
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.drop_column("embedding")
+        batch_op.alter_column(
+            "embedding_vec",
+            new_column_name="embedding",
+            existing_type=sa.LargeBinary(),
+            existing_nullable=True,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.alter_column(
+            "embedding",
+            new_column_name="embedding_vec",
+            existing_type=sa.LargeBinary(),
+            existing_nullable=True,
+        )
+
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("embedding", sa.PickleType(), nullable=True))
+
+    _convert("embedding_vec", "embedding", _float32_to_pickle)
+
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.drop_column("embedding_vec")
+        batch_op.drop_column("embedding_dim")
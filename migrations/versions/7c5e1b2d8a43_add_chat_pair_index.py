@@ -0,0 +1,31 @@
+"""add composite index for keyset reads of chat messages
+
+Revision ID: 7c5e1b2d8a43
+Revises: 0a7d3e5f91c2
+Create Date: 2026-10-18 18:04:27.318540
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7c5e1b2d8a43"
+down_revision = "0a7d3e5f91c2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("chat", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_chat_sender_receiver_id",
+            ["sender_id", "receiver_id", "id"],
+            unique=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("chat", schema=None) as batch_op:
+        batch_op.drop_index("ix_chat_sender_receiver_id")
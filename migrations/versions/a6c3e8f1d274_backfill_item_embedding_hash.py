@@ -0,0 +1,69 @@
+"""backfill embedding_hash of items embedded before it existed
+
+Revision ID: a6c3e8f1d274
+Revises: d7e4a1c9b352
+Create Date: 2026-10-18 21:31:48.602517
+
+"""
+
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a6c3e8f1d274"
+down_revision = "d7e4a1c9b352"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+items = sa.table(
+    "items",
+    sa.column("id", sa.Integer),
+    sa.column("title", sa.String),
+    sa.column("description", sa.Text),
+    sa.column("embedding", sa.LargeBinary),
+    sa.column("embedding_hash", sa.String),
+)
+
+
+def upgrade():
+    # Without a hash every embedded item counts as stale, so the first edit or
+    # `flask embeddings embed-stale` would re-encode the whole catalog. The
+    # hash is of Item.embedding_text: title, a space, then the description.
+    bind = op.get_bind()
+    missing = sa.and_(items.c.embedding.isnot(None), items.c.embedding_hash.is_(None))
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            "UPDATE items SET embedding_hash = encode(sha256(convert_to("
+            "title || ' ' || coalesce(description, ''), 'UTF8')), 'hex') "
+            "WHERE embedding IS NOT NULL AND embedding_hash IS NULL"
+        )
+        return
+
+    after_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(items.c.id, items.c.title, items.c.description)
+            .where(missing, items.c.id > after_id)
+            .order_by(items.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            text = f"{row.title} {row.description or ''}"
+            bind.execute(
+                items.update()
+                .where(items.c.id == row.id)
+                .values(embedding_hash=hashlib.sha256(text.encode()).hexdigest())
+            )
+        after_id = rows[-1].id
+
+
+def downgrade():
+    # The hashes are valid either way
+    pass
@@ -0,0 +1,45 @@
+"""null conversations.last_message_id when that message is deleted
+
+Revision ID: b9d2f6a4c318
+Revises: 7c5e1b2d8a43
+Create Date: 2026-10-18 20:12:44.905173
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b9d2f6a4c318"
+down_revision = "7c5e1b2d8a43"
+branch_labels = None
+depends_on = None
+
+# The constraint was created unnamed; SQLite batch mode finds it through this
+# convention, Postgres under its default name
+NAMING_CONVENTION = {
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+}
+POSTGRES_NAME = "conversations_last_message_id_fkey"
+SQLITE_NAME = "fk_conversations_last_message_id_chat"
+
+
+def _replace_constraint(ondelete):
+    is_postgres = op.get_bind().dialect.name == "postgresql"
+    name = POSTGRES_NAME if is_postgres else SQLITE_NAME
+    with op.batch_alter_table(
+        "conversations", schema=None, naming_convention=NAMING_CONVENTION
+    ) as batch_op:
+        batch_op.drop_constraint(name, type_="foreignkey")
+        batch_op.create_foreign_key(
+            name, "chat", ["last_message_id"], ["id"], ondelete=ondelete
+        )
+
+
+def upgrade():
+    _replace_constraint("SET NULL")
+
+
+def downgrade():
+    _replace_constraint(None)
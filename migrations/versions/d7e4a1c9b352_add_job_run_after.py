@@ -0,0 +1,27 @@
+"""add run_after to jobs for retry backoff
+
+Revision ID: d7e4a1c9b352
+Revises: b9d2f6a4c318
+Create Date: 2026-10-18 21:05:12.417830
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d7e4a1c9b352"
+down_revision = "b9d2f6a4c318"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("jobs", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("run_after", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("jobs", schema=None) as batch_op:
+        batch_op.drop_column("run_after")
@@ -0,0 +1,65 @@
+"""add embedding model registry and staged item embeddings
+
+Revision ID: e3a9b7c41d26
+Revises: c5d1f27b8a9e
+Create Date: 2026-10-18 15:02:11.473905
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e3a9b7c41d26"
+down_revision = "c5d1f27b8a9e"
+branch_labels = None
+depends_on = None
+
+# The model every embedding stored so far was generated with
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+
+def upgrade():
+    op.create_table(
+        "embedding_models",
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("dim", sa.SmallInteger(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("activated_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.create_table(
+        "item_embeddings",
+        sa.Column("item_id", sa.Integer(), nullable=False),
+        sa.Column("model", sa.String(length=100), nullable=False),
+        sa.Column("embedding", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["item_id"],
+            ["items.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["model"],
+            ["embedding_models.name"],
+        ),
+        sa.PrimaryKeyConstraint("item_id", "model"),
+    )
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("embedding_model", sa.String(length=100), nullable=True)
+        )
+
+    op.execute(
+        sa.text(
+            "UPDATE items SET embedding_model = :model WHERE embedding IS NOT NULL"
+        ).bindparams(model=DEFAULT_MODEL)
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.drop_column("embedding_model")
+
+    op.drop_table("item_embeddings")
+    op.drop_table("embedding_models")
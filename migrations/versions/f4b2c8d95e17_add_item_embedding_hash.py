@@ -0,0 +1,30 @@
+"""add embedding_hash to items
+
+Revision ID: f4b2c8d95e17
+Revises: e3a9b7c41d26
+Create Date: 2026-10-18 15:47:30.218664
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f4b2c8d95e17"
+down_revision = "e3a9b7c41d26"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing embedded rows are hashed by the a6c3e8f1d274 backfill
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("embedding_hash", sa.String(length=64), nullable=True)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.drop_column("embedding_hash")
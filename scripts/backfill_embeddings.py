@@ -1,37 +1,242 @@
 import sys
 import os
+import argparse
+import json
+import multiprocessing
 
 # Add the project root to the python path so we can import app
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import numpy as np
+from sqlalchemy import update
+
 from app import create_app, db
-from app.models import Item
-from app.utils.search_utils import generate_embedding
+from app.models import EmbeddingModel, Item
+from app.services.job_service import REFRESH_NEIGHBORS, enqueue_job
+from app.utils.search_utils import (
+    configure_embedding_model,
+    configure_embedding_service,
+    default_model_name,
+    embedding_text,
+    embedding_text_hash,
+    generate_embeddings,
+    get_model,
+)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate embeddings for items in id-ordered, resumable chunks."
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--only-missing",
+        dest="force",
+        action="store_false",
+        help="Only embed items without an embedding (default).",
+    )
+    mode.add_argument(
+        "--force",
+        dest="force",
+        action="store_true",
+        help="Re-embed every item with the default model. "
+        "To change models without downtime use `flask embeddings reembed`.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=512,
+        help="Items loaded, encoded and committed per chunk (default: 512).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=64,
+        help="Batch size passed to model.encode (default: 64).",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of CPU processes used for encoding (default: 1).",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="File recording the last committed item id "
+        "(default: instance/backfill_embeddings.checkpoint).",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore any existing checkpoint and start from the first item.",
+    )
+    parser.set_defaults(force=False)
+    return parser.parse_args(argv)
+
+
+def load_checkpoint(path, force):
+    """
+    Returns the last committed item id recorded for this mode, or 0.
+    """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if state.get("force") != force:
+        return 0
+    return int(state.get("last_id", 0))
+
+
+def save_checkpoint(path, force, last_id):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"force": force, "last_id": last_id}, f)
+    os.replace(tmp_path, path)
+
+
+def iter_chunks(chunk_size, start_after, force):
+    """
+    Yields lists of `(id, title, description)` rows in id order.
+    Uses keyset pagination (`id > last_id`) so each chunk is an index range scan.
+    """
+    last_id = start_after
+    while True:
+        query = db.session.query(Item.id, Item.title, Item.description).filter(
+            Item.id > last_id
+        )
+        if not force:
+            query = query.filter(Item.embedding.is_(None))
+        rows = query.order_by(Item.id).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _init_worker(model, service_socket):
+    # Spawned processes do not run create_app(), so they are pointed at the
+    # parent's model (or embedding service) here, then load the model once
+    configure_embedding_model(model)
+    configure_embedding_service(service_socket)
+    if not service_socket:
+        get_model()
 
 
-def backfill_embeddings():
-    app = create_app()
+def _encode_slice(args):
+    texts, batch_size, model = args
+    return generate_embeddings(texts, batch_size=batch_size, model=model)
+
+
+def encode_texts(texts, batch_size, pool=None, workers=1, model=None):
+    """
+    Encodes `texts` with `model` (default: the configured model), splitting
+    them across `pool` processes when given.
+    """
+    if pool is None or workers < 2 or len(texts) < 2:
+        return generate_embeddings(texts, batch_size=batch_size, model=model)
+
+    slices = [
+        s.tolist() for s in np.array_split(np.array(texts, dtype=object), workers)
+    ]
+    results = pool.map(_encode_slice, [(s, batch_size, model) for s in slices if s])
+    if any(r is None for r in results):
+        return None
+    return np.concatenate(results)
+
+
+def backfill_embeddings(
+    chunk_size=512,
+    batch_size=64,
+    workers=1,
+    force=False,
+    checkpoint=None,
+    restart=False,
+    app=None,
+):
+    app = app or create_app()
+    checkpoint = checkpoint or os.path.join(
+        app.instance_path, "backfill_embeddings.checkpoint"
+    )
     with app.app_context():
-        items = Item.query.all()
-        print(f"Found {len(items)} items to process.")
+        start_after = 0 if restart else load_checkpoint(checkpoint, force)
+        if start_after:
+            print(f"Resuming after item {start_after}.")
+
+        model = default_model_name()
+        if EmbeddingModel.active_name() != model:
+            print(f"The catalog uses {EmbeddingModel.active_name()}, not {model}.")
+            return
+
+        mode = "all items" if force else "items without an embedding"
+        print(f"Embedding {mode} in chunks of {chunk_size} using {workers} worker(s).")
+
+        pool = None
+        if workers > 1:
+            # Spawn rather than fork so each worker gets a clean torch runtime
+            ctx = multiprocessing.get_context("spawn")
+            pool = ctx.Pool(
+                workers,
+                initializer=_init_worker,
+                initargs=(model, app.config.get("EMBEDDING_SERVICE_SOCKET")),
+            )
 
         count = 0
-        for item in items:
-            if item.embedding is None:
-                print(f"Generating embedding for item {item.id}: {item.title}")
-                # Combine title and description for embedding
-                text = f"{item.title} {item.description or ''}"
-                item.embedding = generate_embedding(text)
-                count += 1
-            else:
-                print(f"Item {item.id} already has embedding. Skipping.")
+        try:
+            for rows in iter_chunks(chunk_size, start_after, force):
+                texts = [embedding_text(row.title, row.description) for row in rows]
+                vectors = encode_texts(
+                    texts, batch_size, pool=pool, workers=workers, model=model
+                )
+                if vectors is None:
+                    print("Embedding model unavailable. Stopping.")
+                    return
+
+                db.session.execute(
+                    update(Item),
+                    [
+                        {
+                            "id": row.id,
+                            "embedding": vector,
+                            "embedding_dim": vector.shape[0],
+                            "embedding_model": model,
+                            "embedding_hash": embedding_text_hash(text),
+                        }
+                        for row, text, vector in zip(rows, texts, vectors)
+                    ],
+                )
+                # Stored neighbours are recomputed by the job worker, as after
+                # any other embedding write
+                for row in rows:
+                    enqueue_job(REFRESH_NEIGHBORS, item_id=row.id)
+                db.session.commit()
+
+                last_id = rows[-1].id
+                save_checkpoint(checkpoint, force, last_id)
+                count += len(rows)
+                print(f"Committed {count} items (through item {last_id}).")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
 
         if count > 0:
-            db.session.commit()
             print(f"Successfully generated embeddings for {count} items.")
         else:
             print("No items needed updates.")
 
 
 if __name__ == "__main__":
-    backfill_embeddings()
+    args = parse_args()
+    backfill_embeddings(
+        chunk_size=args.chunk_size,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        force=args.force,
+        checkpoint=args.checkpoint,
+        restart=args.restart,
+    )
@@ -0,0 +1,388 @@
+import sys
+import os
+import argparse
+import gc
+import json
+import platform
+import resource
+import time
+import tracemalloc
+
+# Add the project root to the python path so we can import app
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from app.utils.ann_index import IVFIndex
+from app.utils.search_utils import cosine_similarity
+from app.utils.text_index import BM25Index, reciprocal_rank_fusion
+from app.utils.vector_index import VectorIndex, top_k
+
+PATHS = ("loop", "vectorized", "ann", "hybrid")
+CATEGORIES = ("electronics", "clothing", "furniture", "books", "miscellaneous")
+
+# Rows generated per chunk, so 1M x 384 catalogs do not need temporary copies
+GENERATE_CHUNK_SIZE = 65536
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark search latency, memory, build time and recall@k "
+        "on a synthetic catalog. Prints a JSON report."
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=10000,
+        help="Number of catalog items (default: 10000).",
+    )
+    parser.add_argument(
+        "--dim", type=int, default=384, help="Embedding dimension (default: 384)."
+    )
+    parser.add_argument(
+        "--clusters",
+        type=int,
+        default=None,
+        help="Topic clusters in the synthetic catalog (default: sqrt(size)).",
+    )
+    parser.add_argument(
+        "--embeddings",
+        default=None,
+        help=".npy file of fixture embeddings, sampled with replacement up to "
+        "--size rows instead of generating random ones.",
+    )
+    parser.add_argument(
+        "--queries", type=int, default=200, help="Queries per path (default: 200)."
+    )
+    parser.add_argument(
+        "-k", type=int, default=20, help="Results per query (default: 20)."
+    )
+    parser.add_argument(
+        "--paths",
+        default=",".join(PATHS),
+        help=f"Comma-separated search paths to run (default: {','.join(PATHS)}).",
+    )
+    parser.add_argument(
+        "--nlist",
+        type=int,
+        default=0,
+        help="IVF lists for the ann and hybrid paths (default: sqrt(size)).",
+    )
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        default=8,
+        help="IVF lists probed per query (default: 8).",
+    )
+    parser.add_argument(
+        "--quantization",
+        choices=("float16", "int8"),
+        default=None,
+        help="Store ann and hybrid index vectors quantized (default: float32).",
+    )
+    parser.add_argument(
+        "--rerank-factor",
+        type=int,
+        default=4,
+        help="Candidates per result re-scored at full precision when quantized "
+        "(default: 4).",
+    )
+    parser.add_argument(
+        "--loop-queries",
+        type=int,
+        default=5,
+        help="Queries run on the per-row loop path, which is slow (default: 5).",
+    )
+    parser.add_argument(
+        "--loop-max-size",
+        type=int,
+        default=100000,
+        help="Skip the loop path for larger catalogs (default: 100000).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    parser.add_argument(
+        "--output", default=None, help="Write the JSON report here instead of stdout."
+    )
+    return parser.parse_args(argv)
+
+
+def unit_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def synthetic_catalog(size, dim, clusters, rng, embeddings=None):
+    """
+    Returns `(matrix, labels, titles, categories)` for a catalog of `size` items.
+
+    Items are noisy copies of `clusters` random topic centres, so neighbourhoods
+    look like those of real embeddings. Titles draw words from a per-topic
+    vocabulary so keyword search has something to match. With `embeddings`,
+    rows are sampled from that matrix and topics are assigned round-robin.
+    """
+    matrix = np.empty((size, dim), dtype=np.float32)
+    if embeddings is not None:
+        rows = rng.integers(embeddings.shape[0], size=size)
+        matrix[:] = unit_rows(embeddings[rows].astype(np.float32))
+        labels = rows % clusters
+    else:
+        centres = unit_rows(rng.standard_normal((clusters, dim), dtype=np.float32))
+        labels = rng.integers(clusters, size=size)
+        for start in range(0, size, GENERATE_CHUNK_SIZE):
+            chunk = labels[start : start + GENERATE_CHUNK_SIZE]
+            noise = rng.standard_normal((len(chunk), dim), dtype=np.float32)
+            matrix[start : start + len(chunk)] = unit_rows(
+                centres[chunk] + 0.6 * noise / np.sqrt(dim)
+            )
+
+    words = rng.integers(8, size=(size, 3))
+    titles = [
+        f"topic{label}w{a} topic{label}w{b} item{i % 97} topic{label}w{c}"
+        for i, (label, (a, b, c)) in enumerate(zip(labels.tolist(), words.tolist()))
+    ]
+    categories = [CATEGORIES[i] for i in rng.integers(len(CATEGORIES), size=size)]
+    return matrix, labels, titles, categories
+
+
+def make_queries(matrix, labels, count, rng):
+    """
+    Returns `(vectors, texts)` for `count` queries near random catalog items.
+    """
+    picks = rng.integers(matrix.shape[0], size=count)
+    noise = rng.standard_normal((count, matrix.shape[1]), dtype=np.float32)
+    vectors = unit_rows(matrix[picks] + 0.3 * noise / np.sqrt(matrix.shape[1]))
+    texts = [
+        f"topic{label}w{a} topic{label}w{b}"
+        for label, (a, b) in zip(
+            labels[picks].tolist(), rng.integers(8, size=(count, 2)).tolist()
+        )
+    ]
+    return vectors, texts
+
+
+def exact_results(matrix, ids, query, k):
+    return top_k(ids, matrix @ query, k)
+
+
+class LoopSearch:
+    """
+    The original search path: one cosine similarity call per stored row.
+    """
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def search(self, query, text, k):
+        scored = [
+            (item_id, cosine_similarity(query, emb)) for item_id, emb in self.rows
+        ]
+        scored.sort(key=lambda pair: pair[1], reverse=True)
+        return scored[:k]
+
+
+class VectorizedSearch:
+    def __init__(self, rows):
+        self.index = VectorIndex.from_rows(rows)
+
+    def search(self, query, text, k):
+        return self.index.search(query, k=k)
+
+
+class AnnSearch:
+    """
+    IVF search. With quantization, `rerank_factor * k` candidates are re-scored
+    against the full-precision catalog matrix, which stands in for the
+    embeddings `Item.rerank` reads from the database.
+    """
+
+    def __init__(
+        self, rows, vectors, nlist=0, nprobe=8, quantization=None, rerank_factor=4
+    ):
+        self.vectors = vectors
+        self.rerank_factor = rerank_factor
+        self.index = IVFIndex.from_rows(
+            ((item_id, emb, category) for item_id, emb, _, category in rows),
+            nlist=nlist or None,
+            nprobe=nprobe,
+            min_train_size=0,
+            attributes=("category",),
+            quantization=quantization,
+        )
+
+    def semantic(self, query, k):
+        if self.index.quantization is None:
+            return self.index.search(query, k=k)
+        candidates = self.index.search(query, k=k * self.rerank_factor)
+        ids = np.array([item_id for item_id, _ in candidates], dtype=np.int64)
+        return top_k(ids, self.vectors[ids] @ query, k)
+
+    def search(self, query, text, k):
+        return self.semantic(query, k)
+
+
+class HybridSearch(AnnSearch):
+    """
+    ANN semantic results fused with BM25 keyword results, as in
+    `Item.hybrid_search_ids`. Its recall@k is the overlap with the exact
+    semantic ranking, so keyword-only hits lower it by design.
+    """
+
+    def __init__(self, rows, vectors, **kwargs):
+        super().__init__(rows, vectors, **kwargs)
+        self.text_index = BM25Index.from_rows(
+            (item_id, title, {"category": category})
+            for item_id, _, title, category in rows
+        )
+
+    def search(self, query, text, k):
+        semantic = [item_id for item_id, _ in self.semantic(query, k)]
+        lexical = [item_id for item_id, _ in self.text_index.search(text, k=k)]
+        return reciprocal_rank_fusion(semantic, lexical)[:k]
+
+
+def build(path, matrix, titles, categories, args):
+    """
+    Builds the searcher for `path`. Returns `(searcher, build_seconds,
+    retained_bytes, peak_bytes)`, measured with tracemalloc.
+    """
+    ids = range(matrix.shape[0])
+    if path == "loop":
+        rows = zip(ids, matrix)
+        factory = lambda: LoopSearch(rows)
+    elif path == "vectorized":
+        rows = zip(ids, matrix)
+        factory = lambda: VectorizedSearch(rows)
+    else:
+        rows = list(zip(ids, matrix, titles, categories))
+        cls = AnnSearch if path == "ann" else HybridSearch
+        factory = lambda: cls(
+            rows,
+            matrix,
+            nlist=args.nlist,
+            nprobe=args.nprobe,
+            quantization=args.quantization,
+            rerank_factor=args.rerank_factor,
+        )
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    searcher = factory()
+    build_seconds = time.perf_counter() - started
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return searcher, build_seconds, after - before, peak - before
+
+
+def percentiles(latencies):
+    ms = np.array(latencies) * 1000
+    return {
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+        "mean": float(ms.mean()),
+    }
+
+
+def run_path(searcher, queries, texts, truths, k):
+    latencies = []
+    recalls = []
+    for query, text, truth in zip(queries, texts, truths):
+        started = time.perf_counter()
+        results = searcher.search(query, text, k)
+        latencies.append(time.perf_counter() - started)
+        expected = {item_id for item_id, _ in truth}
+        found = {item_id for item_id, _ in results}
+        recalls.append(len(expected & found) / max(len(expected), 1))
+    return {
+        "queries": len(latencies),
+        "latency_ms": percentiles(latencies),
+        "recall_at_k": float(np.mean(recalls)),
+    }
+
+
+def benchmark(args):
+    rng = np.random.default_rng(args.seed)
+    clusters = args.clusters or max(1, int(np.sqrt(args.size)))
+    fixture = np.load(args.embeddings) if args.embeddings else None
+    dim = fixture.shape[1] if fixture is not None else args.dim
+
+    started = time.perf_counter()
+    matrix, labels, titles, categories = synthetic_catalog(
+        args.size, dim, clusters, rng, embeddings=fixture
+    )
+    queries, texts = make_queries(matrix, labels, args.queries, rng)
+    ids = np.arange(args.size, dtype=np.int64)
+    truths = [exact_results(matrix, ids, query, args.k) for query in queries]
+    setup_seconds = time.perf_counter() - started
+
+    report = {
+        "config": {
+            "size": args.size,
+            "dim": dim,
+            "clusters": clusters,
+            "embeddings": args.embeddings or "synthetic",
+            "queries": args.queries,
+            "k": args.k,
+            "nlist": args.nlist or None,
+            "nprobe": args.nprobe,
+            "quantization": args.quantization,
+            "rerank_factor": args.rerank_factor if args.quantization else None,
+            "seed": args.seed,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "setup_seconds": setup_seconds,
+        "paths": {},
+    }
+
+    for path in [p.strip() for p in args.paths.split(",") if p.strip()]:
+        if path not in PATHS:
+            raise SystemExit(f"Unknown path {path!r}; choose from {', '.join(PATHS)}.")
+        if path == "loop" and args.size > args.loop_max_size:
+            report["paths"][path] = {
+                "skipped": f"size above --loop-max-size ({args.loop_max_size})"
+            }
+            continue
+
+        print(f"Benchmarking {path}...", file=sys.stderr)
+        searcher, build_seconds, retained, peak = build(
+            path, matrix, titles, categories, args
+        )
+        count = args.loop_queries if path == "loop" else args.queries
+        result = run_path(
+            searcher, queries[:count], texts[:count], truths[:count], args.k
+        )
+        result.update(
+            {
+                "build_seconds": build_seconds,
+                "index_bytes": retained,
+                "build_peak_bytes": peak,
+            }
+        )
+        if isinstance(searcher, AnnSearch):
+            result["nlist"] = searcher.index.nlist
+            result["vector_bytes"] = searcher.index.nbytes
+        report["paths"][path] = result
+        del searcher
+
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    report["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    return report
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = benchmark(args)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -20,17 +20,24 @@ def verify_search():
             "nonsense gibberish 123",  # Should return empty
         ]
 
+        index = Item.vector_index()
+        print(
+            f"\nVector index: {len(index)} active items, dim={index.dim}, "
+            f"lists={index.nlist or 1}, nprobe={index.nprobe}"
+        )
         print("\n--- Semantic Search Verification (Threshold: 0.25) ---\n")
 
         for query in queries:
             print(f"Query: '{query}'")
-            results = Item.semantic_search(query, limit=5)
+            # Same model, re-ranking and threshold as /api/v1/items/search
+            results = Item.semantic_search_scores(query, limit=5, threshold=0.25)
             if not results:
                 print("  No results found (Correct for irrelevant queries).")
-            for i, item in enumerate(results):
-                # We can't easily get the score here without modifying return, but that's fine.
-                # The fact they are returned means score >= 0.25
-                print(f"  {i+1}. {item.title} (${item.price})")
+            items = {item.id: item for item in Item.hydrate([i for i, _ in results])}
+            for i, (item_id, score) in enumerate(results):
+                item = items.get(item_id)
+                if item:
+                    print(f"  {i+1}. {item.title} (${item.price}) score={score:.3f}")
             print("")
 
 
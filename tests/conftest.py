@@ -2,7 +2,7 @@ import os
 import sys
 from unittest.mock import MagicMock
 import pytest
-from flask import current_app
+from flask import current_app, g
 from werkzeug.security import generate_password_hash
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -47,31 +47,48 @@ def client(app):
 @pytest.fixture(autouse=True)
 def mock_embeddings(monkeypatch):
     """
-    Globally mock generate_embedding to avoid loading SentenceTransformer.
-    Returns a simple fixed vector when text is non-empty.
+    Globally mock generate_embedding(s) to avoid loading SentenceTransformer.
+    Returns a simple fixed vector per non-empty text.
     """
     import sys
 
     # Ensure modules are loaded
+    import numpy as np
     import app.utils.search_utils
     import app.models
-    import app.main
+    import app.services.job_service
+    import app.utils.taste_profile
 
-    def fake_generate_embedding(text):
+    def fake_generate_embedding(text, model=None):
         if not text:
             return None
         return [0.1, 0.2, 0.3]
 
+    def fake_generate_embeddings(texts, batch_size=32, model=None):
+        if not texts:
+            return None
+        return np.array([[0.1, 0.2, 0.3]] * len(texts), dtype=np.float32)
+
     monkeypatch.setattr(
         sys.modules["app.utils.search_utils"],
         "generate_embedding",
         fake_generate_embedding,
     )
+    # Query embeddings, search results, taste profiles and unread counts are
+    # cached per process; start every test cold
+    sys.modules["app.utils.search_utils"].query_embedding_cache.clear()
+    sys.modules["app.utils.search_utils"].search_result_cache.clear()
+    sys.modules["app.utils.taste_profile"].taste_profile_cache.clear()
+    sys.modules["app.utils.unread_cache"].unread_count_cache.clear()
     monkeypatch.setattr(
-        sys.modules["app.models"], "generate_embedding", fake_generate_embedding
+        sys.modules["app.utils.search_utils"],
+        "generate_embeddings",
+        fake_generate_embeddings,
     )
     monkeypatch.setattr(
-        sys.modules["app.main"], "generate_embedding", fake_generate_embedding
+        sys.modules["app.services.job_service"],
+        "generate_embeddings",
+        fake_generate_embeddings,
     )
 
     # Also mock cosine_similarity just in case
@@ -83,9 +100,6 @@ def mock_embeddings(monkeypatch):
         "cosine_similarity",
         fake_cosine_similarity,
     )
-    monkeypatch.setattr(
-        sys.modules["app.models"], "cosine_similarity", fake_cosine_similarity
-    )
 
 
 @pytest.fixture(autouse=True)
@@ -169,15 +183,23 @@ def cleanup(app):
     """
     Clean up the database after each test.
     """
+    # Requests reuse the session-wide app context, so reset its scoped session
+    # and Flask-Login's cached user as well, not just those of a fresh context
+    g.pop("_login_user", None)
+    db.session.remove()
     with app.app_context():
         db.session.remove()
         db.drop_all()
         db.create_all()
+        Item.reset_search_indexes()
     yield
+    g.pop("_login_user", None)
+    db.session.remove()
     with app.app_context():
         db.session.remove()
         db.drop_all()
         db.create_all()
+        Item.reset_search_indexes()
 
 
 @pytest.fixture
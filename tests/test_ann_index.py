@@ -0,0 +1,188 @@
+import numpy as np
+import pytest
+
+from app.models import Item, db
+from app.utils.ann_index import IVFIndex, kmeans
+from app.utils.vector_index import VectorIndex, normalize
+
+
+def clustered_rows(count=2000, dim=16, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)]
+    vectors = vectors + 0.3 * rng.standard_normal((count, dim))
+    return list(enumerate(vectors.astype(np.float32), start=1))
+
+
+def test_kmeans_returns_unit_centroids():
+    rows = clustered_rows(count=500)
+    vectors = np.stack([normalize(v) for _, v in rows])
+    centroids = kmeans(vectors, 8, rng=np.random.default_rng(0))
+    assert centroids.shape == (8, 16)
+    assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0, atol=1e-5)
+
+
+def test_untrained_index_is_exact():
+    index = IVFIndex.from_rows([(1, [1, 0, 0]), (2, [0.9, 0.1, 0]), (3, [0, 1, 0])])
+    assert not index.trained
+    results = index.search([1, 0, 0], k=5, threshold=0.5)
+    assert [item_id for item_id, _ in results] == [1, 2]
+
+
+def test_trained_index_recall_matches_exact_search():
+    rows = clustered_rows()
+    index = IVFIndex.from_rows(rows, min_train_size=1000, nprobe=4)
+    exact = VectorIndex.from_rows(rows)
+    assert index.trained
+    assert len(index) == len(rows)
+
+    rng = np.random.default_rng(1)
+    hits = 0
+    for _, vec in rows[:50]:
+        query = vec + 0.1 * rng.standard_normal(vec.shape[0])
+        truth = {item_id for item_id, _ in exact.search(query, k=10)}
+        found = {item_id for item_id, _ in index.search(query, k=10)}
+        hits += len(truth & found)
+    assert hits / 500 >= 0.9
+
+    # Probing every list is an exact search
+    query = rows[0][1]
+    assert index.search(query, k=10, nprobe=index.nlist) == exact.search(query, k=10)
+
+
+def test_incremental_insert_and_lazy_delete():
+    rows = clustered_rows(count=1200)
+    index = IVFIndex.from_rows(rows, min_train_size=1000)
+
+    new_vec = rows[0][1] * 2
+    assert index.add(5000, new_vec)
+    assert index.search(new_vec, k=1, nprobe=index.nlist)[0][0] in {1, 5000}
+
+    for item_id, _ in rows[:600]:
+        assert index.remove(item_id)
+    assert not index.remove(1)
+    assert len(index) == 601
+    assert 1 not in index
+
+    results = index.search(rows[0][1], k=1000, nprobe=index.nlist)
+    returned = {item_id for item_id, _ in results}
+    assert returned == {item_id for item_id, _ in rows[600:]} | {5000}
+
+    # Updating a vector moves it rather than duplicating it
+    index.add(5000, rows[-1][1])
+    results = index.search(rows[-1][1], k=1000, nprobe=index.nlist)
+    assert [item_id for item_id, _ in results].count(5000) == 1
+
+
+def test_item_vector_index_uses_ann_config(app, sample_item):
+    app.config["SEARCH_ANN_NPROBE"] = 3
+    Item.reset_search_indexes()
+    index = Item.vector_index()
+    assert isinstance(index, IVFIndex)
+    assert index.nprobe == 3
+    assert sample_item.id in index
+
+
+def test_filters_apply_before_top_k():
+    rows = [
+        (item_id, vec, "books" if item_id % 50 == 0 else "electronics", "new")
+        for item_id, vec in clustered_rows(count=1500)
+    ]
+    index = IVFIndex.from_rows(
+        rows, min_train_size=1000, nprobe=1, attributes=("category", "condition")
+    )
+
+    results = index.search(rows[1][1], k=10, filters={"category": ["books"]})
+    assert len(results) == 10
+    assert all(item_id % 50 == 0 for item_id, _ in results)
+
+    # A single value, unknown values and cleared filters
+    assert len(index.search(rows[1][1], k=5, filters={"condition": "new"})) == 5
+    assert index.search(rows[1][1], k=5, filters={"category": ["toys"]}) == []
+    assert len(index.search(rows[1][1], k=5, filters={"category": None})) == 5
+
+    # Attribute changes are picked up on re-add
+    index.add(1, rows[0][1], {"category": "toys", "condition": "used"})
+    assert [i for i, _ in index.search(rows[0][1], filters={"category": "toys"})] == [1]
+
+
+def test_semantic_search_filters_by_item_attributes(app, sample_item):
+    other = Item(
+        title="Lamp",
+        price=5.0,
+        category="furniture",
+        condition="used",
+        seller_id=sample_item.seller_id,
+        embedding=[0.1, 0.2, 0.3],
+    )
+    db.session.add(other)
+    db.session.commit()
+    Item.reset_search_indexes()
+
+    assert Item.semantic_search_ids(
+        "lamp", limit=1, filters={"category": ["furniture"]}
+    ) == [other.id]
+    assert Item.semantic_search_ids(
+        "lamp", filters={"category": ["electronics"], "condition": ["new"]}
+    ) == [sample_item.id]
+
+    # Edits made in this process update the stored attributes
+    other.category = "electronics"
+    db.session.commit()
+    assert Item.semantic_search_ids("lamp", filters={"category": ["furniture"]}) == []
+
+
+def test_quantized_index_saves_memory_and_keeps_recall():
+    rows = clustered_rows(count=1500, dim=64)
+    exact = VectorIndex.from_rows(rows)
+    full = IVFIndex.from_rows(rows, min_train_size=1000)
+
+    for quantization, ratio in [("float16", 1.7), ("int8", 3)]:
+        index = IVFIndex.from_rows(rows, min_train_size=1000, quantization=quantization)
+        assert full.nbytes / index.nbytes > ratio
+
+        hits = 0
+        for _, vec in rows[:20]:
+            truth = {item_id for item_id, _ in exact.search(vec, k=10)}
+            found = {i for i, _ in index.search(vec, k=10, nprobe=index.nlist)}
+            hits += len(truth & found)
+        assert hits / 200 >= 0.95
+
+        # Overwrites and compaction keep the per-row scales aligned
+        index.add(1, rows[1][1])
+        for item_id, _ in rows[100:600]:
+            index.remove(item_id)
+        top_id, score = index.search(rows[1][1], k=1, nprobe=index.nlist)[0]
+        assert top_id in {1, 2} and abs(score - 1) < 0.01
+
+    with pytest.raises(ValueError):
+        IVFIndex(quantization="int4")
+
+
+def test_quantized_item_search_reranks_with_stored_embeddings(app, sample_item):
+    close = Item(
+        title="Close",
+        price=5.0,
+        seller_id=sample_item.seller_id,
+        embedding=[0.3, 0.2, 0.1],
+    )
+    db.session.add(close)
+    db.session.commit()
+
+    app.config["SEARCH_INDEX_QUANTIZATION"] = "int8"
+    try:
+        Item.reset_search_indexes()
+        assert Item.vector_index().quantization == "int8"
+
+        timings = {}
+        results = Item.semantic_search_scores("lamp", limit=1, timings=timings)
+        # Scores come from the full-precision embeddings, not the int8 copy
+        assert results[0][0] == sample_item.id
+        assert abs(results[0][1] - 1.0) < 1e-6
+        assert "rerank" in timings
+
+        results = Item.semantic_search_scores("lamp", limit=5, threshold=0.8)
+        assert [item_id for item_id, _ in results] == [sample_item.id]
+    finally:
+        app.config["SEARCH_INDEX_QUANTIZATION"] = None
+        Item.reset_search_indexes()
@@ -51,3 +51,90 @@ def test_profile_image_put_url(client, logged_in_user):
     assert "mypic.png" in data["newFilename"]
 
     app.s3_client.generate_presigned_url.assert_called()
+
+
+def test_search_metrics(app, client, monkeypatch):
+    """
+    Test GET /api/v1/metrics/search
+    """
+    client.get("/api/v1/items?search=lamp")
+
+    # Disabled without a token, and closed to requests without it
+    assert client.get("/api/v1/metrics/search").status_code == 404
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3cret")
+    assert client.get("/api/v1/metrics/search").status_code == 401
+    wrong = {"Authorization": "Bearer guess"}
+    assert client.get("/api/v1/metrics/search", headers=wrong).status_code == 401
+
+    response = client.get(
+        "/api/v1/metrics/search", headers={"Authorization": "Bearer s3cret"}
+    )
+    assert response.status_code == 200
+    data = response.json["data"]
+    assert "load_seconds" in data["embedding_model"]
+    assert data["query_embedding_cache"]["misses"] >= 1
+    assert data["search_result_cache"]["misses"] >= 1
+
+
+def _scored_items(seller):
+    from datetime import datetime, timedelta
+
+    from app.models import Item, db
+
+    now = datetime.utcnow()
+    items = [
+        Item(
+            title=title,
+            price=1.0,
+            seller_id=seller.id,
+            embedding=embedding,
+            created_at=now - timedelta(days=age),
+        )
+        for title, embedding, age in [
+            ("Best", [0.1, 0.2, 0.3], 3),
+            ("Close", [0.3, 0.2, 0.1], 1),
+            ("Opposite", [-0.1, -0.2, -0.3], 2),
+        ]
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def test_search_items_returns_scores_and_timings(client, seller_user):
+    """
+    Test GET /api/v1/items/search
+    """
+    best, close, _ = _scored_items(seller_user)
+
+    response = client.get("/api/v1/items/search?q=lamp&explain=true")
+    assert response.status_code == 200
+    data = response.json["data"]
+    assert [r["item"]["id"] for r in data["results"]] == [best.id, close.id]
+    assert data["results"][0]["score"] > 0.99
+    assert 0.25 < data["results"][1]["score"] < 0.8
+    assert set(data["timings_ms"]) >= {"embed", "score", "select", "hydrate"}
+
+    # Lowering the threshold admits weaker matches; explain is opt-in
+    response = client.get("/api/v1/items/search?q=lamp&threshold=-1")
+    data = response.json["data"]
+    assert len(data["results"]) == 3
+    assert "timings_ms" not in data
+
+    assert client.get("/api/v1/items/search").status_code == 400
+    assert client.get("/api/v1/items/search?q=lamp&threshold=2").status_code == 400
+
+
+def test_list_items_sort_by_relevance(client, seller_user):
+    """
+    Test GET /api/v1/items?sort_by=relevance keeps the search ranking
+    """
+    best, close, _ = _scored_items(seller_user)
+
+    response = client.get("/api/v1/items?search=lamp&sort_by=relevance")
+    ids = [item["id"] for item in response.json["data"]["items"]]
+    assert ids == [best.id, close.id]
+
+    response = client.get("/api/v1/items?search=lamp&sort_by=newest")
+    ids = [item["id"] for item in response.json["data"]["items"]]
+    assert ids == [close.id, best.id]
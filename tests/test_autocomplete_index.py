@@ -0,0 +1,115 @@
+import random
+from datetime import datetime, timedelta
+
+from app.models import Item, User, db
+from app.utils.autocomplete_index import AutocompleteIndex, rank_score
+
+NOW = datetime(2026, 1, 1)
+
+
+def test_prefix_matches_ranked_by_recency_and_popularity():
+    index = AutocompleteIndex.from_rows(
+        [
+            (1, "Blue Jacket", NOW - timedelta(days=30), 0),
+            (2, "Jacket, leather", NOW, 0),
+            (3, "Jack Russell plush", NOW - timedelta(days=1), 0),
+            (4, "Ski jacket", NOW - timedelta(days=30), 100),
+            (5, "Desk", NOW, 0),
+        ]
+    )
+    assert [i for i, _ in index.suggest("jack")] == [4, 2, 3, 1]
+    assert [i for i, _ in index.suggest("jacket le")] == [2]
+    assert index.suggest("jack", limit=1) == [(4, "Ski jacket")]
+    assert index.suggest("") == []
+    assert index.suggest("zzz") == []
+    assert rank_score(NOW, 100) > rank_score(NOW, 0)
+
+
+def test_infix_matches_follow_prefix_matches():
+    index = AutocompleteIndex.from_rows(
+        [(1, "Snowboard", NOW, 0), (2, "Board game", NOW - timedelta(days=1), 0)]
+    )
+    assert [i for i, _ in index.suggest("board")] == [2, 1]
+    assert [i for i, _ in index.suggest("owbo")] == [1]
+
+
+def test_updates_and_removals_refill_cached_top_lists():
+    index = AutocompleteIndex(top_size=2)
+    for i in range(5):
+        index.add(i, f"lamp {i}", NOW + timedelta(days=i))
+    assert [i for i, _ in index.suggest("la")] == [4, 3]
+
+    index.remove(4)
+    index.remove(3)
+    assert [i for i, _ in index.suggest("la")] == [2, 1]
+
+    # Retitling moves an item to new prefixes and keeps its popularity
+    index.add(9, "Chair", NOW, popularity=50)
+    index.add(9, "Armchair", NOW)
+    assert index.suggest("chair") == [(9, "Armchair")]
+    assert [i for i, _ in index.suggest("arm")] == [9]
+    assert len(index) == 4
+
+
+def test_unchanged_reindex_keeps_top_lists_and_refills_stay_exact():
+    rng = random.Random(0)
+    words = ["lamp", "lantern", "laptop", "ladder", "lace", "label", "lab"]
+    index = AutocompleteIndex(top_size=4, slack=2)
+    titles = {}
+    for i in range(300):
+        titles[i] = f"{rng.choice(words)} {rng.choice(words)}"
+        index.add(i, titles[i], NOW + timedelta(minutes=i))
+
+    # Re-adding an item with the same title and score (a price edit) is a no-op
+    node = index._root.children["l"]
+    before = list(node.top)
+    index.add(299, titles[299], NOW + timedelta(minutes=299))
+    assert node.top == before and not node.stale
+
+    # After removals and retitles, lookups match a brute-force ranking
+    for i in rng.sample(range(300), 150):
+        if rng.random() < 0.5:
+            index.remove(i)
+            del titles[i]
+        else:
+            titles[i] = f"{rng.choice(words)} {rng.choice(words)}"
+            index.add(i, titles[i], NOW + timedelta(minutes=i))
+    for prefix in ("l", "la", "lam", "lab", "lan"):
+        expected = sorted(
+            (
+                i
+                for i, title in titles.items()
+                if any(w.startswith(prefix) for w in title.split())
+            ),
+            key=lambda i: -i,
+        )[:4]
+        assert [i for i, _ in index.suggest(prefix, limit=4)] == expected
+
+
+def _make_item(seller, title, **kwargs):
+    item = Item(title=title, price=1.0, seller_id=seller.id, **kwargs)
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def test_autocomplete_index_follows_commits(app, sample_item):
+    Item.reset_search_indexes()
+    assert [i.id for i in Item.suggest("test")] == [sample_item.id]
+
+    seller = db.session.get(User, sample_item.seller_id)
+    other = _make_item(seller, "Testing kit")
+    assert [i.id for i in Item.suggest("test")] == [other.id, sample_item.id]
+
+    other.is_active = False
+    db.session.commit()
+    assert [i.id for i in Item.suggest("test")] == [sample_item.id]
+
+
+def test_autocomplete_api(client, sample_item):
+    Item.reset_search_indexes()
+    resp = client.get("/api/v1/items/autocomplete?q=tes")
+    assert resp.status_code == 200
+    data = resp.get_json()["data"]
+    assert [entry["id"] for entry in data] == [sample_item.id]
+    assert data[0]["title"] == "Test Item"
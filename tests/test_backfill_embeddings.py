@@ -0,0 +1,116 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.models import Item, Job, db
+from app.services import job_service
+from scripts import backfill_embeddings as backfill
+
+
+def test_parse_args_modes():
+    assert backfill.parse_args([]).force is False
+    assert backfill.parse_args(["--only-missing"]).force is False
+    assert backfill.parse_args(["--force", "--chunk-size", "2"]).chunk_size == 2
+
+
+def test_backfill_resumes_from_checkpoint_and_skips_embedded(
+    app, seller_user, tmp_path, monkeypatch
+):
+    items = [
+        Item(title=f"Item {i}", description="Oak", price=1.0, seller_id=seller_user.id)
+        for i in range(5)
+    ]
+    items[1].embedding = [0.3, 0.2, 0.1]
+    db.session.add_all(items)
+    db.session.commit()
+    ids = [item.id for item in items]
+    checkpoint = str(tmp_path / "backfill.checkpoint")
+
+    encoded = []
+    # The second chunk of the first run fails, as if the process died
+    failures = [False, True]
+
+    def fake_generate_embeddings(texts, batch_size=32, model=None):
+        if failures and failures.pop(0):
+            return None
+        encoded.append(list(texts))
+        return np.array([[0.1, 0.2, 0.3]] * len(texts), dtype=np.float32)
+
+    monkeypatch.setattr(backfill, "generate_embeddings", fake_generate_embeddings)
+
+    backfill.backfill_embeddings(chunk_size=2, checkpoint=checkpoint, app=app)
+    # Only items without an embedding, two per chunk
+    assert encoded == [["Item 0 Oak", "Item 2 Oak"]]
+    assert backfill.load_checkpoint(checkpoint, force=False) == ids[2]
+
+    backfill.backfill_embeddings(chunk_size=2, checkpoint=checkpoint, app=app)
+    assert encoded[1:] == [["Item 3 Oak", "Item 4 Oak"]]
+    assert not os.path.exists(checkpoint)
+
+    db.session.expire_all()
+    for item_id in ids[:1] + ids[2:]:
+        item = db.session.get(Item, item_id)
+        assert item.embedding is not None
+        assert item.embedding_hash == item.embedding_text_hash
+    # The item that had an embedding was left alone
+    assert np.allclose(db.session.get(Item, ids[1]).embedding, [0.3, 0.2, 0.1])
+
+    # Their neighbours are refreshed by the job worker
+    refreshed = [job.payload["item_id"] for job in Job.query.order_by(Job.id)]
+    assert refreshed == ids[:1] + ids[2:]
+    assert {job.kind for job in Job.query} == {job_service.REFRESH_NEIGHBORS}
+
+
+def test_backfill_workers_encode_with_the_configured_model(
+    app, seller_user, tmp_path, monkeypatch
+):
+    import app.utils.search_utils as su
+
+    model = "paraphrase-MiniLM-L3-v2"
+    monkeypatch.setattr(su, "_model_name", model)
+    monkeypatch.setattr(su, "_model", None)
+    monkeypatch.setattr(su, "_embedding_client", None)
+
+    class FreshProcessPool:
+        # Runs the initializer and tasks here, starting from the module
+        # defaults a spawned process would import
+        def __init__(self, workers, initializer=None, initargs=()):
+            su.configure_embedding_model(None)
+            initializer(*initargs)
+
+        def map(self, func, iterable):
+            return [func(args) for args in iterable]
+
+        def close(self):
+            pass
+
+        def join(self):
+            pass
+
+    monkeypatch.setattr(
+        backfill.multiprocessing,
+        "get_context",
+        lambda method: SimpleNamespace(Pool=FreshProcessPool),
+    )
+    used = []
+
+    def fake_generate_embeddings(texts, batch_size=32, model=None):
+        used.append((model, su.default_model_name()))
+        return np.array([[0.1, 0.2, 0.3]] * len(texts), dtype=np.float32)
+
+    monkeypatch.setattr(backfill, "generate_embeddings", fake_generate_embeddings)
+
+    items = [
+        Item(title=f"Item {i}", price=1.0, seller_id=seller_user.id) for i in range(4)
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+
+    backfill.backfill_embeddings(
+        workers=2, checkpoint=str(tmp_path / "backfill.checkpoint"), app=app
+    )
+
+    assert used == [(model, model)] * 2
+    db.session.expire_all()
+    assert {item.embedding_model for item in Item.query} == {model}
@@ -0,0 +1,389 @@
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy import text as sa_text
+
+from app.models import Chat, Conversation, db
+from app.services import chat_service
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+
+def _message(sender, receiver, content, minutes_ago, is_read=False):
+    message = Chat(
+        sender_id=sender.id,
+        receiver_id=receiver.id,
+        content=content,
+        timestamp=datetime.utcnow() - timedelta(minutes=minutes_ago),
+        is_read=is_read,
+    )
+    db.session.add(message)
+    return message
+
+
+def test_conversations_ordered_by_activity_with_unread_counts(
+    client, logged_in_user, create_user
+):
+    me = logged_in_user
+    alice, _ = create_user(first_name="Alice")
+    bob, _ = create_user(first_name="Bob")
+    carol, _ = create_user(first_name="Carol")
+    _message(alice, me, "hi", 30)
+    _message(alice, me, "still there?", 20)
+    _message(me, alice, "yes", 10)
+    _message(bob, me, "read already", 50, is_read=True)
+    _message(carol, me, "newest", 5)
+    _message(bob, carol, "not mine", 1)
+    db.session.commit()
+
+    resp = client.get("/api/v1/chat/conversations")
+    assert resp.status_code == 200
+    data = resp.get_json()["data"]
+    summary = [
+        (c["user"]["id"], c["last_message"]["content"], c["unread_count"])
+        for c in data["conversations"]
+    ]
+    assert summary == [
+        (carol.id, "newest", 1),
+        (alice.id, "yes", 2),
+        (bob.id, "read already", 0),
+    ]
+    assert data["pagination"]["total"] == 3
+
+    resp = client.get("/api/v1/chat/conversations?page=2&per_page=2")
+    data = resp.get_json()["data"]
+    assert [c["user"]["id"] for c in data["conversations"]] == [bob.id]
+    assert data["pagination"] == {"page": 2, "per_page": 2, "total": 3, "pages": 2}
+
+
+def test_conversations_query_count_does_not_grow_with_partners(
+    client, logged_in_user, create_user
+):
+    partners = [create_user()[0] for _ in range(5)]
+    for minutes, partner in enumerate(partners):
+        _message(partner, logged_in_user, "hello", minutes)
+        _message(logged_in_user, partner, "hi back", minutes)
+    db.session.commit()
+
+    with count_statements() as statements:
+        resp = client.get("/api/v1/chat/conversations?per_page=100")
+    assert resp.status_code == 200
+    assert len(resp.get_json()["data"]["conversations"]) == 5
+
+    # Loading the logged-in user plus the single conversations statement
+    assert len(statements) == 2, statements
+
+
+def _conversation_rows():
+    return sorted(
+        (
+            c.user_low_id,
+            c.user_high_id,
+            c.last_message_id,
+            c.low_unread_count,
+            c.high_unread_count,
+        )
+        for c in Conversation.query
+    )
+
+
+def test_conversations_table_follows_send_read_and_delete(
+    client, logged_in_user, create_user
+):
+    me = logged_in_user
+    other, _ = create_user()
+    low, high = Conversation.pair(me.id, other.id)
+
+    first = _message(other, me, "first", 3)
+    second = _message(other, me, "second", 2)
+    db.session.commit()
+    resp = client.post(f"/api/v1/chat/{other.id}/messages", json={"content": "reply"})
+    reply_id = resp.get_json()["data"]["id"]
+
+    conversation = db.session.get(Conversation, (low, high))
+    assert conversation.last_message_id == reply_id
+    assert Conversation.unread_total(me.id) == 2
+    assert Conversation.unread_total(other.id) == 1
+    assert client.get("/api/v1/chat/unread-count").get_json()["data"] == {
+        "total_unread": 2,
+        "by_sender": [{"sender_id": other.id, "unread_count": 2}],
+    }
+
+    resp = client.post(f"/api/v1/chat/{other.id}/messages/mark-read")
+    assert resp.get_json()["data"]["marked_read"] == 2
+    assert Conversation.unread_total(me.id) == 0
+    assert Conversation.unread_total(other.id) == 1
+
+    # Deleting the latest message moves the conversation back to the previous one
+    assert client.delete(f"/api/v1/chat/messages/{reply_id}").status_code == 200
+    db.session.expire_all()
+    conversation = db.session.get(Conversation, (low, high))
+    assert conversation.last_message_id == second.id
+    assert Conversation.unread_total(other.id) == 0
+
+    db.session.delete(db.session.get(Chat, first.id))
+    db.session.delete(db.session.get(Chat, second.id))
+    db.session.commit()
+    assert Conversation.query.count() == 0
+
+
+def test_rebuild_conversations_matches_incremental_updates(
+    app, client, logged_in_user, create_user
+):
+    me = logged_in_user
+    a, _ = create_user()
+    b, _ = create_user()
+    _message(a, me, "one", 5)
+    _message(me, a, "two", 4, is_read=True)
+    _message(b, a, "three", 3)
+    _message(b, me, "four", 2)
+    _message(me, me, "note to self", 1)
+    db.session.commit()
+    client.get(f"/chat/{b.id}")
+
+    incremental = _conversation_rows()
+    assert len(incremental) == 4
+
+    Conversation.query.delete()
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=["chat", "rebuild-conversations"])
+    assert result.exit_code == 0, result.output
+    assert "Rebuilt 4 conversations" in result.output
+    assert _conversation_rows() == incremental
+
+    # The inbox leaves out notes to self; counts come from the table
+    page = client.get("/inbox").get_data(as_text=True)
+    assert page.count("list-group-item-action") == 2
+    assert page.count("badge bg-danger rounded-pill") == 1
+    assert Conversation.unread_total(me.id) == 1
+
+
+def test_stream_sends_only_new_messages_of_the_conversation(
+    app, client, logged_in_user, create_user
+):
+    me = logged_in_user
+    alice, _ = create_user(first_name="Alice")
+    carol, _ = create_user(first_name="Carol")
+    seen = _message(alice, me, "already shown", 10)
+    _message(me, alice, "missed", 5)
+    db.session.commit()
+    seen_id = seen.id
+
+    app.config["CHAT_STREAM_KEEPALIVE"] = 0.05
+    try:
+        resp = client.get(f"/chat/{alice.id}/stream?since_id={seen_id}")
+        assert resp.mimetype == "text/event-stream"
+        chunks = (chunk.decode() for chunk in resp.response)
+        assert next(chunks).startswith("retry:")
+        assert '"content": "missed"' in next(chunks)
+
+        # Nothing new: a keepalive comment
+        assert next(chunks).startswith(":")
+
+        # Another conversation's message is skipped; this one's is streamed
+        _message(carol, me, "elsewhere", 0)
+        new = _message(alice, me, "just sent", 0)
+        db.session.commit()
+        chunk = next(chunks)
+        assert chunk.startswith(f"id: {new.id}\n")
+        assert '"content": "just sent"' in chunk
+        assert "elsewhere" not in chunk
+        resp.close()
+    finally:
+        app.config["CHAT_STREAM_KEEPALIVE"] = 15
+
+
+def test_message_cursors_page_through_one_conversation(
+    client, logged_in_user, create_user
+):
+    me = logged_in_user
+    alice, _ = create_user(first_name="Alice")
+    bob, _ = create_user(first_name="Bob")
+    thread = []
+    for n in range(7):
+        sender, receiver = (alice, me) if n % 2 else (me, alice)
+        thread.append(_message(sender, receiver, f"m{n}", 10 - n))
+        _message(bob, me, "other thread", 10 - n)
+    db.session.commit()
+    ids = [m.id for m in thread]
+
+    # Scrollback from the newest message
+    resp = client.get(
+        f"/api/v1/chat/{alice.id}/messages?before_id={ids[-1]}&per_page=3"
+    )
+    data = resp.get_json()["data"]
+    assert [m["id"] for m in data["messages"]] == ids[3:6]
+    assert data["pagination"] == {
+        "per_page": 3,
+        "has_more": True,
+        "since_id": ids[5],
+        "before_id": ids[3],
+    }
+    resp = client.get(f"/api/v1/chat/{alice.id}/messages?before_id={ids[3]}&per_page=3")
+    data = resp.get_json()["data"]
+    assert [m["id"] for m in data["messages"]] == ids[:3]
+    assert data["pagination"]["has_more"] is False
+
+    # Polling for new messages
+    resp = client.get(f"/api/v1/chat/{alice.id}/messages?since_id={ids[4]}&per_page=3")
+    data = resp.get_json()["data"]
+    assert [m["id"] for m in data["messages"]] == ids[5:]
+    assert data["pagination"]["has_more"] is False
+
+    # The chat page's endpoint takes the same cursors
+    assert [m["id"] for m in client.get(f"/get_messages/{alice.id}").json] == ids
+    resp = client.get(f"/get_messages/{alice.id}?before_id={ids[2]}&limit=1")
+    assert [m["content"] for m in resp.json] == ["m1"]
+    resp = client.get(f"/get_messages/{alice.id}?since_id={ids[5]}")
+    assert [m["content"] for m in resp.json] == ["m6"]
+
+
+def test_unread_badge_is_cached_and_invalidated_by_chat_writes(
+    client, logged_in_user, create_user
+):
+    me = logged_in_user
+    alice, _ = create_user(first_name="Alice")
+    _message(alice, me, "hi", 5)
+    db.session.commit()
+
+    def badge_queries():
+        with count_statements() as statements:
+            assert client.get("/contact_us").status_code == 200
+        return [s for s in statements if "conversations" in s]
+
+    assert badge_queries()
+    assert badge_queries() == []
+
+    # A new message for me, then reading it, each refresh the count
+    _message(alice, me, "there?", 1)
+    db.session.commit()
+    assert badge_queries()
+    assert Conversation.cached_unread_total(me.id) == 2
+
+    client.get(f"/chat/{alice.id}")
+    assert Conversation.cached_unread_total(me.id) == 0
+    assert badge_queries() == []
+
+
+@contextmanager
+def foreign_keys_enforced():
+    # SQLite only enforces foreign keys when asked, outside a transaction
+    db.session.commit()
+    db.session.execute(sa_text("PRAGMA foreign_keys=ON"))
+    try:
+        yield
+    finally:
+        db.session.rollback()
+        db.session.execute(sa_text("PRAGMA foreign_keys=OFF"))
+
+
+def test_deleting_latest_message_moves_conversation_back(
+    client, logged_in_user, create_user
+):
+    me = logged_in_user
+    alice, _ = create_user(first_name="Alice")
+    first = _message(alice, me, "hi", 10)
+    latest = _message(me, alice, "bye", 5)
+    db.session.commit()
+    first_id, latest_id = first.id, latest.id
+
+    with foreign_keys_enforced():
+        assert db.session.execute(sa_text("PRAGMA foreign_keys")).scalar() == 1
+        resp = client.delete(f"/api/v1/chat/messages/{latest_id}")
+        assert resp.status_code == 200
+
+        conversation = Conversation.query.one()
+        assert conversation.last_message_id == first_id
+        assert conversation.low_unread_count + conversation.high_unread_count == 1
+
+
+def test_stream_slots_are_capped_per_worker(app, client, logged_in_user, create_user):
+    alice, _ = create_user(first_name="Alice")
+    app.config["CHAT_STREAM_MAX_PER_WORKER"] = 1
+    try:
+        first = client.get(f"/chat/{alice.id}/stream")
+        assert first.status_code == 200
+        refused = client.get(f"/chat/{alice.id}/stream")
+        assert refused.status_code == 503
+        assert refused.headers["Retry-After"]
+
+        # Closing a stream frees its slot, even if it was never read
+        first.close()
+        second = client.get(f"/chat/{alice.id}/stream")
+        assert second.status_code == 200
+        second.close()
+    finally:
+        app.config["CHAT_STREAM_MAX_PER_WORKER"] = 8
+
+
+def test_stream_catches_up_on_backlogs_longer_than_a_batch(
+    client, logged_in_user, create_user, monkeypatch
+):
+    me = logged_in_user
+    alice, _ = create_user(first_name="Alice")
+    for minutes in range(5):
+        _message(alice, me, f"m{minutes}", 10 - minutes)
+    db.session.commit()
+    monkeypatch.setattr(sys.modules["app.main"], "CHAT_STREAM_BATCH", 2)
+
+    resp = client.get(f"/chat/{alice.id}/stream?since_id=0")
+    chunks = (chunk.decode() for chunk in resp.response)
+    assert next(chunks).startswith("retry:")
+    contents = [next(chunks).split('"content": "')[1][:2] for _ in range(5)]
+    assert contents == ["m0", "m1", "m2", "m3", "m4"]
+    resp.close()
+
+
+def test_mark_read_keeps_messages_that_arrive_meanwhile_counted(
+    logged_in_user, create_user
+):
+    me = logged_in_user
+    alice, _ = create_user(first_name="Alice")
+    _message(alice, me, "one", 3)
+    _message(alice, me, "two", 2)
+    db.session.commit()
+    low, high = Conversation.pair(me.id, alice.id)
+    counter = "low_unread_count" if me.id == low else "high_unread_count"
+
+    def message_arrives(conn, cursor, statement, parameters, context, executemany):
+        # Another transaction sends a message between mark_read's chat UPDATE
+        # and its counter UPDATE
+        if statement.startswith("UPDATE chat") and not arrived:
+            arrived.append(True)
+            conn.execute(
+                sa_text(
+                    "INSERT INTO chat (sender_id, receiver_id, content, is_read)"
+                    " VALUES (:sender, :receiver, 'three', 0)"
+                ),
+                {"sender": alice.id, "receiver": me.id},
+            )
+            conn.execute(
+                sa_text(
+                    f"UPDATE conversations SET {counter} = {counter} + 1"
+                    " WHERE user_low_id = :low AND user_high_id = :high"
+                ),
+                {"low": low, "high": high},
+            )
+
+    arrived = []
+    event.listen(db.engine, "after_cursor_execute", message_arrives)
+    try:
+        assert chat_service.mark_read(me.id, alice.id) == 2
+    finally:
+        event.remove(db.engine, "after_cursor_execute", message_arrives)
+    db.session.commit()
+    assert Conversation.unread_total(me.id) == 1
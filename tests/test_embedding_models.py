@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from app.models import EmbeddingModel, Item, ItemEmbedding, db
+from app.services import job_service
+from app.utils import search_utils
+
+OLD = search_utils.DEFAULT_MODEL
+NEW = "new-model"
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """
+    Encodes every text as [1, 0, 0] with the old model and [0, 1, 0] with the
+    new one, recording the model of each call.
+    """
+    calls = []
+
+    def fake_generate_embeddings(texts, batch_size=32, model=None):
+        calls.append(model or OLD)
+        vector = [0.0, 1.0, 0.0] if model == NEW else [1.0, 0.0, 0.0]
+        return np.array([vector] * len(texts), dtype=np.float32)
+
+    def fake_generate_embedding(text, model=None):
+        return fake_generate_embeddings([text], model=model)[0]
+
+    monkeypatch.setattr(job_service, "generate_embeddings", fake_generate_embeddings)
+    monkeypatch.setattr(search_utils, "generate_embedding", fake_generate_embedding)
+    return calls
+
+
+def _add_items(seller, count):
+    items = [
+        Item(title=f"Item {i}", price=1.0, seller_id=seller.id, embedding=[1, 0, 0])
+        for i in range(count)
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    return [item.id for item in items]
+
+
+def test_reembedding_switches_search_after_last_chunk(app, seller_user, fake_models):
+    ids = _add_items(seller_user, 3)
+    assert Item.vector_index().model_version == OLD
+    job_service.start_reembedding(NEW)
+
+    # First chunk: staged only, search still reads the old vectors
+    assert job_service.run_reembed_jobs(batch_size=2) == 1
+    assert ItemEmbedding.query.count() == 2
+    assert {item.embedding_model for item in Item.query} == {OLD}
+    assert Item.semantic_search_ids("lamp", threshold=0.5) == ids
+
+    # An edit during the re-embedding is encoded with both models
+    job_service.enqueue_item_embedding(db.session.get(Item, ids[0]))
+    db.session.commit()
+    job_service.run_embed_item_jobs()
+    assert db.session.get(Item, ids[0]).embedding_model == OLD
+    assert db.session.get(ItemEmbedding, (ids[0], NEW)) is not None
+
+    # Second chunk stages the rest; the third finds none left and switches
+    job_service.run_reembed_jobs(batch_size=2)
+    job_service.run_reembed_jobs(batch_size=2)
+    assert job_service.run_reembed_jobs(batch_size=2) == 0
+
+    db.session.expire_all()
+    items = Item.query.order_by(Item.id).all()
+    assert {item.embedding_model for item in items} == {NEW}
+    assert all(item.embedding.tolist() == [0.0, 1.0, 0.0] for item in items)
+    assert ItemEmbedding.query.count() == 0
+    assert EmbeddingModel.active_name() == NEW
+    assert db.session.get(EmbeddingModel, OLD).status == "retired"
+    assert db.session.get(EmbeddingModel, NEW).dim == 3
+
+    # Queries are now encoded with the new model and match the new vectors
+    assert Item.vector_index().model_version == NEW
+    assert Item.semantic_search_ids("lamp", threshold=0.5) == ids
+
+
+def test_index_skips_vectors_of_other_models(app, seller_user, fake_models):
+    (old_id,) = _add_items(seller_user, 1)
+    index = Item.vector_index()
+
+    item = Item(title="Lamp", price=1.0, seller_id=seller_user.id)
+    item.embedding = [1, 0, 0]
+    item.embedding_model = NEW
+    db.session.add(item)
+    db.session.get(Item, old_id).embedding_model = NEW
+    db.session.commit()
+
+    assert Item.vector_index() is index
+    assert len(index) == 0
+    Item.reset_search_indexes()
+    assert len(Item.vector_index()) == 0
+
+
+def test_reembed_cli_validates_and_reports(app, seller_user, fake_models):
+    _add_items(seller_user, 2)
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=["embeddings", "reembed", OLD])
+    assert result.exit_code != 0
+    assert "already the active" in result.output
+
+    result = runner.invoke(args=["embeddings", "reembed", NEW])
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(args=["embeddings", "reembed", "third-model"])
+    assert "already being re-embedded" in result.output
+
+    result = runner.invoke(args=["embeddings", "status"])
+    assert f"{OLD}: active, dim None, 2 items, 0 staged" in result.output
+    assert f"{NEW}: pending" in result.output
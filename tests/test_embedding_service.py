@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import app.utils.search_utils as su
+from app.utils.embedding_service import EmbeddingClient, EmbeddingServer, MicroBatcher
+
+
+def fake_encode(texts):
+    return [[len(text), 1.0] for text in texts]
+
+
+@pytest.fixture
+def server(tmp_path):
+    socket_path = str(tmp_path / "embed.sock")
+    srv = EmbeddingServer(socket_path, fake_encode, max_batch=16, max_wait=0.02)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_micro_batcher_merges_concurrent_requests():
+    calls = []
+
+    def encode(texts):
+        calls.append(len(texts))
+        return fake_encode(texts)
+
+    batcher = MicroBatcher(encode, max_batch=64, max_wait=0.05)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda n: batcher.submit(["x" * n]), range(1, 9)))
+
+    assert [r[0][0] for r in results] == list(range(1, 9))
+    assert sum(calls) == 8
+    assert len(calls) < 8
+
+
+def test_micro_batcher_propagates_errors():
+    def encode(texts):
+        raise RuntimeError("boom")
+
+    batcher = MicroBatcher(encode, max_wait=0)
+    with pytest.raises(RuntimeError):
+        batcher.submit(["a"])
+
+
+def test_client_roundtrip(server):
+    client = EmbeddingClient(server.server_address)
+    vectors = client.encode(["ab", "abcd"])
+    assert vectors.dtype == np.float32
+    assert vectors.tolist() == [[2.0, 1.0], [4.0, 1.0]]
+
+
+def test_client_unavailable(tmp_path):
+    client = EmbeddingClient(str(tmp_path / "missing.sock"))
+    assert client.encode(["a"]) is None
+
+
+def test_search_utils_uses_configured_service(server, monkeypatch):
+    # Reload to bypass the conftest fixture that mocks the embedding functions
+    import importlib
+
+    importlib.reload(su)
+    monkeypatch.setattr(su, "get_model", lambda: pytest.fail("model loaded locally"))
+
+    su.configure_embedding_service(server.server_address)
+    try:
+        assert su.generate_embedding("abc").tolist() == [3.0, 1.0]
+        assert su.generate_embeddings(["a", "bb"]).tolist() == [[1.0, 1.0], [2.0, 1.0]]
+        assert su.warm_model() is True
+    finally:
+        su.configure_embedding_service(None)
+
+
+def test_server_refuses_other_models(server, monkeypatch):
+    monkeypatch.setattr(server, "model_name", "model-a")
+    client = EmbeddingClient(server.server_address)
+    assert client.encode(["ab"], model="model-a").tolist() == [[2.0, 1.0]]
+    assert client.encode(["ab"], model="model-b") is None
@@ -0,0 +1,145 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.models import Item, db
+from app.utils.ann_index import IVFIndex
+from app.utils.index_file import (
+    JOURNAL_SLACK,
+    IndexFile,
+    SegmentedIndex,
+    read_header,
+    write_index_file,
+)
+
+
+def clustered_rows(count=1500, dim=16, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)]
+    vectors = vectors + 0.3 * rng.standard_normal((count, dim))
+    return [
+        (item_id, vec, "books" if item_id % 10 == 0 else "electronics")
+        for item_id, vec in enumerate(vectors.astype(np.float32), start=1)
+    ]
+
+
+@pytest.fixture
+def ivf():
+    return IVFIndex.from_rows(
+        clustered_rows(), min_train_size=1000, attributes=("category",)
+    )
+
+
+def test_index_file_roundtrip_matches_ivf_search(tmp_path, ivf):
+    path = str(tmp_path / "items.idx")
+    header = write_index_file(path, ivf)
+    assert header["count"] == len(ivf)
+    assert header["nlist"] == ivf.nlist
+
+    index = SegmentedIndex.open(path)
+    assert isinstance(index.base.matrix, np.memmap)
+    assert len(index) == len(ivf)
+    assert index.base.row_of(7) is not None
+    assert index.base.row_of(99999) is None
+
+    query = clustered_rows()[5][1]
+    for filters in (None, {"category": "books"}):
+        expected = ivf.search(query, k=10, nprobe=ivf.nlist, filters=filters)
+        found = index.search(query, k=10, nprobe=index.nlist, filters=filters)
+        assert [i for i, _ in found] == [i for i, _ in expected]
+        assert np.allclose([s for _, s in found], [s for _, s in expected])
+    assert index.search(query, filters={"category": "toys"}) == []
+
+
+def test_empty_and_invalid_files(tmp_path):
+    path = str(tmp_path / "empty.idx")
+    write_index_file(path, IVFIndex())
+    index = SegmentedIndex.open(path)
+    assert len(index) == 0
+    assert index.search([1, 0, 0]) == []
+
+    # Writes still work against an empty base
+    index.add(1, [1, 0, 0])
+    assert index.search([1, 0, 0]) == [(1, 1.0)]
+
+    bad = tmp_path / "bad.idx"
+    bad.write_bytes(b"not an index")
+    with pytest.raises(ValueError):
+        IndexFile(str(bad))
+
+
+def test_delta_masks_base_rows_and_survives_reopen(tmp_path, ivf):
+    path = str(tmp_path / "items.idx")
+    write_index_file(path, ivf)
+    index = SegmentedIndex.open(path)
+    rows = clustered_rows()
+
+    # An update moves the item to the delta; a removal masks its base row
+    index.add(1, rows[500][1], {"category": "toys"})
+    assert index.remove(2)
+    assert not index.remove(2)
+    assert 2 not in index and 1 in index
+    assert len(index) == len(ivf) - 1
+    results = index.search(rows[500][1], k=1000, nprobe=index.nlist)
+    assert [i for i, _ in results].count(1) == 1
+    assert 2 not in {i for i, _ in results}
+    assert index.search(rows[0][1], filters={"category": "toys"})[0][0] == 1
+
+    # Unchanged file: the same index is kept
+    assert index.reopen() is index
+
+    # A rebuild that predates the writes gets them replayed
+    write_index_file(path, ivf, built_at=time.time() - 3600)
+    reopened = index.reopen()
+    assert reopened is not index
+    assert 2 not in reopened and 1 in reopened
+
+    # A rebuild that includes them drops the delta
+    ivf.remove(2)
+    write_index_file(path, ivf, built_at=time.time() + JOURNAL_SLACK + 1)
+    reopened = index.reopen()
+    assert len(reopened._delta) == 0
+    assert 2 not in reopened
+
+
+def test_item_vector_index_maps_built_file(app, sample_item, tmp_path):
+    item_id, seller_id = sample_item.id, sample_item.seller_id
+    path = str(tmp_path / "items.idx")
+    result = app.test_cli_runner().invoke(
+        args=["search", "build-index", "--path", path]
+    )
+    assert result.exit_code == 0, result.output
+    assert read_header(path)[0]["count"] == 1
+
+    app.config["SEARCH_INDEX_FILE"] = path
+    try:
+        Item.reset_search_indexes()
+        index = Item.vector_index()
+        assert isinstance(index, SegmentedIndex)
+        assert Item.semantic_search_ids("lamp") == [item_id]
+
+        # Commits in this process land in the delta segment
+        other = Item(
+            title="Lamp",
+            price=5.0,
+            seller_id=seller_id,
+            embedding=[0.1, 0.2, 0.3],
+        )
+        db.session.add(other)
+        db.session.get(Item, item_id).is_active = False
+        db.session.commit()
+        assert Item.vector_index() is index
+        assert Item.semantic_search_ids("lamp") == [other.id]
+
+        # A file its builder stopped refreshing is replaced by a database build
+        ivf = Item.build_vector_index()
+        max_age = app.config.get("SEARCH_INDEX_MAX_AGE", 300)
+        write_index_file(path, ivf, built_at=time.time() - max_age - 1)
+        Item.reset_search_indexes()
+        assert not isinstance(Item.vector_index(), SegmentedIndex)
+        assert Item.semantic_search_ids("lamp") == [other.id]
+    finally:
+        app.config["SEARCH_INDEX_FILE"] = None
+        Item.reset_search_indexes()
@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.models import Item, Job, db
+from app.services import job_service
+from app.utils.search_utils import DEFAULT_MODEL as OLD_MODEL
+
+
+def test_post_item_enqueues_embedding(client, logged_in_user):
+    resp = client.post(
+        "/post-item",
+        data={
+            "title": "Mini Fridge",
+            "price": "40",
+            "uploaded_image_filename": "f.png",
+        },
+        follow_redirects=True,
+    )
+    assert resp.status_code == 200
+
+    item = Item.query.filter_by(title="Mini Fridge").first()
+    assert item.embedding is None
+
+    job = Job.query.one()
+    assert job.kind == job_service.EMBED_ITEM
+    assert job.payload == {"item_id": item.id}
+
+
+def test_edit_item_enqueues_embedding(client, logged_in_user):
+    item = Item(title="Desk", price=10.0, seller_id=logged_in_user.id)
+    db.session.add(item)
+    db.session.commit()
+    item_id = item.id
+
+    resp = client.post(
+        f"/edit_item/{item_id}",
+        data={"title": "Oak Desk", "price": "10", "uploaded_image_filename": ""},
+    )
+    assert resp.status_code == 302
+    assert Job.query.one().payload == {"item_id": item_id}
+
+
+def test_worker_writes_embeddings_and_clears_queue(app, seller_user):
+    items = [
+        Item(title=f"Item {i}", price=1.0, seller_id=seller_user.id) for i in range(3)
+    ]
+    db.session.add_all(items)
+    for item in items:
+        job_service.enqueue_item_embedding(item)
+    db.session.commit()
+
+    job_service.work(batch_size=2, once=True)
+
+    db.session.expire_all()
+    assert all(item.embedding is not None for item in Item.query.all())
+    assert Job.query.count() == 0
+
+
+def test_worker_retries_then_fails(app, seller_user, monkeypatch):
+    monkeypatch.setattr(job_service, "generate_embeddings", lambda *a, **k: None)
+
+    item = Item(title="Lamp", price=1.0, seller_id=seller_user.id)
+    db.session.add(item)
+    job_service.enqueue_item_embedding(item)
+    db.session.commit()
+
+    backoffs = []
+    for _ in range(job_service.MAX_ATTEMPTS):
+        assert job_service.run_embed_item_jobs() == 0
+        job = Job.query.one()
+        backoffs.append(job.run_after - datetime.utcnow())
+        if job.status == "pending":
+            # Not retried before its backoff elapses
+            assert job_service.claim_jobs(job_service.EMBED_ITEM, 10) == []
+            job.run_after = datetime.utcnow()
+            db.session.commit()
+
+    # Each failure doubles the wait
+    assert timedelta(seconds=25) < backoffs[0] <= job_service.RETRY_BACKOFF
+    assert backoffs[1] > backoffs[0] * 1.9
+    assert job.status == "failed"
+    assert job.attempts == job_service.MAX_ATTEMPTS
+    assert job.last_error == "Embedding model unavailable"
+    assert job_service.claim_jobs(job_service.EMBED_ITEM, 10) == []
+
+
+def _embedded_item(seller):
+    item = Item(title="Desk", description="Oak", price=10.0, seller_id=seller.id)
+    db.session.add(item)
+    job_service.enqueue_item_embedding(item)
+    db.session.commit()
+    job_service.work(once=True)
+    return item.id
+
+
+def test_edits_that_keep_the_text_do_not_reembed(client, logged_in_user):
+    item_id = _embedded_item(logged_in_user)
+    assert db.session.get(Item, item_id).embedding_hash is not None
+
+    resp = client.put(
+        f"/api/v1/items/{item_id}", json={"price": "12", "is_active": False}
+    )
+    assert resp.status_code == 200
+    resp = client.post(
+        f"/edit_item/{item_id}",
+        data={"title": "Desk", "price": "15", "uploaded_image_filename": ""},
+    )
+    assert resp.status_code == 302
+    assert Job.query.count() == 0
+
+    resp = client.put(f"/api/v1/items/{item_id}", json={"description": "Pine"})
+    assert resp.status_code == 200
+    assert Job.query.one().payload == {"item_id": item_id}
+
+
+def test_worker_skips_items_already_current(app, seller_user, monkeypatch):
+    item_id = _embedded_item(seller_user)
+    job_service.enqueue_job(job_service.EMBED_ITEM, item_id=item_id)
+    db.session.commit()
+
+    monkeypatch.setattr(
+        job_service,
+        "generate_embeddings",
+        lambda *a, **k: pytest.fail("current item re-encoded"),
+    )
+    assert job_service.run_embed_item_jobs() == 1
+    assert Job.query.count() == 0
+
+
+def test_embed_stale_items_only_encodes_changed_items(app, seller_user, monkeypatch):
+    _embedded_item(seller_user)
+    edited = _embedded_item(seller_user)
+    db.session.get(Item, edited).title = "Standing desk"
+    other_model = _embedded_item(seller_user)
+    db.session.get(Item, other_model).embedding_model = "old-model"
+    missing = Item(title="Lamp", price=1.0, seller_id=seller_user.id)
+    db.session.add(missing)
+    db.session.commit()
+    missing = missing.id
+
+    encoded = []
+
+    def fake_generate_embeddings(texts, batch_size=32, model=None):
+        encoded.extend(texts)
+        return np.array([[0.1, 0.2, 0.3]] * len(texts), dtype=np.float32)
+
+    monkeypatch.setattr(job_service, "generate_embeddings", fake_generate_embeddings)
+    assert job_service.embed_stale_items(chunk_size=2) == 3
+    # The unchanged item is not among them
+    assert sorted(encoded) == ["Desk Oak", "Lamp ", "Standing desk Oak"]
+
+    items = {item.id: item for item in Item.query}
+    assert all(not item.embedding_is_stale(OLD_MODEL) for item in items.values())
+    assert items[missing].embedding is not None
+    assert job_service.embed_stale_items() == 0
@@ -57,7 +57,7 @@ def test_home_no_items(client, logged_user):
 # ------------------------------------------
 # /buy_item edge-case flows
 # ------------------------------------------
-@patch("app.main.generate_embedding", return_value=EMBED_VECTOR)
+@patch("app.models.generate_query_embedding", return_value=EMBED_VECTOR)
 def test_buy_item_empty_semantic(mock_emb, client, logged_user):
     # Search returns empty semantic result → no matches
     resp = client.get("/buy_item?search=NoMatchTerm")
@@ -94,7 +94,7 @@ def test_post_item_invalid_extension(client, logged_user):
     assert b"error uploading" in resp.data.lower()
 
 
-@patch("app.main.generate_embedding", side_effect=Exception("Boom"))
+@patch("app.main.enqueue_item_embedding", side_effect=Exception("Boom"))
 def test_post_item_embedding_failure(mock_emb, client, logged_user):
     resp = client.post(
         "/post-item",
@@ -187,7 +187,7 @@ def test_edit_item_invalid_extension(client, logged_user, item):
     assert resp.status_code == 200  # stays on page
 
 
-@patch("app.main.generate_embedding", side_effect=Exception("fail"))
+@patch("app.main.enqueue_item_embedding", side_effect=Exception("fail"))
 def test_edit_item_failure(mock_emb, client, logged_user, item):
     resp = client.post(
         f"/edit_item/{item.id}",
@@ -232,10 +232,10 @@ def test_delete_item_404(client, logged_user):
 
 
 def test_buy_item_no_semantic_results(client, logged_user, monkeypatch):
-    """Force semantic search to return empty list to cover the 'if not semantic_results' block."""
+    """Force semantic search to return no ids to cover the 'if not relevant_ids' block."""
     from app.models import Item
 
-    monkeypatch.setattr(Item, "semantic_search", lambda *args, **kwargs: [])
+    monkeypatch.setattr(Item, "semantic_search_ids", lambda *args, **kwargs: [])
 
     resp = client.get("/buy_item?search=anything")
     assert resp.status_code == 200
@@ -270,3 +270,32 @@ def test_update_profile_with_image(client, logged_user, app):
         u = db.session.get(User, logged_user.id)
         assert u.profile_image is not None
         assert u.profile_image == "test_profile.png"
+
+
+def test_buy_item_search_results_cached_until_item_write(
+    client, logged_user, app, monkeypatch
+):
+    from app.models import Item
+    from app.utils.search_utils import search_result_cache
+
+    item = Item(title="Cached Lamp", price=5.0, seller_id=logged_user.id)
+    db.session.add(item)
+    db.session.commit()
+
+    calls = []
+
+    def fake_hybrid(cls, term, **kwargs):
+        calls.append(term)
+        return [item.id]
+
+    monkeypatch.setattr(Item, "hybrid_search_ids", classmethod(fake_hybrid))
+
+    assert b"Cached Lamp" in client.get("/buy_item?search=Lamp").data
+    assert b"Cached Lamp" in client.get("/buy_item?search=lamp").data
+    assert calls == ["Lamp"]
+    assert search_result_cache.stats()["hits"] == 1
+
+    item.title = "Cached Lamp v2"
+    db.session.commit()
+    assert b"Cached Lamp v2" in client.get("/buy_item?search=lamp").data
+    assert calls == ["Lamp", "lamp"]
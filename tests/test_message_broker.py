@@ -0,0 +1,60 @@
+import socket
+import time
+
+from app.utils.message_broker import MessageBroker, SocketBroadcastBackend
+
+
+def test_publish_reaches_only_subscribers_of_the_channel():
+    broker = MessageBroker()
+    with broker.subscribe(1) as first, broker.subscribe(2) as second:
+        broker.publish(1, {"message_id": 7})
+        assert first.get(timeout=1) == {"message_id": 7}
+        assert second.get(timeout=0.01) is None
+    assert broker.stats()["subscribers"] == 0
+
+    # Nobody listening: the event is dropped
+    broker.publish(1, {"message_id": 8})
+    assert broker.stats()["delivered"] == 1
+
+
+def test_slow_subscriber_overflows_instead_of_blocking():
+    broker = MessageBroker(max_pending=2)
+    with broker.subscribe(1) as subscription:
+        for message_id in range(5):
+            broker.publish(1, {"message_id": message_id})
+        assert subscription.overflowed
+        assert subscription.get(timeout=1) == {"message_id": 0}
+
+
+def test_socket_backend_broadcasts_to_every_process(tmp_path):
+    directory = str(tmp_path / "events")
+    sender = MessageBroker(SocketBroadcastBackend(directory))
+    receiver = MessageBroker(SocketBroadcastBackend(directory))
+    try:
+        with receiver.subscribe(3) as remote, sender.subscribe(3) as local:
+            sender.publish(3, {"message_id": 1})
+            assert remote.get(timeout=2) == {"message_id": 1}
+            assert local.get(timeout=2) == {"message_id": 1}
+
+        # A process that went away is forgotten on the next publish
+        receiver.configure(None)
+        (tmp_path / "events" / "gone.sock").touch()
+        sender.publish(3, {"message_id": 2})
+        assert len(list((tmp_path / "events").iterdir())) == 1
+    finally:
+        sender.configure(None)
+        receiver.configure(None)
+
+
+def test_socket_publish_does_not_block_on_a_stalled_listener(tmp_path):
+    directory = tmp_path / "events"
+    directory.mkdir()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as stalled:
+        # Bound but never read from, so its receive buffer fills up
+        stalled.bind(str(directory / "stalled.sock"))
+        backend = SocketBroadcastBackend(str(directory))
+        started = time.monotonic()
+        for message_id in range(500):
+            backend.publish("1", {"message_id": message_id, "pad": "x" * 1000})
+        assert time.monotonic() - started < 5
+        assert (directory / "stalled.sock").exists()
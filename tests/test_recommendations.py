@@ -0,0 +1,138 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.models import Item, db
+from app.services import recommendation_service
+from app.utils.message_broker import SocketBroadcastBackend
+from app.utils.taste_profile import TasteProfile, taste_profile_cache
+
+DAY = 24 * 3600
+
+
+def _add_items(seller, embeddings, category="electronics"):
+    items = [
+        Item(
+            title=f"Item {i}",
+            price=1.0,
+            category=category,
+            seller_id=seller.id,
+            embedding=embedding,
+        )
+        for i, embedding in enumerate(embeddings)
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def test_taste_profile_decays_older_interactions():
+    profile = TasteProfile(half_life=DAY)
+    profile.add([1, 0], 1.0, at=0)
+    profile.add([0, 1], 1.0, at=DAY)
+
+    # The older interaction has half the weight of the newer one
+    np.testing.assert_allclose(profile.vector(), np.array([1, 2]) / np.sqrt(5))
+
+    # A negative weight takes an interaction back, also out of order
+    profile.add([1, 0], 2.0, at=DAY / 2)
+    profile.add([0, 1], 1.0, at=DAY)
+    profile.add([1, 0], -2.0, at=DAY / 2)
+    profile.add([0, 1], -1.0, at=DAY)
+    np.testing.assert_allclose(profile.vector(), np.array([1, 2]) / np.sqrt(5))
+
+    assert TasteProfile().vector() is None
+    assert TasteProfile().add(None, 1.0, at=0) is False
+
+
+def test_views_and_favorites_update_cached_profile(client, logged_in_user, seller_user):
+    a, b, c = _add_items(seller_user, [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    assert recommendation_service.taste_vector(logged_in_user.id) is None
+
+    client.get(f"/item/{a.id}")
+    client.get(f"/item/{a.id}")
+    client.post(f"/favorites/add/{b.id}")
+
+    cached = taste_profile_cache.get(logged_in_user.id).vector()
+    rebuilt = recommendation_service.build_taste_profile(logged_in_user.id).vector()
+    np.testing.assert_allclose(cached, rebuilt, atol=1e-4)
+    assert cached[1] > cached[0] > 0
+
+    # Removing a favorite drops the profile so it is rebuilt without it
+    client.get(f"/favorites/remove/{b.id}")
+    assert taste_profile_cache.get(logged_in_user.id) is None
+    vector = recommendation_service.taste_vector(logged_in_user.id)
+    np.testing.assert_allclose(vector, [1, 0, 0], atol=1e-6)
+
+
+def test_profile_updates_wait_for_commit_and_reach_other_processes(
+    logged_in_user, seller_user, tmp_path
+):
+    (a,) = _add_items(seller_user, [[1, 0, 0]])
+    user_id = logged_in_user.id
+    assert recommendation_service.taste_vector(user_id) is None
+
+    # A rolled-back view never reaches the cached profile
+    recommendation_service.record_view(user_id, a)
+    db.session.rollback()
+    assert taste_profile_cache.get(user_id).vector() is None
+    recommendation_service.record_view(user_id, a)
+    db.session.commit()
+    np.testing.assert_allclose(taste_profile_cache.get(user_id).vector(), [1, 0, 0])
+
+    # Another process's commit drops this process's copy
+    directory = str(tmp_path / "taste")
+    other = type(taste_profile_cache)()
+    other.configure(backend=SocketBroadcastBackend(directory))
+    taste_profile_cache.configure(backend=SocketBroadcastBackend(directory))
+    try:
+        taste_profile_cache.get(user_id)
+        other.apply([(user_id, None, None, None)])
+        deadline = time.monotonic() + 2
+        while taste_profile_cache.get(user_id) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert taste_profile_cache.get(user_id) is None
+    finally:
+        other.configure(backend=None)
+        taste_profile_cache.configure(backend=None)
+
+    # Without a backend, profiles expire after the TTL
+    cache = type(taste_profile_cache)(ttl=0)
+    cache.put(user_id, TasteProfile())
+    assert cache.get(user_id) is None
+
+
+def test_for_you_ranks_unseen_items_near_taste(
+    client, logged_in_user, seller_user, monkeypatch
+):
+    viewed, close, far = _add_items(seller_user, [[1, 0, 0], [0.9, 0.1, 0], [0, 0, 1]])
+    (own,) = _add_items(logged_in_user, [[1, 0, 0]])
+    client.get(f"/item/{viewed.id}")
+
+    items = recommendation_service.for_you_items(logged_in_user, limit=6)
+    assert [item.id for item in items] == [close.id, far.id]
+
+    # Later feeds are served from the cached profile
+    def fail(user_id):
+        pytest.fail("profile rebuilt")
+
+    monkeypatch.setattr(recommendation_service, "build_taste_profile", fail)
+    resp = client.get("/api/v1/items/for-you?limit=1")
+    assert resp.status_code == 200
+    assert [entry["id"] for entry in resp.get_json()["data"]] == [close.id]
+
+    page = client.get("/home")
+    assert b"Picked for you" in page.data
+
+
+def test_home_without_history_shows_newest_per_category(
+    client, logged_in_user, seller_user
+):
+    _add_items(seller_user, [[1, 0, 0]], category="books")
+    _add_items(seller_user, [[0, 1, 0], [0, 0, 1]], category="electronics")
+
+    page = client.get("/home")
+    assert page.status_code == 200
+    assert b"Picked for you" not in page.data
+    assert page.data.count(b"category-item") == 2
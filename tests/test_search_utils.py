@@ -1,6 +1,8 @@
 import types
 import sys
 import importlib
+import threading
+import time
 from unittest.mock import MagicMock
 
 import numpy as np
@@ -45,6 +47,32 @@ def test_get_model_lazy_singleton(monkeypatch):
     assert calls["count"] == 1  # constructed only once
 
 
+def test_other_model_loads_once_under_concurrency(monkeypatch):
+    calls = []
+
+    class SlowTransformer:
+        def __init__(self, name):
+            calls.append(name)
+            time.sleep(0.05)
+
+    dummy_module = types.SimpleNamespace(SentenceTransformer=SlowTransformer)
+    monkeypatch.setitem(sys.modules, "sentence_transformers", dummy_module)
+    monkeypatch.setattr(su, "_other_models", {})
+
+    loaded = []
+    threads = [
+        threading.Thread(target=lambda: loaded.append(su._get_model("new-model")))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["new-model"]
+    assert len({id(model) for model in loaded}) == 1
+
+
 def test_cosine_similarity_various():
     v1 = [1, 0, 0]
     v2 = [1, 0, 0]
@@ -84,3 +112,161 @@ def test_generate_embedding_coverage():
     # Verify interaction
     st_module.SentenceTransformer.assert_called_with("all-MiniLM-L6-v2")
     mock_model_instance.encode.assert_called_with("hello world")
+
+
+def test_encode_decode_embedding_roundtrip():
+    data = su.encode_embedding([0.5, -1.0, 2.0])
+    assert isinstance(data, bytes)
+    assert len(data) == 3 * 4
+
+    vec = su.decode_embedding(data)
+    assert vec.dtype == np.dtype("<f4")
+    assert not vec.flags.writeable
+    assert vec.tolist() == [0.5, -1.0, 2.0]
+
+    assert su.encode_embedding(None) is None
+    assert su.decode_embedding(None) is None
+
+
+def test_generate_embeddings_batches_in_one_call(monkeypatch):
+    # Reload to bypass the conftest fixture that mocks generate_embeddings
+    importlib.reload(su)
+
+    model = MagicMock()
+    model.encode.return_value = [[1, 2], [3, 4]]
+    monkeypatch.setattr(su, "get_model", lambda: model)
+
+    vectors = su.generate_embeddings(["a", "b"], batch_size=8)
+    assert vectors.dtype == np.float32
+    assert vectors.shape == (2, 2)
+    model.encode.assert_called_once_with(["a", "b"], batch_size=8)
+
+    assert su.generate_embeddings([]) is None
+
+    model.encode.side_effect = RuntimeError("no model")
+    assert su.generate_embeddings(["a"]) is None
+
+
+def test_embedding_cache_lru_and_counters():
+    cache = su.EmbeddingCache(maxsize=2, ttl=60)
+    assert cache.get("Mini Fridge") is None
+
+    stored = cache.put("  mini   FRIDGE ", [1, 2, 3])
+    assert stored.dtype == np.float32
+    assert not stored.flags.writeable
+    assert cache.get("mini fridge") is stored
+
+    cache.put("textbook", [4, 5, 6])
+    cache.get("mini fridge")  # refresh recency
+    cache.put("jacket", [7, 8, 9])  # evicts "textbook"
+
+    assert cache.get("textbook") is None
+    assert cache.get("jacket") is not None
+    stats = cache.stats()
+    assert stats["size"] == 2
+    assert stats["hits"] == 3
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 1
+
+
+def test_embedding_cache_ttl(monkeypatch):
+    cache = su.EmbeddingCache(maxsize=4, ttl=10)
+    now = [100.0]
+    monkeypatch.setattr(su.time, "monotonic", lambda: now[0])
+
+    cache.put("lamp", [1, 0])
+    now[0] += 11
+    assert cache.get("lamp") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_generate_query_embedding_uses_cache(monkeypatch):
+    calls = []
+
+    def fake_embedding(text, model=None):
+        calls.append(text)
+        return [0.1, 0.2, 0.3]
+
+    monkeypatch.setattr(su, "generate_embedding", fake_embedding)
+
+    first = su.generate_query_embedding("Mini Fridge")
+    second = su.generate_query_embedding("mini  fridge")
+    assert second is first
+    assert calls == ["mini fridge"]
+    assert su.generate_query_embedding("   ") is None
+
+
+def test_warm_model_records_timings(monkeypatch):
+    model = MagicMock()
+    monkeypatch.setattr(su, "get_model", lambda: model)
+
+    assert su.warm_model() is True
+    model.encode.assert_called_once()
+    assert su.model_metrics["warmup_seconds"] is not None
+
+    model.encode.side_effect = RuntimeError("no model")
+    assert su.warm_model() is False
+
+
+def test_search_result_cache_key_normalization():
+    key = su.SearchResultCache.make_key
+    assert key(" Mini  FRIDGE ", category=["b", "a", "a"], page=1) == key(
+        "mini fridge", page=1, category=["a", "b"]
+    )
+    assert key("lamp", category=["Books"]) != key("lamp", category=["books"])
+    assert key("", category=[]) == key(None, category=None)
+
+
+def test_search_result_cache_writes_in_other_processes_invalidate(tmp_path):
+    from app.utils.message_broker import SocketBroadcastBackend
+
+    directory = str(tmp_path / "search")
+    writer = su.SearchResultCache(backend=SocketBroadcastBackend(directory))
+    reader = su.SearchResultCache(backend=SocketBroadcastBackend(directory))
+    try:
+        reader.put("lamp", [1, 2])
+        writer.put("lamp", [1, 2])
+        assert reader.get("lamp") == ((1, 2), None)
+
+        # A commit in the writer's process (e.g. the job worker)
+        writer.bump_generation()
+        deadline = time.monotonic() + 2
+        while reader.generation == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert reader.get("lamp") is None
+        # The writer does not invalidate itself twice
+        assert writer.generation == 1
+    finally:
+        writer.configure(backend=None)
+        reader.configure(backend=None)
+
+
+def test_search_result_cache_generation_ttl_and_bounds(monkeypatch):
+    cache = su.SearchResultCache(maxsize=10, max_ids=5, ttl=10)
+    now = [100.0]
+    monkeypatch.setattr(su.time, "monotonic", lambda: now[0])
+
+    cache.put("a", [1, 2], total=2)
+    assert cache.get("a") == ((1, 2), 2)
+
+    # Any write bumps the generation and invalidates older entries
+    cache.bump_generation()
+    assert cache.get("a") is None
+
+    cache.put("a", [1, 2])
+    now[0] += 11
+    assert cache.get("a") is None
+
+    # Memory is bounded by the total number of cached ids
+    cache.put("a", [1, 2, 3])
+    cache.put("b", [4, 5, 6])
+    assert cache.get("a") is None
+    assert cache.get("b") == ((4, 5, 6), None)
+    cache.put("c", range(6))
+    assert cache.get("c") is None
+
+    stats = cache.stats()
+    assert stats["cached_ids"] == 3
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+    assert stats["hit_ratio"] == 2 / 6
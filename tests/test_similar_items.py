@@ -0,0 +1,93 @@
+import numpy as np
+
+from app.models import Item, ItemNeighbor, Job, db
+from app.services import job_service
+from app.services.similarity_service import rebuild_neighbors, refresh_item_neighbors
+
+
+def _add_items(seller, embeddings):
+    items = [
+        Item(title=f"Item {i}", price=1.0, seller_id=seller.id, embedding=embedding)
+        for i, embedding in enumerate(embeddings)
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def _neighbor_ids(item):
+    return [similar.id for similar in item.similar_items(limit=10)]
+
+
+def test_rebuild_neighbors_orders_by_similarity(app, seller_user):
+    a, b, c = _add_items(seller_user, [[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0]])
+
+    assert rebuild_neighbors(chunk_size=2) == 3
+    assert _neighbor_ids(a) == [b.id, c.id]
+    assert _neighbor_ids(c) == [b.id, a.id]
+
+    # Inactive neighbours are skipped when reading
+    b.is_active = False
+    db.session.commit()
+    assert _neighbor_ids(a) == [c.id]
+
+
+def test_refresh_offers_item_to_neighbor_lists(app, seller_user):
+    a, b, c = _add_items(seller_user, [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    rebuild_neighbors()
+
+    # A new near-duplicate of `a` enters a's full list and drops its worst entry
+    (d,) = _add_items(seller_user, [[0.95, 0.05, 0]])
+    refresh_item_neighbors([d.id], count=2)
+    db.session.commit()
+
+    assert _neighbor_ids(d)[0] == a.id
+    assert _neighbor_ids(a)[0] == d.id
+    assert ItemNeighbor.query.filter_by(item_id=a.id).count() == 2
+
+
+def test_refresh_keeps_changed_item_in_lists_it_still_belongs_to(app, seller_user):
+    a, b, c = _add_items(seller_user, [[1, 0, 0], [0.9, 0.44, 0], [0, 1, 0]])
+    rebuild_neighbors(count=1)
+    # c's nearest is b, but b's nearest is a, so b's refresh never offers itself to c
+    assert [row.neighbor_id for row in ItemNeighbor.query.filter_by(item_id=c.id)] == [
+        b.id
+    ]
+
+    b.embedding = [0.9, 0.5, 0]
+    db.session.commit()
+    refresh_item_neighbors([b.id], count=1)
+    db.session.commit()
+
+    (row,) = ItemNeighbor.query.filter_by(item_id=c.id).all()
+    assert row.neighbor_id == b.id
+    assert abs(row.score - 0.5 / np.hypot(0.9, 0.5)) < 1e-5
+    assert _neighbor_ids(b) == [a.id]
+
+
+def test_worker_refreshes_neighbors_after_embedding(app, seller_user):
+    items = [
+        Item(title=f"Item {i}", price=1.0, seller_id=seller_user.id) for i in range(2)
+    ]
+    db.session.add_all(items)
+    for item in items:
+        job_service.enqueue_item_embedding(item)
+    db.session.commit()
+
+    job_service.work(once=True)
+
+    assert Job.query.count() == 0
+    assert _neighbor_ids(items[0]) == [items[1].id]
+
+
+def test_similar_items_api_and_page(client, logged_in_user, app):
+    a, b = _add_items(logged_in_user, [[1, 0, 0], [0.9, 0.1, 0]])
+    rebuild_neighbors()
+
+    resp = client.get(f"/api/v1/items/{a.id}/similar")
+    assert resp.status_code == 200
+    assert [entry["id"] for entry in resp.get_json()["data"]] == [b.id]
+    assert client.get("/api/v1/items/99999/similar").status_code == 404
+
+    page = client.get(f"/item/{a.id}")
+    assert b"Similar Items" in page.data
@@ -0,0 +1,126 @@
+from app.models import Item, db
+from app.utils.text_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_splits_model_numbers():
+    assert tokenize("Nvidia RTX-3080, barely used!") == [
+        "nvidia",
+        "rtx",
+        "3080",
+        "barely",
+        "used",
+    ]
+    assert tokenize(None) == []
+
+
+def test_bm25_ranks_rare_and_repeated_terms_higher():
+    index = BM25Index.from_rows(
+        [
+            (1, "desk lamp", {}),
+            (2, "lamp lamp shade", {}),
+            (3, "oak desk", {}),
+            (4, "", {}),
+        ]
+    )
+    assert len(index) == 3
+    assert 4 not in index
+
+    results = index.search("lamp")
+    assert [doc_id for doc_id, _ in results] == [2, 1]
+    assert index.search("unknown words") == []
+    assert len(index.search("desk lamp", k=1)) == 1
+
+
+def test_bm25_add_remove_and_filters():
+    index = BM25Index()
+    index.add(1, "red bike", {"category": "sports"})
+    index.add(2, "red sweater", {"category": "clothing"})
+
+    assert [d for d, _ in index.search("red", filters={"category": "sports"})] == [1]
+    assert index.search("red", filters={"category": ["toys"]}) == []
+
+    # Replacing text drops the old postings
+    index.add(1, "blue bike", {"category": "sports"})
+    assert [d for d, _ in index.search("red")] == [2]
+
+    assert index.remove(2)
+    assert not index.remove(2)
+    assert index.search("red") == []
+    assert index.search("sweater") == []
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([1, 2, 3], [3, 4])
+    assert fused[0][0] == 3
+    assert {item_id for item_id, _ in fused} == {1, 2, 3, 4}
+
+
+def test_text_index_follows_commits(app, sample_item):
+    Item.reset_search_indexes()
+    assert Item.lexical_search_ids("nice") == [sample_item.id]
+
+    sample_item.title = "Sony WH-1000XM4 headphones"
+    db.session.commit()
+    assert Item.lexical_search_ids("1000xm4") == [sample_item.id]
+
+    sample_item.is_deleted = True
+    db.session.commit()
+    assert Item.lexical_search_ids("1000xm4") == []
+    assert Item.search("headphones").all() == []
+
+
+def test_stale_text_index_is_served_while_rebuilt(app, sample_item, monkeypatch):
+    Item.reset_search_indexes()
+    stale = Item.text_index()
+    stale.built_at -= app.config.get("SEARCH_INDEX_MAX_AGE", 300) + 1
+    lamp = Item(title="Tertial lamp", price=5.0, seller_id=sample_item.seller_id)
+    during_build = []
+    from_rows = BM25Index.from_rows
+
+    def slow_from_rows(rows):
+        rows = list(rows)
+        # Another request searches, then commits a write the build did not read
+        during_build.append(Item.text_index())
+        db.session.add(lamp)
+        db.session.commit()
+        return from_rows(rows)
+
+    monkeypatch.setattr(BM25Index, "from_rows", slow_from_rows)
+    rebuilt = Item.text_index()
+
+    assert during_build == [stale]
+    assert rebuilt is not stale and Item.text_index() is rebuilt
+    assert Item.lexical_search_ids("tertial") == [lamp.id]
+
+
+def test_hybrid_search_includes_keyword_only_matches(app, sample_item, monkeypatch):
+    lamp = Item(
+        title="IKEA Tertial lamp",
+        price=5.0,
+        category="furniture",
+        seller_id=sample_item.seller_id,
+    )
+    db.session.add(lamp)
+    db.session.commit()
+
+    # The embedding model finds nothing, but the brand name is an exact keyword hit
+    monkeypatch.setattr(Item, "semantic_search_ids", lambda *args, **kwargs: [])
+    assert Item.hybrid_search_ids("tertial") == [lamp.id]
+    assert Item.hybrid_search_ids("tertial", filters={"category": ["books"]}) == []
+
+
+def test_hybrid_search_drops_keyword_hits_sharing_only_a_common_word(
+    app, sample_item, monkeypatch
+):
+    seller_id = sample_item.seller_id
+    jacket = Item(title="Blue jacket for kids", price=5.0, seller_id=seller_id)
+    desk_lamp = Item(title="Lamp for a desk", price=5.0, seller_id=seller_id)
+    blue_mug = Item(title="Blue mug", price=5.0, seller_id=seller_id)
+    db.session.add_all([jacket, desk_lamp, blue_mug])
+    db.session.commit()
+
+    monkeypatch.setattr(
+        Item, "semantic_search_ids", lambda *args, **kwargs: [jacket.id]
+    )
+    # The lamp shares only "for" and the mug only "blue" with the query
+    assert Item.hybrid_search_ids("blue jacket for kids") == [jacket.id]
@@ -0,0 +1,60 @@
+import time
+
+from app.utils.message_broker import SocketBroadcastBackend
+from app.utils.unread_cache import UnreadCountCache
+
+
+def test_counts_are_cached_until_invalidated_or_expired():
+    cache = UnreadCountCache(maxsize=2, ttl=60)
+    loads = []
+
+    def load(count):
+        def loader():
+            loads.append(count)
+            return count
+
+        return loader
+
+    assert cache.get(1, load(3)) == 3
+    assert cache.get(1, load(4)) == 3
+    cache.invalidate([1])
+    assert cache.get(1, load(4)) == 4
+    assert loads == [3, 4]
+
+    # Least recently used entries are evicted
+    cache.get(2, load(0))
+    cache.get(3, load(0))
+    assert cache.stats()["size"] == 2
+    assert cache.get(1, load(5)) == 5
+
+    cache.configure(ttl=0)
+    cache.get(4, load(1))
+    assert cache.get(4, load(2)) == 2
+
+
+def test_count_loaded_across_an_invalidation_is_not_stored():
+    cache = UnreadCountCache()
+
+    def racing_load():
+        # A write commits while this (older) count is being read
+        cache.invalidate([1])
+        return 7
+
+    assert cache.get(1, racing_load) == 7
+    assert cache.get(1, lambda: 8) == 8
+
+
+def test_invalidations_reach_other_processes(tmp_path):
+    directory = str(tmp_path / "unread")
+    here = UnreadCountCache(backend=SocketBroadcastBackend(directory))
+    there = UnreadCountCache(backend=SocketBroadcastBackend(directory))
+    try:
+        assert there.get(1, lambda: 2) == 2
+        here.invalidate([1])
+        deadline = time.monotonic() + 2
+        while there.stats()["size"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert there.get(1, lambda: 3) == 3
+    finally:
+        here.configure(backend=None)
+        there.configure(backend=None)
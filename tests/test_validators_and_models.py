@@ -2,6 +2,7 @@
 from app.utils.validators import is_valid_email, is_strong_password
 from app.models import User, Item, Order, Chat, db
 from datetime import datetime
+import numpy as np
 
 
 def test_is_valid_email_colby():
@@ -176,3 +177,16 @@ def test_user_full_name_property(app):
         assert u1.full_name == "OnlyFirst"
         assert u2.full_name == "OnlyLast"
         assert u3.full_name == "Unknown"
+
+
+def test_item_embedding_stored_as_float32(app, sample_item):
+    with app.app_context():
+        db.session.expire_all()
+        item = db.session.get(Item, sample_item.id)
+        assert item.embedding.dtype == np.float32
+        assert item.embedding_dim == 3
+        assert np.allclose(item.embedding, [0.1, 0.2, 0.3])
+
+        item.embedding = None
+        db.session.commit()
+        assert item.embedding_dim is None
@@ -0,0 +1,69 @@
+import numpy as np
+
+from app.models import Item, db
+from app.utils.vector_index import VectorIndex, normalize
+
+
+def test_normalize_handles_missing_and_zero():
+    assert normalize(None) is None
+    assert normalize([0, 0, 0]) is None
+    vec = normalize([3, 4])
+    assert vec.dtype == np.float32
+    assert abs(np.linalg.norm(vec) - 1.0) < 1e-6
+
+
+def test_search_orders_by_score_and_applies_threshold():
+    index = VectorIndex.from_rows(
+        [(1, [1, 0, 0]), (2, [0.9, 0.1, 0]), (3, [0, 1, 0]), (4, None)]
+    )
+    assert len(index) == 3
+    assert 4 not in index
+
+    results = index.search([1, 0, 0], k=5, threshold=0.5)
+    assert [item_id for item_id, _ in results] == [1, 2]
+    assert abs(results[0][1] - 1.0) < 1e-6
+
+    top1 = index.search([1, 0, 0], k=1)
+    assert [item_id for item_id, _ in top1] == [1]
+
+
+def test_add_remove_keeps_rows_packed():
+    index = VectorIndex(capacity=1)
+    for i in range(5):
+        index.add(i, [i + 1, 1])
+    assert len(index) == 5
+
+    assert index.remove(0)
+    assert not index.remove(0)
+    assert 0 not in index
+    assert sorted(index.ids.tolist()) == [1, 2, 3, 4]
+
+    # Replacing a vector updates in place
+    index.add(4, [0, 1])
+    assert index.search([0, 1], k=1)[0][0] == 4
+
+    # Mismatched dimensions are rejected
+    assert not index.add(9, [1, 2, 3])
+    assert index.search([1, 2, 3]) == []
+
+
+def test_item_index_follows_commits(app, sample_item):
+    Item.reset_search_indexes()
+    index = Item.vector_index()
+    assert sample_item.id in index
+
+    other = Item(
+        title="Lamp",
+        price=5.0,
+        seller_id=sample_item.seller_id,
+        embedding=[0.3, 0.2, 0.1],
+    )
+    db.session.add(other)
+    db.session.commit()
+    assert other.id in index
+
+    other.is_active = False
+    db.session.commit()
+    assert other.id not in index
+
+    assert Item.semantic_search_ids("lamp", limit=5) == [sample_item.id]